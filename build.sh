@@ -6,6 +6,8 @@ set -o errexit
 pip install -r requirements.txt
 
 # 2. 静的ファイル（画像やCSS）の収集
+# Bootstrap / Font Awesome / フォントを static/vendor/ に取り込む（失敗しても CDN のまま動く）
+python manage.py vendor_assets || echo "vendor_assets failed; pages will keep using the CDN"
 python manage.py collectstatic --no-input
 
 # 3. データベースの構築
@@ -14,5 +16,5 @@ python manage.py migrate
 # 4. データの読み込み（data.jsonがあれば）
 if [ -f data.json ]; then
     echo "Loading data from data.json..."
-    # python manage.py loaddata data.json
+    # python manage.py import_catalog data.json
 fi
\ No newline at end of file
@@ -4,6 +4,8 @@ Django settings for config project.
 
 import os
 from pathlib import Path
+
+import dj_database_url
 from dotenv import load_dotenv
 
 # 1. パスの設定
@@ -35,13 +37,18 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # ←追加（本番の画像対策）
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'dicon_app.query_instrumentation.QueryInstrumentationMiddleware',  # クエリ数・N+1 の計測
+    'dicon_app.db_router.ReplicaPinMiddleware',  # 読み取りレプリカの振り分け（DATABASE_REPLICA_URLS があるときだけ）
+    # セッション・認証・メッセージは、Cookie の無い人のカタログ閲覧では何もしない子クラス（dicon_app/fast_path.py）
+    'dicon_app.fast_path.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'dicon_app.fast_path.AuthenticationMiddleware',
+    'dicon_app.fast_path.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+# False にすると、セッション Cookie の無い人のカタログ閲覧にもセッション・ユーザーを用意する（Django 標準の動き）
+SESSIONLESS_CATALOG = os.environ.get('SESSIONLESS_CATALOG', '1') != '0'
 
 ROOT_URLCONF = 'config.urls'
 
@@ -56,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'dicon_app.context_processors.cart',  # ヘッダーのカート点数
             ],
         },
     },
@@ -64,12 +72,43 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 # 4. データベース設定
+# DATABASE_URL があればそれ（本番の PostgreSQL など）、無ければ手元の db.sqlite3
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': dj_database_url.config(default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
 }
+# 読み取りレプリカ（カンマ区切りで複数可）。カタログのページの読み取りだけが回る（dicon_app/db_router.py）
+# 例: DATABASE_REPLICA_URLS=postgres://reader@replica1/dicon,postgres://reader@replica2/dicon
+# 手元で試すとき: DATABASE_REPLICA_URLS=sqlite:///db.replica.sqlite3 にして manage.py sync_replica で複製
+for _i, _url in enumerate(u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()):
+    DATABASES[f'replica{_i + 1}'] = dict(dj_database_url.parse(_url), TEST={'MIRROR': 'default'})
+DATABASE_ROUTERS = ['dicon_app.db_router.ReplicaRouter']
+# PostgreSQL の接続の使い回し。DATABASE_POOL_MAX を指定するとワーカーごとの接続プール（dicon_app/db_pool.py）、
+# 無ければ Django 標準の持続接続（DATABASE_CONN_MAX_AGE 秒。使う前に死活確認）
+# プールの最大数 × gunicorn のワーカー数 が PostgreSQL の max_connections に収まるようにする
+for _db in DATABASES.values():
+    if _db['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    if os.environ.get('DATABASE_POOL_MAX'):
+        _db.update(ENGINE='dicon_app.db_backends.postgresql', CONN_MAX_AGE=0, POOL={
+            'MIN_SIZE': int(os.environ.get('DATABASE_POOL_MIN', 1)),
+            'MAX_SIZE': int(os.environ['DATABASE_POOL_MAX']),
+            'TIMEOUT': float(os.environ.get('DATABASE_POOL_TIMEOUT', 5)),
+            'MAX_LIFETIME': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 1800)),
+        })
+    else:
+        _db.update(CONN_MAX_AGE=int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)), CONN_HEALTH_CHECKS=True)
+# SQLite のまま 1 台で運用するとき: SQLITE_TUNED=1 で WAL・BEGIN IMMEDIATE などの調整（dicon_app/db_backends/sqlite3）
+# 既定の設定との「database is locked」の割合の差は manage.py bench_sqlite で
+if os.environ.get('SQLITE_TUNED'):
+    for _db in DATABASES.values():
+        if _db['ENGINE'] == 'django.db.backends.sqlite3':
+            _db.update(ENGINE='dicon_app.db_backends.sqlite3', TUNING={
+                'BUSY_TIMEOUT': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 10000)),
+                'MMAP_SIZE': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+                'CACHE_SIZE': int(os.environ.get('SQLITE_CACHE_KB', 32 * 1024)),
+            })
+# 書き込んだ利用者は、この秒数のあいだ読み取りもプライマリ（レプリカの遅れで自分の変更が見えないのを防ぐ）
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
 
 # 5. パスワード・言語・時間
 AUTH_PASSWORD_VALIDATORS = [
@@ -93,6 +132,13 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# アップロード画像は中身のハッシュを名前にして 1 回だけ保存する（dicon_app/storage.py）
+STORAGES = {
+    'default': {'BACKEND': 'dicon_app.storage.ContentAddressedStorage'},
+    # 指紋付きの名前＋.gz / .br を作り、WhiteNoise がそのまま配る。画像は collectstatic 時に再圧縮（dicon_app/assets.py）
+    'staticfiles': {'BACKEND': 'dicon_app.assets.StaticAssetStorage'},
+}
+
 # 7. ログイン設定
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = "dicon_app:home"
@@ -101,4 +147,63 @@ LOGIN_URL = "accounts:login"
 
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
-]
\ No newline at end of file
+]
+
+# 8. キャッシュ設定
+# トップページのセクション別キャッシュ（dicon_app/home_cache.py）などで使う。
+# 本番で複数ワーカーに共有したい場合は Redis / Memcached などに差し替える。
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dicon',
+    }
+}
+# ワーカー間で共有されるキャッシュか（LocMemCache はワーカーごと）。セッション・ページの ETag の既定が変わる
+_SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+# 一覧・詳細ページの ETag の元（モデルごとのバージョン、dicon_app/versions.py）をキャッシュに置く秒数。
+# 共有されていないと別のワーカーの保存が見えないので、短い秒数ごとに DB から作り直す（None は無期限）
+CATALOG_VERSION_TTL = None if _SHARED_CACHE else 5
+
+# セクションごとの TTL（秒）を上書きしたい場合だけ指定する
+# 例: HOME_SECTION_TTLS = {"sale": 30, "partners": 86400}
+HOME_SECTION_TTLS = {}
+
+
+# 9. クエリ計測（dicon_app/query_instrumentation.py）
+# URL ごとのクエリ予算は dicon_app/query_budgets.py に書く
+# 毎リクエストでスタックをたどるので本番では切っておく。手元で見たいときは QUERY_INSTRUMENTATION=1
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', '0') == '1'
+QUERY_N_PLUS_ONE_THRESHOLD = 3
+# True なら予算超過で例外。テストでは TEST_RUNNER が計測と一緒に True にする（manage.py test / python -m django test）
+QUERY_BUDGET_RAISE = os.environ.get('QUERY_BUDGET_RAISE', '0') == '1'
+TEST_RUNNER = 'dicon_app.test_runner.TestRunner'
+
+
+# 10. サイト内検索（dicon_app/search.py）
+# "memory": プロセス内の n-gram インデックス / "trigram": PostgreSQL の pg_trgm
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'memory')
+SEARCH_TRIGRAM_THRESHOLD = 0.1
+# プロセス内インデックスを DB と見比べる間隔（秒）。キャッシュが共有されていれば変更ログが届くので None（見比べない）
+SEARCH_RECHECK_SECONDS = None if _SHARED_CACHE else 5
+
+# 11. 画像の縮小版（dicon_app/images.py）
+# この幅の WebP / JPEG を作る（元画像より大きい幅は作らない）
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1024)
+IMAGE_VARIANT_WORKERS = 2
+
+# 12. アップロード画像の配信（dicon_app/media.py）
+# 中身のハッシュが名前の画像は 1 年 immutable。それ以外のキャッシュ時間（秒）
+MEDIA_MAX_AGE = 60 * 60 * 24
+# nginx の後ろで動かすときは internal な location を指定すると、本文の送信を nginx に任せる
+# 例: MEDIA_ACCEL_REDIRECT=/_media/  （nginx: location /_media/ { internal; alias <MEDIA_ROOT>/; }）
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+
+# 13. セッション（dicon_app/session_store.py）
+# キャッシュ＋DB。カートの連続した変更は、この秒数の窓ごとに 1 回だけ DB に書く（0 で毎回書く）
+# 既定は、キャッシュがワーカー間で共有されている（Redis / Memcached など）ときだけ 5 秒。LocMemCache なら 0
+SESSION_ENGINE = 'dicon_app.session_store'
+SESSION_WRITE_COALESCE_SECONDS = float(os.environ.get('SESSION_WRITE_COALESCE_SECONDS', 5 if _SHARED_CACHE else 0))
+# 期限切れのセッションの削除（バックグラウンド。manage.py clearsessions でも同じく少しずつ）
+SESSION_PURGE_INTERVAL = 60 * 60
+SESSION_PURGE_CHUNK = 1000
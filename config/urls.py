@@ -14,11 +14,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+from urllib.parse import urlsplit
+
 from django.contrib import admin
-from django.urls import path, include
-# ↓ 画像を表示するために必要な2行を追加
+from django.urls import path, include, re_path
+# ↓ 画像を表示するために必要
 from django.conf import settings
-from django.conf.urls.static import static
+
+from dicon_app.media import serve as media_serve
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,6 +32,8 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
 ] # ← ★この「閉じカッコ」が抜けていたのがエラーの原因でした！
 
-# ↓ 画像表示用の設定（デバッグモードの時だけ有効）
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# ↓ 画像表示用の設定（本番でも有効。Range・ETag・sendfile / X-Accel-Redirect は dicon_app/media.py）
+if not urlsplit(settings.MEDIA_URL).netloc:
+    urlpatterns += [
+        re_path(r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")), media_serve, name="media"),
+    ]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DiconAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dicon_app'
+
+    def ready(self):
+        from . import signals  # noqa
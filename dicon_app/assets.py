@@ -0,0 +1,252 @@
+"""
+フロントの外部アセット（Bootstrap / Font Awesome / Mochiy Pop One）を自前で配信する
+
+毎ページ 3 つの CDN に取りに行く代わりに、ビルド時（build.sh）に manage.py vendor_assets で
+static/vendor/ に取り込み、collectstatic で WhiteNoise が指紋付きの名前と .gz / .br を作ります。
+- CSS はテンプレートで使っているクラスだけ残す（purge_css）。Font Awesome のアイコンもクラスなので同じ仕組みで消える
+- Mochiy Pop One はテンプレートに出てくる文字だけのサブセットを Google Fonts に作ってもらう（text= パラメータ）
+- Font Awesome のフォント本体は fontTools があれば使うアイコンのグリフだけにする（無ければそのまま）
+- テンプレートは {% asset_url "bootstrap.css" %}（templatetags/assets.py）。取り込み前（開発中など）は CDN の URL になる
+- collectstatic では static/img などの PNG / JPEG も再圧縮する（小さくなったときだけ。StaticAssetStorage）
+"""
+import hashlib
+import io
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from PIL import Image
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+try:
+    from fontTools import subset as font_subset
+except ImportError:  # fontTools は任意。なければ Font Awesome のフォントは丸ごと配る
+    font_subset = None
+
+VENDOR_DIR = "vendor"
+
+
+@dataclass(frozen=True)
+class Asset:
+    path: str           # static/ からの相対パス
+    cdn: str            # 取り込み元（取り込んでいなければこの URL をそのまま使う）
+    purge: bool = False  # 使っていない CSS ルールを消すか
+
+
+ASSETS: Dict[str, Asset] = {
+    "bootstrap.css": Asset(f"{VENDOR_DIR}/bootstrap/bootstrap.min.css",
+                           "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css", purge=True),
+    "bootstrap.js": Asset(f"{VENDOR_DIR}/bootstrap/bootstrap.bundle.min.js",
+                          "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"),
+    "fontawesome.css": Asset(f"{VENDOR_DIR}/fontawesome/css/all.min.css",
+                             "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.2/css/all.min.css", purge=True),
+    "mochiy.css": Asset(f"{VENDOR_DIR}/mochiy/mochiy.css",
+                        "https://fonts.googleapis.com/css2?family=Mochiy+Pop+One&display=swap"),
+}
+
+# Bootstrap の JS が付け外しするクラス（テンプレートには出てこないが消してはいけない）
+SAFELIST_PREFIXES = ("show", "showing", "hiding", "fade", "collapse", "collapsing", "active", "disabled",
+                     "modal", "offcanvas", "carousel", "dropdown", "tooltip", "popover", "bs-", "toast",
+                     "was-validated", "is-valid", "is-invalid", "fa-spin", "fa-fw")
+
+
+# ==========================================
+# 1. テンプレートから「使っているもの」を集める
+# ==========================================
+
+def source_files() -> Iterable[Path]:
+    """クラス名・文字を探すファイル（テンプレート、アプリの Python / JS、自前の CSS）"""
+    base = Path(settings.BASE_DIR)
+    for pattern in ("templates/**/*.html", "*/templates/**/*.html", "*/*.py", "*/templatetags/*.py",
+                    "static/**/*.js", "static/css/*.css"):
+        yield from base.glob(pattern)
+
+
+def used_tokens() -> Set[str]:
+    """クラス名になりうる単語をぜんぶ（class="..." の中だけでなく {% if %} で組み立てるものも拾うため）"""
+    tokens = set()
+    for path in source_files():
+        tokens.update(re.findall(r"[A-Za-z][\w-]*", path.read_text(encoding="utf-8", errors="ignore")))
+    return tokens
+
+
+_TAGS = re.compile(r"{%.*?%}|{{.*?}}|{#.*?#}|<[^>]*>|<!--.*?-->", re.S)
+
+
+def template_characters() -> str:
+    """テンプレートに書かれている文字（タグを除く）。Mochiy Pop One のサブセットに使う"""
+    chars = set(chr(c) for c in range(0x20, 0x7F))  # 英数字・記号は常に入れる
+    base = Path(settings.BASE_DIR)
+    for path in list(base.glob("templates/**/*.html")) + list(base.glob("*/templates/**/*.html")):
+        chars.update(_TAGS.sub("", path.read_text(encoding="utf-8", errors="ignore")))
+    chars -= set("\r\n\t")
+    return "".join(sorted(chars))
+
+
+# ==========================================
+# 2. CSS の不要ルールを消す
+# ==========================================
+
+def _blocks(css: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    トップレベルの (セレクタ / @ルール, 中身) に分ける（文字列の中の括弧は無視）
+    @import / @charset のような波括弧の無い文は中身を None にして返す
+    """
+    blocks, i, n = [], 0, len(css)
+    while i < n:
+        start = css.find("{", i)
+        head = css[i:start if start >= 0 else n].lstrip()
+        if head.startswith("@") and ";" in head:
+            end = css.index(";", i) + 1
+            blocks.append((css[i:end].strip(), None))
+            i = end
+            continue
+        if start < 0:
+            break
+        depth, j, quote = 1, start + 1, None
+        while j < n and depth:
+            ch = css[j]
+            if quote:
+                if ch == "\\":
+                    j += 1
+                elif ch == quote:
+                    quote = None
+            elif ch in "\"'":
+                quote = ch
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+            j += 1
+        blocks.append((css[i:start].strip(), css[start + 1:j - 1]))
+        i = j
+    return blocks
+
+
+def _split_selectors(prelude: str) -> List[str]:
+    """カンマで区切る（:not(.a, .b) の中のカンマでは切らない）"""
+    parts, depth, current = [], 0, []
+    for ch in prelude:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+_NOT = re.compile(r":not\([^()]*\)")
+_CLASS = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+
+
+def _selector_used(selector: str, used: Set[str]) -> bool:
+    # :not(.x) の中のクラスは「無くても当たる」ので見ない
+    for name in _CLASS.findall(_NOT.sub("", selector)):
+        if name not in used and not name.startswith(SAFELIST_PREFIXES):
+            return False
+    return True
+
+
+def purge_css(css: str, used: Set[str]) -> str:
+    """used に無いクラスを含むセレクタを消す。中身が空になった @media なども消す"""
+    out = []
+    for prelude, body in _blocks(re.sub(r"/\*(?!!).*?\*/", "", css, flags=re.S)):
+        if body is None:
+            out.append(prelude)
+        elif prelude.startswith(("@media", "@supports", "@layer", "@container")):
+            inner = purge_css(body, used)
+            if inner:
+                out.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@") or prelude.startswith("/*!"):
+            # @font-face / @keyframes などと、先頭のライセンスコメント付きのルールはそのまま
+            out.append(f"{prelude}{{{body}}}")
+        else:
+            selectors = [s for s in _split_selectors(prelude) if _selector_used(s, used)]
+            if selectors:
+                out.append(f"{','.join(selectors)}{{{body}}}")
+    return "".join(out)
+
+
+def used_codepoints(css: str) -> Set[int]:
+    """（purge 後の）Font Awesome の CSS に残った content / --fa の文字コード"""
+    return {int(code, 16) for code in re.findall(r'"\\([0-9a-fA-F]{2,6})"', css)}
+
+
+def subset_font(path: Path, codepoints: Set[int]) -> bool:
+    """woff2 を codepoints のグリフだけにする（fontTools が無ければ何もしない）"""
+    if font_subset is None or not codepoints:
+        return False
+    options = font_subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    font = font_subset.load_font(str(path), options)
+    subsetter = font_subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    font_subset.save_font(font, str(path), options)
+    return True
+
+
+# ==========================================
+# 3. 配信（collectstatic と {% asset_url %}）
+# ==========================================
+
+def is_vendored(path: str) -> bool:
+    """取り込み済みか。collectstatic 後はマニフェストを、それ以前は static/ を見る"""
+    hashed = getattr(staticfiles_storage, "hashed_files", None)
+    if hashed and not settings.DEBUG:
+        return staticfiles_storage.hash_key(path) in hashed
+    return finders.find(path) is not None
+
+
+def optimize_image(name: str, data: bytes) -> bytes:
+    """PNG は可逆の最適化、JPEG は品質 85 で保存し直す。小さくならなければ元のまま"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        buf = io.BytesIO()
+        if name.lower().endswith(".png"):
+            image.save(buf, "PNG", optimize=True)
+        else:
+            image.convert("RGB").save(buf, "JPEG", quality=85, optimize=True, progressive=True)
+    except Exception:
+        return data
+    return buf.getvalue() if buf.tell() < len(data) else data
+
+
+class StaticAssetStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise の指紋付き名前＋.gz / .br（brotli が入っていれば）に、画像の再圧縮を足したもの
+    - 再圧縮は書き込み（_save）のたび。指紋付きのコピーは元ファイルから作り直されるので、結果は中身のハッシュで使い回す
+    - collectstatic をまだしていない（マニフェストが無い）開発・テストでは指紋なしの名前を返す
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._optimized = {}
+
+    def _save(self, name, content):
+        if name.lower().endswith((".png", ".jpg", ".jpeg")):
+            data = content.read()
+            key = hashlib.sha1(data).hexdigest()
+            if key not in self._optimized:
+                self._optimized[key] = optimize_image(name, data)
+            content = ContentFile(self._optimized[key])
+        return super()._save(name, content)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:
+                raise
+            return name
@@ -0,0 +1,131 @@
+"""
+カート（セッションに保存）
+
+セッションには 商品ID と数量だけを "12:3,45:1" の形の短い文字列で持ち、商品の中身は表示のときにまとめて読みます
+（セッションの行・キャッシュが小さいほど保存が軽い。以前の {"商品ID": 数量} の形もそのまま読める）。
+- load(): カートの全商品を in_bulk の 1 クエリで読み、実売価格（特売なら特売価格）は DB 側で計算
+- count(): ヘッダーのバッジ用。商品は読まずにセッションの数量を足すだけ
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.db.models import Case, F, Q, When
+
+from .models import Product, Shop
+
+SESSION_KEY = "cart"
+
+
+# ==========================================
+# 1. セッション上のカート操作
+# ==========================================
+
+def encode(items: Dict[int, int]) -> str:
+    """{12: 3, 45: 1} → '12:3,45:1'"""
+    return ",".join(f"{product_id}:{quantity}" for product_id, quantity in items.items())
+
+def decode(value) -> Dict[int, int]:
+    """encode() の逆。以前の dict の形も読む（壊れた値は読み飛ばす）"""
+    if isinstance(value, dict):
+        pairs = value.items()
+    elif isinstance(value, str):
+        pairs = (part.partition(":")[::2] for part in value.split(",") if part)
+    else:
+        return {}
+    items = {}
+    for product_id, quantity in pairs:
+        try:
+            items[int(product_id)] = int(quantity)
+        except (TypeError, ValueError):
+            continue
+    return items
+
+def get_items(session) -> Dict[int, int]:
+    """{商品ID: 数量}"""
+    return decode(session.get(SESSION_KEY))
+
+def _save(session, items: Dict[int, int]) -> None:
+    if items:
+        session[SESSION_KEY] = encode(items)
+    else:
+        clear(session)
+
+def add(session, product_id: int, quantity: int = 1) -> None:
+    items = get_items(session)
+    items[product_id] = items.get(product_id, 0) + quantity
+    _save(session, items)
+
+def remove(session, product_id: int) -> None:
+    items = get_items(session)
+    if product_id in items:
+        del items[product_id]
+        _save(session, items)
+
+def clear(session) -> None:
+    if SESSION_KEY in session:
+        del session[SESSION_KEY]
+
+def count(session) -> int:
+    """カート内の点数（商品は読まない）"""
+    return sum(get_items(session).values())
+
+
+# ==========================================
+# 2. 表示用にまとめて読み込む
+# ==========================================
+
+@dataclass
+class CartLine:
+    product: Product
+    quantity: int
+    unit_price: int
+    subtotal: int
+
+
+@dataclass
+class ShopGroup:
+    """お店ごとの受け取り単位"""
+    shop: Optional[Shop]
+    lines: List[CartLine] = field(default_factory=list)
+    subtotal: int = 0
+
+
+@dataclass
+class Cart:
+    lines: List[CartLine]
+    shops: List[ShopGroup]
+    total: int
+
+    @property
+    def count(self) -> int:
+        return sum(line.quantity for line in self.lines)
+
+
+def with_effective_price(queryset):
+    """effective_price = 特売中かつ特売価格ありなら sale_price、それ以外は price"""
+    return queryset.annotate(effective_price=Case(
+        When(Q(is_sale=True, sale_price__isnull=False) & ~Q(sale_price=0), then=F("sale_price")),
+        default=F("price"),
+    ))
+
+
+def load(session) -> Cart:
+    """カートの商品を 1 クエリで読み、明細・お店ごとの小計・合計を作る"""
+    items = get_items(session)
+    products = with_effective_price(Product.objects.select_related("shop")).in_bulk(list(items))
+
+    lines = []
+    groups: "OrderedDict[Optional[int], ShopGroup]" = OrderedDict()
+    for product_id, quantity in items.items():
+        product = products.get(product_id)
+        if product is None:
+            continue  # 削除された商品はスキップ
+        line = CartLine(product, quantity, product.effective_price, product.effective_price * quantity)
+        lines.append(line)
+
+        group = groups.setdefault(product.shop_id, ShopGroup(shop=product.shop))
+        group.lines.append(line)
+        group.subtotal += line.subtotal
+
+    return Cart(lines=lines, shops=list(groups.values()), total=sum(line.subtotal for line in lines))
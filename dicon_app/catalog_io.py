@@ -0,0 +1,357 @@
+"""
+カタログ（通り・店舗・商品・セット・イベント…）のまとめて取り込み・書き出し
+
+loaddata はファイル全体を読み込んでから 1 行ずつ save するので、件数が増えると遅くメモリも食います。
+ここでは manage.py import_catalog / export_catalog 用に：
+- 読み込みはストリーム。JSON 配列（loaddata と同じ形式）も JSONL（1 行 1 レコード）も少しずつ読む
+- 同じモデルのレコードを batch_size 件ためて、外部キーの存在確認はバッチごとに 1 クエリ、
+  既存行の判定も 1 クエリで bulk_create / bulk_update（バッチごとにトランザクション）
+- 親（通り→店舗→商品）がまだ来ていない行は最後にもう一度試し、それでも無ければ飛ばして報告
+- セット⇔商品の多対多は全部読み終わってから、through テーブルにまとめて入れる
+- モデルに無いフィールド（data.json の店舗の summary など）は読み飛ばして件数だけ報告。
+  ファイルに無いフィールドはモデルの既定値になる
+bulk_create は save() もシグナルも通らないので、save() で入る値は fill_auto_fields() で入れ、
+キャッシュ類（トップページ・特売プール・検索・ページの ETag）は最後にまとめて捨てます。
+作成日時（auto_now_add）はファイルにあればその値のまま入れます（無い行だけ取り込んだ時刻）。
+"""
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from . import home_cache, sale_pool, search, versions
+from .models import (
+    ConciergeItem, ConsultationItem, Event, HeroSlide, HomePickup, Partner, Product, Set, Shop, Street,
+)
+
+# 親から順に（書き出しもこの順。取り込みの最後のまとめ処理もこの順）
+CATALOG_MODELS = (Street, Shop, Product, Set, Event, HeroSlide, HomePickup, Partner, ConciergeItem, ConsultationItem)
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK = 64 * 1024
+
+
+def model_label(model) -> str:
+    return model._meta.label_lower
+
+
+MODELS_BY_LABEL = {model_label(model): model for model in CATALOG_MODELS}
+
+
+def guess_format(path: str) -> str:
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "json"
+
+
+# ==========================================
+# 1. ストリームで読む
+# ==========================================
+
+def iter_records(fp: IO[str], fmt: str = "json") -> Iterator[dict]:
+    if fmt == "jsonl":
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+        return
+    yield from _iter_json_array(fp)
+
+
+def _iter_json_array(fp: IO[str]) -> Iterator[dict]:
+    """[ {...}, {...} ] を先頭から 1 要素ずつ（全体は読み込まない）"""
+    decoder = json.JSONDecoder()
+    buf = fp.read(READ_CHUNK).lstrip()
+    if not buf.startswith("["):
+        raise ValueError("JSON の配列（[ ... ]）ではありません")
+    buf = buf[1:]
+    while True:
+        buf = buf.lstrip().lstrip(",").lstrip()
+        if buf.startswith("]"):
+            return
+        if buf:
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                obj = None  # 要素の途中でバッファが切れている
+            else:
+                yield obj
+                buf = buf[end:]
+                continue
+        more = fp.read(READ_CHUNK)
+        if not more:
+            raise ValueError("JSON の配列が途中で終わっています")
+        buf += more
+
+
+# ==========================================
+# 2. 取り込み
+# ==========================================
+
+@dataclass
+class ImportStats:
+    created: Counter = field(default_factory=Counter)
+    updated: Counter = field(default_factory=Counter)
+    skipped: Counter = field(default_factory=Counter)
+    links: int = 0
+    unknown_fields: Counter = field(default_factory=Counter)   # (モデル, フィールド) → 件数
+    unknown_models: Counter = field(default_factory=Counter)
+    seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        return sum(self.created.values()) + sum(self.updated.values())
+
+
+@dataclass
+class _Row:
+    instance: models.Model
+    present: frozenset            # レコードにあった（＝更新する）フィールドの attname
+    m2m: Dict[str, list]
+
+
+class CatalogImporter:
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, log=None):
+        self.batch_size = max(1, batch_size)
+        self.log = log or (lambda message: None)
+        self.stats = ImportStats()
+        self.buffers: Dict[type, List[_Row]] = defaultdict(list)
+        self.deferred: Dict[type, List[_Row]] = defaultdict(list)
+        self.links: Dict[Tuple[type, str], List[Tuple[object, list]]] = defaultdict(list)
+
+    # ---- 1 レコード → インスタンス ----
+
+    def _build(self, model, record) -> _Row:
+        instance = model()
+        present, m2m = set(), {}
+        opts = model._meta
+        for name, value in (record.get("fields") or {}).items():
+            try:
+                f = opts.get_field(name)
+            except Exception:
+                self.stats.unknown_fields[(model_label(model), name)] += 1
+                continue
+            if f.many_to_many:
+                m2m[f.name] = list(value or [])
+            elif not f.concrete or f.primary_key:
+                self.stats.unknown_fields[(model_label(model), name)] += 1
+            elif f.is_relation:
+                setattr(instance, f.attname, value)
+                present.add(f.attname)
+            else:
+                setattr(instance, f.attname, f.to_python(value))
+                present.add(f.attname)
+        if record.get("pk") is not None:
+            instance.pk = opts.pk.to_python(record["pk"])
+        if hasattr(instance, "fill_auto_fields"):
+            instance.fill_auto_fields()
+            present |= {f.attname for f in opts.concrete_fields if f.name in ("geohash", "slug")}
+        return _Row(instance, frozenset(present), m2m)
+
+    def add(self, record: dict) -> None:
+        model = MODELS_BY_LABEL.get(str(record.get("model", "")).lower())
+        if model is None:
+            self.stats.unknown_models[record.get("model")] += 1
+            return
+        # 親モデルの行がたまっていたら先に書く（外部キーの確認が通るように）
+        for parent in _parents(model):
+            if self.buffers[parent]:
+                self._flush(parent)
+        self.buffers[model].append(self._build(model, record))
+        if len(self.buffers[model]) >= self.batch_size:
+            self._flush(model)
+
+    def _flush(self, model, rows: Optional[List[_Row]] = None, final: bool = False) -> None:
+        if rows is None:
+            rows, self.buffers[model] = self.buffers[model], []
+        if not rows:
+            return
+
+        # 外部キー：参照先の pk をバッチごとに 1 クエリで確認
+        ok = rows
+        for fk in _foreign_keys(model):
+            ids = {getattr(row.instance, fk.attname) for row in ok} - {None}
+            existing = set(fk.related_model._default_manager.filter(pk__in=ids).values_list("pk", flat=True))
+            keep = []
+            for row in ok:
+                value = getattr(row.instance, fk.attname)
+                if value is None or value in existing:
+                    keep.append(row)
+                elif final:
+                    self.stats.skipped[model_label(model)] += 1
+                    self.log(f"  skip {model_label(model)} pk={row.instance.pk}: {fk.name}={value} がありません")
+                else:
+                    self.deferred[model].append(row)  # 親が後から来るかもしれない
+            ok = keep
+        if not ok:
+            return
+
+        pks = [row.instance.pk for row in ok if row.instance.pk is not None]
+        existing = set(model._default_manager.filter(pk__in=pks).values_list("pk", flat=True))
+        creates = [row for row in ok if row.instance.pk not in existing]
+        updates = defaultdict(list)
+        now = timezone.now()
+        for row in ok:
+            if row.instance.pk in existing:
+                if hasattr(row.instance, "updated_at"):
+                    row.instance.updated_at = now
+                    updates[row.present | {"updated_at"}].append(row.instance)
+                else:
+                    updates[row.present].append(row.instance)
+
+        # 作成日時はファイルの値を使う（auto_now_add のままだと bulk_create で全部「今」になる）
+        stamps = [f for f in model._meta.concrete_fields if getattr(f, "auto_now_add", False)]
+        for row in creates:
+            for f in stamps:
+                if getattr(row.instance, f.attname) is None:
+                    setattr(row.instance, f.attname, now)
+
+        with transaction.atomic(), manual_timestamps(model):
+            model._default_manager.bulk_create([row.instance for row in creates], batch_size=self.batch_size)
+            for present, instances in updates.items():
+                fields = [f.name for f in model._meta.concrete_fields if f.attname in present and not f.primary_key]
+                if fields:
+                    model._default_manager.bulk_update(instances, fields, batch_size=self.batch_size)
+        self.stats.created[model_label(model)] += len(creates)
+        self.stats.updated[model_label(model)] += sum(len(instances) for instances in updates.values())
+
+        for row in ok:
+            for name, targets in row.m2m.items():
+                self.links[(model, name)].append((row.instance.pk, targets))
+
+    def finish(self) -> ImportStats:
+        for model in CATALOG_MODELS:
+            self._flush(model)
+        for model in CATALOG_MODELS:
+            rows, self.deferred[model] = self.deferred[model], []
+            self._flush(model, rows, final=True)
+        self._write_links()
+        self._after_import()
+        return self.stats
+
+    def _write_links(self) -> None:
+        """多対多：そのバッチの元の行の関連を消して入れ直す（無い相手は飛ばす）"""
+        for (model, name), pairs in self.links.items():
+            m2m = model._meta.get_field(name)
+            through = m2m.remote_field.through
+            source, target = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+            for start in range(0, len(pairs), self.batch_size):
+                chunk = pairs[start:start + self.batch_size]
+                wanted = {pk for _, targets in chunk for pk in targets}
+                existing = set(m2m.related_model._default_manager.filter(pk__in=wanted).values_list("pk", flat=True))
+                links = [through(**{f"{source}_id": pk, f"{target}_id": other})
+                         for pk, targets in chunk for other in dict.fromkeys(targets) if other in existing]
+                with transaction.atomic():
+                    through._default_manager.filter(**{f"{source}_id__in": [pk for pk, _ in chunk]}).delete()
+                    through._default_manager.bulk_create(links, batch_size=self.batch_size)
+                self.stats.links += len(links)
+
+    def _after_import(self) -> None:
+        after_bulk_write([model for model in CATALOG_MODELS
+                          if self.stats.created[model_label(model)] or self.stats.updated[model_label(model)]])
+
+
+@contextmanager
+def manual_timestamps(*models_):
+    """auto_now_add を一時的に止める（過去の日時の行をそのまま bulk_create で入れるため）"""
+    fields = [f for model in models_ for f in model._meta.concrete_fields if getattr(f, "auto_now_add", False)]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f in fields:
+            f.auto_now_add = True
+
+
+def after_bulk_write(models_: List[type]) -> None:
+    """
+    bulk_create / bulk_update のあと（シグナルが出ないので）：
+    連番を進め（pk を指定して入れたとき。loaddata と同じ）、キャッシュ類をまとめて捨てる
+    """
+    if not models_:
+        return
+    statements = connection.ops.sequence_reset_sql(no_style(), models_)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+    home_cache.invalidate()
+    sale_pool.invalidate()
+    search.invalidate_all()
+    versions.bump(*[model for model in models_ if model in MODELS_BY_LABEL.values()])
+
+
+def _foreign_keys(model) -> List[models.ForeignKey]:
+    return [f for f in model._meta.concrete_fields if f.is_relation and f.many_to_one]
+
+
+def _parents(model) -> List[type]:
+    return [f.related_model for f in _foreign_keys(model) if f.related_model in MODELS_BY_LABEL.values()]
+
+
+def import_records(records: Iterable[dict], batch_size: int = DEFAULT_BATCH_SIZE, log=None) -> ImportStats:
+    start = time.perf_counter()
+    importer = CatalogImporter(batch_size, log)
+    for record in records:
+        importer.add(record)
+    stats = importer.finish()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+# ==========================================
+# 3. 書き出し
+# ==========================================
+
+def iter_export(models_: Iterable = CATALOG_MODELS, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[dict]:
+    """loaddata と同じ形（{"model", "pk", "fields"}）で 1 件ずつ。pk のキーセットで batch_size 件ずつ読む"""
+    for model in models_:
+        opts = model._meta
+        concrete = [f for f in opts.concrete_fields if not f.primary_key]
+        m2m_fields = [f for f in opts.many_to_many]
+        last = None
+        while True:
+            queryset = model._default_manager.order_by("pk")
+            if last is not None:
+                queryset = queryset.filter(pk__gt=last)
+            rows = list(queryset.values("pk", *[f.attname for f in concrete])[:batch_size])
+            if not rows:
+                break
+            last = rows[-1]["pk"]
+            links = {f.name: _links(f, [row["pk"] for row in rows]) for f in m2m_fields}
+            for row in rows:
+                fields = {f.name: row[f.attname] for f in concrete}
+                for name, by_pk in links.items():
+                    fields[name] = by_pk.get(row["pk"], [])
+                yield {"model": model_label(model), "pk": row["pk"], "fields": fields}
+
+
+def _links(m2m, pks) -> Dict[object, list]:
+    through = m2m.remote_field.through
+    source, target = f"{m2m.m2m_field_name()}_id", f"{m2m.m2m_reverse_field_name()}_id"
+    by_pk = defaultdict(list)
+    for pk, other in (through._default_manager.filter(**{f"{source}__in": pks})
+                      .order_by(source, target).values_list(source, target)):
+        by_pk[pk].append(other)
+    return by_pk
+
+
+def write_records(records: Iterable[dict], fp: IO[str], fmt: str = "json") -> int:
+    """書いた件数を返す。JSON 配列も 1 件ずつ書き足す（全体をメモリに作らない）"""
+    count = 0
+    if fmt == "jsonl":
+        for record in records:
+            fp.write(json.dumps(record, ensure_ascii=False, cls=DjangoJSONEncoder) + "\n")
+            count += 1
+        return count
+    fp.write("[")
+    for record in records:
+        fp.write(",\n" if count else "\n")
+        fp.write(json.dumps(record, ensure_ascii=False, cls=DjangoJSONEncoder, indent=2))
+        count += 1
+    fp.write("\n]\n")
+    return count
@@ -0,0 +1,7 @@
+from . import cart as cart_service
+
+
+def cart(request):
+    """ヘッダーのカートバッジ用。テンプレートで使われたときだけ数える（商品は読まない）"""
+    session = getattr(request, "session", None)
+    return {"cart_count": (lambda: cart_service.count(session)) if session is not None else 0}
@@ -0,0 +1,68 @@
+"""
+django.db.backends.postgresql に接続プール（dicon_app/db_pool.py）を足したもの
+
+settings の DATABASES で ENGINE をこれにし、POOL に MIN_SIZE などを書く（config/settings.py の 4.）。
+Django が接続を開く・閉じるところ（get_new_connection / _close）を、プールから借りる・プールに返すに置き換えるだけなので、
+リクエストの終わりの close（CONN_MAX_AGE=0）でそのままプールに戻ります。
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from dicon_app import db_pool
+
+
+def _is_alive(raw) -> bool:
+    return not raw.closed
+
+
+def _reset(raw) -> bool:
+    """トランザクションが残っていたら巻き戻す。接続が壊れていたら False"""
+    if raw.closed:
+        return False
+    status = raw.info.transaction_status
+    if status == 0:  # IDLE
+        return True
+    if status in (2, 3):  # INTRANS / INERROR
+        raw.rollback()
+        return raw.info.transaction_status == 0
+    return False  # ACTIVE（結果を読み残している）/ UNKNOWN（切れた）
+
+
+def _ping(raw) -> bool:
+    with raw.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    if not raw.autocommit:
+        raw.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _pool(self, conn_params):
+        key = repr(sorted((k, str(v)) for k, v in conn_params.items()))
+        options = self.settings_dict.get("POOL") or {}
+        return db_pool.get_pool(self.alias, key, lambda: db_pool.ConnectionPool(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            _is_alive, _reset, _ping, **options))
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool(conn_params)
+        connection = pool.acquire()
+        # 使い回しの接続では親クラスの get_new_connection を通らないので、ここで合わせる
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get("isolation_level", IsolationLevel.READ_COMMITTED))
+        self._connection_pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = getattr(self, "_connection_pool", None)
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # atomic の途中で閉じられた接続は Django がまだ握っているので、プールには戻さない
+                pool.discard(self.connection)
+            else:
+                pool.release(self.connection)
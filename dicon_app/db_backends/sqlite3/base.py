@@ -0,0 +1,50 @@
+"""
+django.db.backends.sqlite3 を 1 台運用（小さな商店街）向けに調整したもの
+
+settings の DATABASES で ENGINE をこれにする（SQLITE_TUNED=1 のとき config/settings.py の 4. が切り替える）。
+接続を開くたびに PRAGMA を流し、atomic の書き込みトランザクションは BEGIN IMMEDIATE で始めます。
+- journal_mode=WAL: 読み取りが書き込みを待たない（書き込みは 1 本ずつのまま）。DB ファイルに残る設定
+- synchronous=NORMAL: コミットごとの fsync をやめ、チェックポイントでまとめる（WAL なら壊れない。
+  電源断で直前のコミットが消えることはある）
+- mmap_size: 読み取りをメモリマップで（ページのコピーが減る）
+- cache_size: 接続ごとのページキャッシュを既定の 2MB から広げる
+- busy_timeout: ロック中なら待ってから "database is locked" にする
+- BEGIN IMMEDIATE: 既定の BEGIN（DEFERRED）は読んでから書くときに書き込みロックへ上げようとして、
+  ほかの書き込みとぶつかると busy_timeout を待たずに失敗する（セッション保存・get_or_create がこの形）。
+  最初に書き込みロックを取れば、ほかの書き込みが終わるのを busy_timeout まで待つだけになる
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULTS = {
+    "BUSY_TIMEOUT": 10000,          # ミリ秒
+    "JOURNAL_MODE": "WAL",
+    "SYNCHRONOUS": "NORMAL",
+    "MMAP_SIZE": 256 * 1024 * 1024,  # バイト
+    "CACHE_SIZE": 32 * 1024,        # KiB（接続ごと）
+    "TEMP_STORE": "MEMORY",
+}
+
+
+def pragmas(options=None):
+    """接続ごとに流す PRAGMA。busy_timeout を先に（journal_mode の切り替えもロックを待てるように）"""
+    options = {**DEFAULTS, **{k.upper(): v for k, v in (options or {}).items()}}
+    return [
+        f"PRAGMA busy_timeout = {int(options['BUSY_TIMEOUT'])}",
+        f"PRAGMA journal_mode = {options['JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {options['SYNCHRONOUS']}",
+        f"PRAGMA mmap_size = {int(options['MMAP_SIZE'])}",
+        f"PRAGMA cache_size = -{int(options['CACHE_SIZE'])}",  # 負の値は KiB 指定
+        f"PRAGMA temp_store = {options['TEMP_STORE']}",
+    ]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in pragmas(self.settings_dict.get("TUNING")):
+            conn.execute(statement).fetchall()  # journal_mode は結果を返すので読み切る
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
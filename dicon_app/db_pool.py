@@ -0,0 +1,288 @@
+"""
+PostgreSQL の接続プール（プロセス内。dicon_app/db_backends/postgresql が使う）
+
+CONN_MAX_AGE=0 だとリクエストのたびに接続し直し（TCP＋認証で数 ms）、ホームのような小さいクエリの多いページでは
+それが DB 時間より長くなります。持続接続（CONN_MAX_AGE>0）はスレッドごとに 1 本を抱えたままなので、
+gunicorn の --threads を増やすと接続数も増えます。ここではワーカー（プロセス）ごとに 1 つのプールを持ち、
+リクエストの終わりに接続を返して、次のリクエスト（別のスレッドでも）が使い回します。
+- 最小・最大の本数（MIN_SIZE / MAX_SIZE）。使い切ったら TIMEOUT 秒まで空きを待ち、だめなら OperationalError
+- 貸し出す前の死活確認：切れていないか・トランザクションが残っていないかは毎回、
+  CHECK_AFTER 秒以上使われていなかった接続は SELECT 1 まで
+- MAX_LIFETIME 秒を過ぎた接続は返ってきたときに閉じる（DB・プロキシ側の切断やメモリの膨らみ対策）
+- MAX_IDLE 秒使われなかった接続は MIN_SIZE まで減らす
+- 待ち時間・飽和（貸出中 / 最大）・作成・破棄の数を stats() で。スタッフ用の /_debug/queries/ にも出る
+プールは (プロセス ID, 接続先) ごと。gunicorn の fork 前に作られた接続は子プロセスでは使わない（閉じもしない）。
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional
+
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "MIN_SIZE": 1,
+    "MAX_SIZE": 10,
+    "TIMEOUT": 5.0,          # 空きを待つ最大秒数
+    "MAX_LIFETIME": 1800.0,  # 接続を使い続ける最大秒数
+    "MAX_IDLE": 300.0,       # これより長く使われなければ MIN_SIZE まで閉じる
+    "CHECK_AFTER": 5.0,      # これより長く使われていなければ SELECT 1 で確かめてから貸す
+}
+
+
+class PoolTimeout(OperationalError):
+    """TIMEOUT 秒待っても空きが出なかった"""
+
+
+@dataclass
+class _Entry:
+    raw: object
+    created: float
+    last_used: float
+
+
+class _Waiter:
+    """空きを待っている 1 スレッド。返ってきた接続（か、新しく作ってよい枠）を直接渡す"""
+    __slots__ = ("event", "entry")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None
+
+
+_NEW = object()  # 「枠が空いたので自分で接続して」の印
+
+
+class ConnectionPool:
+
+    def __init__(self, connect: Callable[[], object], is_alive: Callable[[object], bool],
+                 reset: Callable[[object], bool], ping: Callable[[object], bool], **options):
+        """
+        connect: 新しい接続を作る / is_alive: 切れていないか（通信なし）
+        reset: 返ってきた接続を次に貸せる状態にする（だめなら False） / ping: SELECT 1 が通るか
+        """
+        self.options = {**DEFAULTS, **{k.upper(): v for k, v in options.items()}}
+        self._connect, self._is_alive, self._reset, self._ping = connect, is_alive, reset, ping
+        self._lock = threading.Lock()
+        self._idle: List[_Entry] = []
+        self._in_use: Dict[int, _Entry] = {}
+        self._waiters: Deque[_Waiter] = deque()  # 先に待った順に渡す（返したスレッドの横取りで待ちが伸びないように）
+        self._size = 0  # 開いている本数（貸出中＋空き＋作成中）
+        self._stats = {"acquired": 0, "created": 0, "closed": 0, "unhealthy": 0, "expired": 0,
+                       "waits": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "timeouts": 0, "peak_in_use": 0}
+        for _ in range(int(self.options["MIN_SIZE"])):
+            try:
+                self._open_idle()
+            except Exception:
+                logger.warning("接続プールの事前接続に失敗しました", exc_info=True)
+                break
+
+    # ---- 貸し出し・返却 ----
+
+    def acquire(self):
+        start = time.perf_counter()
+        deadline = start + float(self.options["TIMEOUT"])
+        waited = False
+        while True:
+            waiter = entry = None
+            with self._lock:
+                if self._idle and not self._waiters:
+                    entry = self._idle.pop()  # 最後に返った（温まっている）接続から
+                elif self._size < self.options["MAX_SIZE"]:
+                    self._size += 1
+                    entry = _NEW
+                else:
+                    waiter = _Waiter()
+                    self._waiters.append(waiter)
+
+            if waiter is not None:
+                waited = True
+                waiter.event.wait(max(0.0, deadline - time.perf_counter()))
+                with self._lock:
+                    entry = waiter.entry
+                    if entry is None:  # 時間切れ（渡される直前でも、ロックの中で確かめる）
+                        self._waiters.remove(waiter)
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"接続プールが満杯です（{self.options['MAX_SIZE']} 本・"
+                                          f"{self.options['TIMEOUT']} 秒待ちました）")
+
+            if entry is _NEW:
+                entry = self._open()
+            elif not self._usable(entry):
+                self._discard(entry, "unhealthy")
+                if time.perf_counter() >= deadline:
+                    raise PoolTimeout("接続プールの接続がすべて使えませんでした")
+                continue
+
+            with self._lock:
+                self._in_use[id(entry.raw)] = entry
+                self._stats["acquired"] += 1
+                self._stats["peak_in_use"] = max(self._stats["peak_in_use"], len(self._in_use))
+                if waited:
+                    wait_ms = (time.perf_counter() - start) * 1000
+                    self._stats["waits"] += 1
+                    self._stats["wait_ms"] += wait_ms
+                    self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+            return entry.raw
+
+    def release(self, raw) -> None:
+        with self._lock:
+            entry = self._in_use.pop(id(raw), None)
+        if entry is None:  # このプールの接続ではない
+            _close_quietly(raw)
+            return
+        now = time.monotonic()
+        if now - entry.created > self.options["MAX_LIFETIME"]:
+            self._discard(entry, "expired")
+            return
+        try:
+            ok = self._reset(raw)
+        except Exception:
+            ok = False
+        if not ok:
+            self._discard(entry, "unhealthy")
+            return
+        entry.last_used = now
+        stale = []
+        with self._lock:
+            if not self._hand_over(entry):
+                self._idle.append(entry)
+                stale = self._trim(now)
+        for old in stale:
+            self._discard(old, "expired")
+
+    def discard(self, raw) -> None:
+        """使えなくなった接続（トランザクションの途中で閉じられたなど）を返さずに捨てる"""
+        with self._lock:
+            entry = self._in_use.pop(id(raw), None)
+        if entry is not None:
+            self._discard(entry, "unhealthy")
+        else:
+            _close_quietly(raw)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._discard(entry, "closed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(size=self._size, idle=len(self._idle), in_use=len(self._in_use),
+                         waiting=len(self._waiters), max_size=self.options["MAX_SIZE"])
+        stats["saturation"] = round(stats["in_use"] / stats["max_size"], 2) if stats["max_size"] else 0.0
+        stats["mean_wait_ms"] = round(stats["wait_ms"] / stats["waits"], 2) if stats["waits"] else 0.0
+        stats["wait_ms"] = round(stats["wait_ms"], 2)
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 2)
+        return stats
+
+    # ---- 内部 ----
+
+    def _hand_over(self, entry) -> bool:
+        """待っているスレッドがいれば渡す（ロックを持って呼ぶ）"""
+        if not self._waiters:
+            return False
+        waiter = self._waiters.popleft()
+        waiter.entry = entry
+        waiter.event.set()
+        return True
+
+    def _open(self) -> _Entry:
+        """枠（_size）を取った状態で呼ぶ。失敗したら枠を返す"""
+        try:
+            raw = self._connect()
+        except BaseException:
+            self._release_slot()
+            raise
+        now = time.monotonic()
+        with self._lock:
+            self._stats["created"] += 1
+        return _Entry(raw, now, now)
+
+    def _open_idle(self) -> None:
+        with self._lock:
+            self._size += 1
+        entry = self._open()
+        with self._lock:
+            self._idle.append(entry)
+
+    def _usable(self, entry: _Entry) -> bool:
+        now = time.monotonic()
+        if now - entry.created > self.options["MAX_LIFETIME"]:
+            return False
+        try:
+            if not self._is_alive(entry.raw):
+                return False
+            if now - entry.last_used > self.options["CHECK_AFTER"]:
+                return self._ping(entry.raw)
+        except Exception:
+            return False
+        return True
+
+    def _trim(self, now: float) -> List[_Entry]:
+        """MAX_IDLE を過ぎた空き接続を MIN_SIZE まで外す（ロックを持って呼ぶ。閉じるのは呼び出し側）"""
+        stale = []
+        while (self._idle and self._size - len(stale) > self.options["MIN_SIZE"]
+               and now - self._idle[0].last_used > self.options["MAX_IDLE"]):
+            stale.append(self._idle.pop(0))
+        return stale
+
+    def _release_slot(self) -> None:
+        """1 本減った。待っている人がいれば、その枠で新しく接続してもらう"""
+        with self._lock:
+            if not self._hand_over(_NEW):
+                self._size -= 1
+
+    def _discard(self, entry: _Entry, reason: str) -> None:
+        _close_quietly(entry.raw)
+        with self._lock:
+            self._stats["closed"] += 1
+            if reason in ("unhealthy", "expired"):
+                self._stats[reason] += 1
+        self._release_slot()
+
+
+def _close_quietly(raw) -> None:
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+# ==========================================
+# プロセスごとのプール
+# ==========================================
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, key: str, factory: Callable[[], ConnectionPool]) -> ConnectionPool:
+    """(プロセス ID, alias, 接続先) ごとに 1 つ。fork したら子プロセスで作り直す"""
+    pool_key = (os.getpid(), alias, key)
+    pool = _pools.get(pool_key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(pool_key)
+            if pool is None:
+                pool = _pools[pool_key] = factory()
+    return pool
+
+
+def all_stats() -> Dict[str, dict]:
+    """このプロセスのプールの統計 {alias: stats}"""
+    pid = os.getpid()
+    return {alias: pool.stats() for (owner, alias, _), pool in list(_pools.items()) if owner == pid}
+
+
+def close_all(alias: Optional[str] = None) -> None:
+    pid = os.getpid()
+    for (owner, pool_alias, _), pool in list(_pools.items()):
+        if owner == pid and alias in (None, pool_alias):
+            pool.close_all()
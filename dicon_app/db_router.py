@@ -0,0 +1,136 @@
+"""
+読み取りレプリカへの振り分け（DATABASE_ROUTERS）と、書いた人の読み取りをプライマリに固定するミドルウェア
+
+settings の DATABASE_REPLICA_URLS にレプリカを書くと DATABASES に replica1, replica2, ... が増えます。
+- カタログのページ（dicon_app.views のうちカート・レジ以外）での dicon_app のモデルの読み取りだけをレプリカへ
+  （リクエストごとに 1 台を選ぶ。同じページの中で別々のレプリカを見て食い違わないように）
+- セッション・ユーザー・注文（orders / payments / accounts）と、すべての書き込みはプライマリ（default）
+- そのリクエストで書き込みがあったら、以降の読み取りはプライマリ。さらに REPLICA_PIN_SECONDS 秒のあいだ
+  Cookie でその利用者をプライマリに固定する（レプリカの遅れで「カートに入れたのに出てこない」を防ぐ）
+- リクエストの外（manage.py のコマンド・シェル）は全部プライマリ
+- キャッシュに入れる中身（トップページの断片・特売プール・ページのバージョン・検索インデックス）は
+  primary_reads() の中でプライマリから作る。世代を進めた直後に遅れたレプリカから作ると、古い中身が
+  新しい世代のキーに入って次に変わるまで（304 も）出続けるため
+マイグレーションはプライマリだけ。レプリカへの複製は DB 側の仕事（手元の SQLite では manage.py sync_replica）。
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "primary_until"
+# レプリカに振り分けるアプリ（カタログ）
+REPLICA_APPS = {"dicon_app"}
+# dicon_app.views のうち、カートを読み書きするのでプライマリで動かすもの
+PRIMARY_VIEWS = {"add_to_cart", "remove_from_cart", "cart_detail", "checkout", "checkout_done", "profile",
+                 "query_log"}
+
+
+@dataclass
+class _Request:
+    replica: Optional[str]      # このリクエストで使うレプリカ（無ければ None）
+    pinned: bool = False        # 少し前に書き込んだ利用者
+    catalog: bool = False       # カタログのビューの中
+    wrote: bool = False         # このリクエストで書き込んだ
+    filling: int = 0            # primary_reads() の中（入れ子の深さ）
+
+
+_current: ContextVar[Optional[_Request]] = ContextVar("db_router_request", default=None)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+def pin_seconds() -> int:
+    return getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+
+def is_catalog_view(view_func) -> bool:
+    """カタログのビュー（dicon_app.views のうちカート・レジ・プロフィールなど以外）"""
+    return view_func.__module__ == "dicon_app.views" and view_func.__name__ not in PRIMARY_VIEWS
+
+
+@contextmanager
+def primary_reads():
+    """この中の読み取りはプライマリ（キャッシュに入れる中身を作るとき）"""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    state.filling += 1
+    try:
+        yield
+    finally:
+        state.filling -= 1
+
+
+# ==========================================
+# 1. ルーター
+# ==========================================
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if (state is None or state.replica is None or not state.catalog or state.pinned or state.wrote
+                or state.filling or model._meta.app_label not in REPLICA_APPS):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # どの DB も同じデータ（レプリカはプライマリの複製）
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+# ==========================================
+# 2. ミドルウェア
+# ==========================================
+
+class ReplicaPinMiddleware:
+    """リクエストごとの振り分けの状態を用意し、書き込んだ利用者に固定用の Cookie を渡す"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        available = replicas()
+        if not available:
+            return self.get_response(request)
+
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        state = _Request(replica=random.choice(available), pinned=pinned)
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        if state.wrote:
+            seconds = pin_seconds()
+            response.set_cookie(PIN_COOKIE, str(int(time.time()) + seconds), max_age=seconds,
+                                httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        if state is not None:
+            state.catalog = is_catalog_view(view_func)
+        return None
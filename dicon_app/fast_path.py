@@ -0,0 +1,74 @@
+"""
+セッション Cookie の無い閲覧者のカタログ表示を、セッション・ユーザーを読まずに返す（SESSIONLESS_CATALOG）
+
+はじめての訪問者やクローラーは、ヘッダーのカートバッジ（0）と「ログイン」ボタンのためだけに
+セッションとユーザーを用意されていました。Cookie にセッション ID が無い GET / HEAD で、行き先がカタログの
+ビュー（db_router.is_catalog_view。カート・レジ・プロフィールなどは除く）なら
+- request.session を作らない（読み込みも保存もしないので、セッションの行は作られない）
+- request.user ははじめから AnonymousUser
+- メッセージの保存先も用意しない
+表示はセッションがある場合と同じ（カートは空、未ログイン）。カートに入れる・ログインするとセッション Cookie が
+できるので、その人の次のリクエストからは通常どおりです。
+settings の MIDDLEWARE で標準の 3 つをこのモジュールの子クラスに差し替えて使います（admin の確認も子クラスで通る）。
+"""
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.middleware import MessageMiddleware as BaseMessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+
+from .db_router import is_catalog_view
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def is_sessionless(request) -> bool:
+    """このリクエストをセッションなしで処理するか（最初に聞かれたときに決めて、リクエストに覚えておく）"""
+    sessionless = getattr(request, "_sessionless", None)
+    if sessionless is None:
+        sessionless = request._sessionless = _decide(request)
+    return sessionless
+
+
+def _decide(request) -> bool:
+    if not getattr(settings, "SESSIONLESS_CATALOG", False) or request.method not in SAFE_METHODS:
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return is_catalog_view(match.func)
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+
+    def process_request(self, request):
+        if not is_sessionless(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if not is_sessionless(request):
+            return super().process_response(request, response)
+        # セッションのある人には別の HTML（バッジ・名前）を返すので、通常の道と同じく Vary: Cookie は付ける
+        patch_vary_headers(response, ("Cookie",))
+        return response
+
+
+class AuthenticationMiddleware(BaseAuthenticationMiddleware):
+
+    def process_request(self, request):
+        if is_sessionless(request):
+            request.user = AnonymousUser()
+        else:
+            super().process_request(request)
+
+
+class MessageMiddleware(BaseMessageMiddleware):
+
+    def process_request(self, request):
+        if not is_sessionless(request):
+            super().process_request(request)
@@ -0,0 +1,171 @@
+"""
+近くのお店（位置情報の検索）
+
+Shop.latitude / longitude から geohash（地図を格子に区切ったセルの文字列）を作って Shop.geohash に保存し、
+「近くのお店」は次の 2 段階で探します。
+1. SQL: 探す範囲（円を囲む四角）に重なる geohash セルを前方一致の範囲条件で引き、
+   さらに緯度・経度の四角で絞る（geohash の部分インデックスが効くので、店が何千件あっても数件〜数十件しか読まない）
+2. Python: 残った店だけ haversine で正確な距離を出して並べる（NumPy があればまとめて計算）
+
+位置情報のない店は geohash も空になり、部分インデックス（geohash IS NOT NULL）に入らないので最初から除かれます。
+"""
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from django.db.models import Q
+
+try:
+    import numpy as np
+except ImportError:  # NumPy は任意。なければ 1 件ずつ計算する
+    np = None
+
+EARTH_RADIUS_M = 6_371_000
+GEOHASH_PRECISION = 9  # 保存する精度（約 5m 四方）
+MAX_CELLS = 16         # 1回の検索で OR する geohash セルの上限
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+# ==========================================
+# 1. geohash
+# ==========================================
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """精度ごとのセルの大きさ（緯度の幅, 経度の幅）[度]"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(south: float, west: float, north: float, east: float) -> List[str]:
+    """四角を覆う geohash セル（MAX_CELLS 個以内に収まる、いちばん細かい精度で）"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = math.floor(north / lat_step) - math.floor(south / lat_step) + 1
+        cols = math.floor(east / lon_step) - math.floor(west / lon_step) + 1
+        if rows * cols <= MAX_CELLS:
+            break
+    cells = set()
+    for i in range(rows):
+        lat = min(south + i * lat_step, north)
+        for j in range(cols):
+            lon = min(west + j * lon_step, east)
+            cells.add(encode(lat, lon, precision))
+    # 端の行・列がセルの境目をまたぐときの取りこぼし防止
+    for lat in (south, north):
+        for lon in (west, east):
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def bounding_box(latitude: float, longitude: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """中心から radius_m の円を囲む四角 (south, west, north, east)"""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(latitude)), 1e-6)))
+    return (max(latitude - dlat, -90.0), max(longitude - dlon, -180.0),
+            min(latitude + dlat, 90.0), min(longitude + dlon, 180.0))
+
+
+# ==========================================
+# 2. 距離
+# ==========================================
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def distances_m(latitude: float, longitude: float, points: List[Tuple[float, float]]) -> List[float]:
+    """中心から各点までの距離。NumPy があればまとめて計算する"""
+    if np is None or len(points) < 32:
+        return [haversine_m(latitude, longitude, lat, lon) for lat, lon in points]
+    coords = np.radians(np.asarray(points, dtype=float))
+    phi1, lam1 = math.radians(latitude), math.radians(longitude)
+    a = (np.sin((coords[:, 0] - phi1) / 2) ** 2
+         + math.cos(phi1) * np.cos(coords[:, 0]) * np.sin((coords[:, 1] - lam1) / 2) ** 2)
+    return (2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))).tolist()
+
+
+# ==========================================
+# 3. 近くのお店
+# ==========================================
+
+@dataclass
+class NearbyShop:
+    pk: int
+    name: str
+    category: str
+    latitude: float
+    longitude: float
+    distance_m: float
+
+
+NEARBY_FIELDS = ("pk", "name", "category", "latitude", "longitude")
+DEFAULT_RADIUS_M = 500
+MAX_RADIUS_M = 50_000
+NEAREST_MAX_QUERIES = 3  # nearest() の SQL の回数の上限（query_budgets.py の shops_nearby の予算はこれが前提）
+
+
+def _cells_q(cells: List[str]) -> Q:
+    """geohash の前方一致を範囲条件で（LIKE より確実にインデックスが効く）"""
+    q = Q()
+    for cell in cells:
+        q |= Q(geohash__gte=cell, geohash__lt=cell + "~")  # "~" は geohash のどの文字より後ろ
+    return q
+
+
+def within_radius(latitude: float, longitude: float, radius_m: float, limit: Optional[int] = None,
+                  queryset=None) -> List[NearbyShop]:
+    """半径 radius_m 以内のお店を近い順に（SQL 1 回）"""
+    from .models import Shop
+
+    south, west, north, east = bounding_box(latitude, longitude, radius_m)
+    rows = list(
+        (queryset if queryset is not None else Shop.objects.all())
+        .filter(_cells_q(covering_cells(south, west, north, east)), geohash__isnull=False,
+                latitude__range=(south, north), longitude__range=(west, east))
+        .values_list(*NEARBY_FIELDS)
+    )
+    dists = distances_m(latitude, longitude, [(row[3], row[4]) for row in rows])
+    shops = [NearbyShop(*row, distance_m=round(d, 1)) for row, d in zip(rows, dists) if d <= radius_m]
+    shops.sort(key=lambda shop: (shop.distance_m, shop.pk))
+    return shops[:limit] if limit else shops
+
+
+def nearest(latitude: float, longitude: float, k: int = 10, queryset=None) -> List[NearbyShop]:
+    """
+    近い順に k 件。足りなければ半径を広げて探し直す（SQL は最大 NEAREST_MAX_QUERIES 回）
+    DEFAULT_RADIUS_M → 見積もった半径 → MAX_RADIUS_M。見積もりは見つかった店の密度から「k 件入りそうな半径」
+    （最低でも 2 倍、1 件もなければ 10 倍）。最後の 1 回は必ず MAX_RADIUS_M
+    """
+    radius = DEFAULT_RADIUS_M
+    for _ in range(NEAREST_MAX_QUERIES - 1):
+        shops = within_radius(latitude, longitude, radius, queryset=queryset)
+        if len(shops) >= k or radius >= MAX_RADIUS_M:
+            return shops[:k]
+        grow = math.sqrt(k / len(shops)) * 1.2 if shops else 10
+        radius = min(radius * max(grow, 2), MAX_RADIUS_M)
+    return within_radius(latitude, longitude, MAX_RADIUS_M, queryset=queryset)[:k]
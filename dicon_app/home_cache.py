@@ -0,0 +1,186 @@
+"""
+トップページ（home）のセクション別キャッシュ
+
+home() は特売・献立セット・イベントなど複数のセクションを集めて表示するため、
+毎回そのまま描画すると「セクションの数だけクエリ＋テンプレート描画」が走ります。
+ここでは各セクションを HTML 断片として個別にキャッシュし、
+担当モデルが保存・削除されたときだけ（signals.py から）そのセクションを捨てます。
+
+- TTL はセクションごと。settings.HOME_SECTION_TTLS で上書きできます。
+- 無効化は「世代番号」を進める方式。描画中の古いデータが後から書き込まれても、
+  古い世代のキーに入るだけなので次のリクエストでは使われません。
+- ヒット/ミス数はプロセス内カウンタで集計し、stats() で取り出せます。
+"""
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import sale_pool
+from .db_router import primary_reads
+from .models import (
+    HeroSlide, HomePickup, Product, Set,
+    ConsultationItem, Event, Partner,
+)
+
+KEY_PREFIX = "home"
+
+
+# ==========================================
+# 1. セクション定義
+# ==========================================
+
+@dataclass(frozen=True)
+class HomeSection:
+    name: str
+    template: str
+    models: Tuple[type, ...]   # 変更されたらこのセクションを捨てるモデル
+    ttl: int                   # 秒
+    load: Callable[[], dict]   # テンプレートに渡すコンテキストを作る
+    daily: bool = False        # True なら日付が変わるとキーも変わる（「今日以降」を扱うセクション用）
+
+
+def _load_hero():
+    return {"slides": list(HeroSlide.objects.filter(is_active=True).order_by('order')[:1])}
+
+def _load_sale():
+    # order_by('?') はやめて、セールプールから抽選（sale_pool.py）
+    return {"sale_products": sale_pool.draw(6)}
+
+def _load_sets():
+    return {"recommended_sets": list(Set.objects.filter(is_active=True).order_by('-created_at')[:3])}
+
+def _load_pickups():
+    return {"home_pickups": list(HomePickup.objects.filter(is_active=True).order_by('order')[:6])}
+
+def _load_consultation():
+    return {"consultation_items": list(ConsultationItem.objects.filter(is_active=True).order_by('order')[:3])}
+
+def _load_events():
+    today = timezone.localdate()
+    return {"upcoming_events": list(Event.objects.filter(is_active=True, start_date__gte=today).order_by('start_date')[:4])}
+
+def _load_partners():
+    return {"partners": list(Partner.objects.filter(is_active=True).order_by('order')[:4])}
+
+
+SECTIONS = (
+    HomeSection("hero", "dicon_app/home_sections/hero.html", (HeroSlide,), 600, _load_hero),
+    HomeSection("sale", "dicon_app/home_sections/sale.html", (Product,), 60, _load_sale),
+    HomeSection("sets", "dicon_app/home_sections/sets.html", (Set,), 600, _load_sets),
+    HomeSection("pickups", "dicon_app/home_sections/pickups.html", (HomePickup,), 600, _load_pickups),
+    HomeSection("consultation", "dicon_app/home_sections/consultation.html", (ConsultationItem,), 600, _load_consultation),
+    HomeSection("events", "dicon_app/home_sections/events.html", (Event,), 300, _load_events, daily=True),
+    HomeSection("partners", "dicon_app/home_sections/partners.html", (Partner,), 3600, _load_partners),
+)
+
+
+def section_models():
+    """無効化シグナルをつなぐ対象のモデル一覧"""
+    models = []
+    for section in SECTIONS:
+        for model in section.models:
+            if model not in models:
+                models.append(model)
+    return models
+
+
+def _ttl(section: HomeSection) -> int:
+    return getattr(settings, "HOME_SECTION_TTLS", {}).get(section.name, section.ttl)
+
+
+# ==========================================
+# 2. ヒット/ミス カウンタ
+# ==========================================
+
+_lock = threading.Lock()
+_counters: Counter = Counter()
+
+def _count(name: str, kind: str) -> None:
+    with _lock:
+        _counters[(name, kind)] += 1
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """{"sale": {"hit": 10, "miss": 1}, ...} の形で返す（このプロセス分）"""
+    with _lock:
+        return {
+            s.name: {"hit": _counters[(s.name, "hit")], "miss": _counters[(s.name, "miss")]}
+            for s in SECTIONS
+        }
+
+def reset_stats() -> None:
+    with _lock:
+        _counters.clear()
+
+
+# ==========================================
+# 3. 取得・無効化
+# ==========================================
+
+def _generation_key(name: str) -> str:
+    return f"{KEY_PREFIX}:gen:{name}"
+
+def _fragment_key(section: HomeSection, generation) -> str:
+    key = f"{KEY_PREFIX}:frag:{section.name}:{generation}"
+    if section.daily:
+        key += f":{timezone.localdate():%Y%m%d}"
+    return key
+
+
+def _generations() -> Dict[str, int]:
+    gen_keys = {s.name: _generation_key(s.name) for s in SECTIONS}
+    found = cache.get_many(gen_keys.values())
+    generations = {}
+    for name, key in gen_keys.items():
+        if key not in found:
+            # キャッシュから消えていたら新しい世代で始める（古い断片を拾わないように）
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        generations[name] = found[key]
+    return generations
+
+
+def get_sections() -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    全セクションの HTML 断片を返す。
+    戻り値: (セクション名 -> HTML, セクション名 -> "hit"/"miss")
+    """
+    generations = _generations()
+    keys = {s.name: _fragment_key(s, generations[s.name]) for s in SECTIONS}
+    cached = cache.get_many(keys.values())
+
+    html, status = {}, {}
+    for section in SECTIONS:
+        key = keys[section.name]
+        fragment = cached.get(key)
+        if fragment is None:
+            with primary_reads():  # 描画中の関連の読み込みも（レプリカの遅れを新しい世代に入れない）
+                fragment = render_to_string(section.template, section.load())
+            cache.set(key, fragment, _ttl(section))
+            status[section.name] = "miss"
+        else:
+            status[section.name] = "hit"
+        _count(section.name, status[section.name])
+        html[section.name] = mark_safe(fragment)
+    return html, status
+
+
+def invalidate(*names: str) -> None:
+    """指定セクション（省略時は全部）の世代を進めて、キャッシュ済み断片を使われなくする"""
+    names = names or tuple(s.name for s in SECTIONS)
+    generation = time.time_ns()
+    cache.set_many({_generation_key(name): generation for name in names}, None)
+
+
+def invalidate_model(model) -> None:
+    """model を表示しているセクションだけを無効化する"""
+    names = [s.name for s in SECTIONS if model in s.models]
+    if names:
+        invalidate(*names)
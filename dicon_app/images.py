@@ -0,0 +1,246 @@
+"""
+画像の縮小版（レスポンシブ画像）
+
+アップロードされた画像はそのまま（数百KB〜）表示すると重いので、
+決まった幅（IMAGE_VARIANT_WIDTHS）の WebP と JPEG をあらかじめ作っておき、
+テンプレートでは {% picture obj.image sizes="200px" %}（templatetags/images.py）で srcset 付きで出します。
+
+- 作成はリクエストの外：モデルの保存（signals.py）→ コミット後にワーカースレッドのプールへ。
+  Pillow の縮小・エンコードは GIL を離すので、スレッドでも並列に動きます。
+- 置き場所は元画像と同じストレージの variants/<元のパス>.<幅>w.<webp|jpg>（名前は元画像から決まる）
+- できあがった幅の一覧はキャッシュ（images:variants:<元のパス>）に入れ、テンプレートはそれを見るだけ。
+  まだ無い画像は元画像のまま表示されます。
+- 既存の画像は manage.py generate_image_variants でまとめて作れます。
+
+読み込み中の「空の箱」を避けるため、保存時に小さなプレースホルダ（代表色＋16px の WebP を data URI にしたもの、
+合わせて 150 文字ほど）も作ってモデルの image_color / image_lqip に入れておきます（4. を参照）。
+"""
+import base64
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (160, 320, 640, 1024)
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}),
+           "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True})}
+VARIANT_DIR = "variants"
+READY_KEY = "images:variants:{}"
+MISSING_TTL = 60  # 「まだ無い」はしばらく覚えておく（毎回ファイルを調べない）
+
+
+def widths() -> tuple:
+    return tuple(getattr(settings, "IMAGE_VARIANT_WIDTHS", DEFAULT_WIDTHS))
+
+
+def image_fields(model) -> List[str]:
+    return [f.name for f in model._meta.get_fields() if isinstance(f, models.ImageField)]
+
+
+# ==========================================
+# 1. 名前と「できているか」
+# ==========================================
+
+def variant_name(name: str, width: int, ext: str) -> str:
+    stem, _ = os.path.splitext(name)
+    return f"{VARIANT_DIR}/{stem}.{width}w.{ext}"
+
+
+def ready_widths(name: str, storage=default_storage) -> List[int]:
+    """作成済みの幅（キャッシュになければファイルを見て覚え直す）"""
+    if not name:
+        return []
+    key = READY_KEY.format(name)
+    ready = cache.get(key)
+    if ready is None:
+        ready = [w for w in widths() if storage.exists(variant_name(name, w, "webp"))]
+        cache.set(key, ready, None if ready else MISSING_TTL)
+    return ready
+
+
+def srcset(name: str, ext: str, storage=default_storage) -> str:
+    """"…/a.160w.webp 160w, …/a.320w.webp 320w" の形（まだ無ければ空文字）"""
+    return ", ".join(f"{storage.url(variant_name(name, w, ext))} {w}w" for w in ready_widths(name, storage))
+
+
+# ==========================================
+# 2. 縮小版を作る
+# ==========================================
+
+def generate(name: str, storage=default_storage, force: bool = False) -> Dict[str, int]:
+    """
+    1 枚分の縮小版を作って {"original": 元のバイト数, "variants": 作ったバイト数の合計, "count": 枚数} を返す
+    元画像より大きい幅は作らない。ストレージにもうあるファイルはそのまま（force なら作り直す）
+    「できているか」のキャッシュはワーカーごとなので、それだけで決めずにファイルも見る
+    （ほかのワーカーが配っているファイルを消して書き直さないように）
+    """
+    key = READY_KEY.format(name)
+    if not force and cache.get(key):
+        return {"original": 0, "variants": 0, "count": 0}
+
+    with storage.open(name, "rb") as f:
+        raw = f.read()
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(raw)))
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+    made, total, written = [], 0, 0
+    for width in widths():
+        if width >= image.width:
+            break
+        missing = {ext: variant_name(name, width, ext) for ext in FORMATS}
+        if not force:
+            missing = {ext: target for ext, target in missing.items() if not storage.exists(target)}
+        made.append(width)
+        if not missing:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for ext, target in missing.items():
+            fmt, options = FORMATS[ext]
+            frame = resized
+            if fmt == "JPEG" or not has_alpha:
+                frame = resized.convert("RGB")
+            buf = io.BytesIO()
+            frame.save(buf, fmt, **options)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buf.getvalue()))
+            total += buf.tell()
+            written += 1
+
+    cache.set(key, made, None if made else MISSING_TTL)
+    return {"original": len(raw), "variants": total, "count": written}
+
+
+# ==========================================
+# 3. ワーカープール
+# ==========================================
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, "IMAGE_VARIANT_WORKERS", 2),
+                                           thread_name_prefix="image-variants")
+        return _executor
+
+
+def _run(name, storage, on_done):
+    try:
+        generate(name, storage)  # force はしない（作り直しは manage.py generate_image_variants --force）
+        if on_done:
+            on_done()
+    except Exception:
+        logger.exception("縮小版を作れませんでした: %s", name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def schedule(name: str, storage=default_storage, on_done=None) -> None:
+    """縮小版の作成をプールに積む（同じ画像が作成待ちなら何もしない）"""
+    if not name:
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if getattr(settings, "IMAGE_VARIANTS_SYNC", False):
+        _run(name, storage, on_done)  # テストや単発スクリプト用：その場で作る
+    else:
+        _pool().submit(_run, name, storage, on_done)
+
+
+def schedule_instance(instance, fields: Optional[Iterable[str]] = None, on_done=None) -> None:
+    """モデルの画像フィールドのうち、縮小版がまだ無いものを積む"""
+    for field_name in fields or image_fields(type(instance)):
+        file = getattr(instance, field_name)
+        if file and not cache.get(READY_KEY.format(file.name)):
+            schedule(file.name, file.storage, on_done)
+
+
+# ==========================================
+# 4. プレースホルダ（代表色＋ごく小さいサムネイル）
+# ==========================================
+
+PLACEHOLDER_SIZE = 16  # data URI にするサムネイルの長辺（px）。CSS で引き伸ばすとぼかしになる
+PLACEHOLDER_QUALITY = 20
+
+
+def placeholder(fp) -> Dict[str, str]:
+    """
+    画像ファイルから {"color": "#rrggbb", "lqip": "data:image/webp;base64,..."} を作る
+    JPEG は draft で 1/8 までの縮小デコードにするので、大きな写真でも数ミリ秒で終わる
+    """
+    image = Image.open(fp)
+    image.draft("RGB", (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        # 透過は白背景に重ねる（ページの背景と同じ）
+        rgba = image.convert("RGBA")
+        image = Image.alpha_composite(Image.new("RGBA", rgba.size, "white"), rgba).convert("RGB")
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BOX)
+
+    # 代表色：4 色に減色していちばん面積の大きい色（平均色より「それらしい」色になる）
+    reduced = image.quantize(colors=4)
+    _, index = max(reduced.getcolors())
+    r, g, b = reduced.getpalette()[index * 3:index * 3 + 3]
+
+    buf = io.BytesIO()
+    image.save(buf, "WEBP", quality=PLACEHOLDER_QUALITY)
+    return {"color": f"#{r:02x}{g:02x}{b:02x}",
+            "lqip": "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")}
+
+
+def placeholder_for(file) -> Dict[str, str]:
+    """
+    ImageField の値から placeholder() を作る
+    アップロード直後（まだストレージに保存されていない）ならアップロードされた中身をそのまま読む
+    """
+    if not file:
+        return {"color": "", "lqip": ""}
+    if not getattr(file, "_committed", True):
+        upload = file.file
+        upload.seek(0)
+        try:
+            return placeholder(upload)
+        finally:
+            upload.seek(0)  # このあと FileField がストレージへ保存する
+    with file.storage.open(file.name, "rb") as f:
+        return placeholder(f)
+
+
+def fill_placeholder(instance, field_name: str = "image", force: bool = False) -> bool:
+    """
+    instance.<field>_color / <field>_lqip を埋める（保存はしない）。変わったら True
+    新しいアップロード、またはまだ作っていないときだけ計算する
+    """
+    file = getattr(instance, field_name)
+    color_attr, lqip_attr = f"{field_name}_color", f"{field_name}_lqip"
+    if not file:
+        changed = bool(getattr(instance, color_attr) or getattr(instance, lqip_attr))
+        setattr(instance, color_attr, "")
+        setattr(instance, lqip_attr, "")
+        return changed
+    if not force and getattr(file, "_committed", True) and getattr(instance, lqip_attr):
+        return False
+    result = placeholder_for(file)
+    setattr(instance, color_attr, result["color"])
+    setattr(instance, lqip_attr, result["lqip"])
+    return True
@@ -0,0 +1,361 @@
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import Resolver404, get_resolver, resolve, reverse
+
+from dicon_app.management.commands.generate_dataset import USERNAME_PREFIX
+from dicon_app.management.commands.show_urls import iter_url_patterns
+from dicon_app.models import Event, Product, Set, Shop
+from dicon_app.views import LISTINGS
+from orders.models import Order
+
+BENCH_USERNAME = "__bench__"
+SAMPLES = 20  # 引数つきの URL は、ルートごとにこの数の値を順に使う
+BENCH_CSRF_TOKEN = "b" * 32  # wsgi_request の POST で Cookie とヘッダーの両方に入れる値
+
+# 計測しないもの（管理画面・スタッフ用・決済（Stripe に行く）・ログアウト・画像配信）
+SKIP_PREFIXES = ("admin/", "_debug/", "payments/", "accounts/logout/", "media/")
+SKIP_NAMES = {"media"}
+# カートを触るルート（"cart" の利用者だけが叩く）
+CART_ROUTES = {"dicon_app:add_to_cart", "dicon_app:remove_from_cart", "dicon_app:cart_detail",
+               "dicon_app:checkout", "dicon_app:checkout_done"}
+# クエリ文字列が無いと 400 になるもの
+QUERY_STRINGS = {
+    "dicon_app:shops_nearby": [{"lat": 43.1906, "lon": 140.7880}, {"lat": 35.6812, "lon": 139.7671, "radius": 2000}],
+    "dicon_app:search": [{"q": "トマト"}, {"q": "八百屋"}, {"q": "セット", "kind": "set"}],
+}
+_PARAM = re.compile(r"<(?:(?P<converter>\w+):)?(?P<name>\w+)>")
+
+
+class Route:
+    def __init__(self, name, template):
+        self.name = name
+        self.template = template
+        self.urls = []
+        self.login_required = False
+
+
+class Visitor:
+    """1 人の利用者（Cookie を持ち回る）"""
+
+    def __init__(self, profile, cookies=None):
+        self.profile = profile
+        self.cookies = cookies or SimpleCookie()
+
+    def cookie_header(self):
+        return "; ".join(f"{key}={morsel.value}" for key, morsel in self.cookies.items())
+
+    def remember(self, headers):
+        for key, value in headers:
+            if key.lower() != "set-cookie":
+                continue
+            received = SimpleCookie()
+            received.load(value)
+            for name, morsel in received.items():
+                if morsel["max-age"] == "0" or not morsel.value:
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def wsgi_request(handler, visitor, url, method="GET"):
+    """WSGI ハンドラーにリクエストを 1 回（既定は GET）。(ステータス, ヘッダー, 本文のバイト数, クエリ数)"""
+    path, _, query = url.partition("?")
+    environ = {
+        "REQUEST_METHOD": method, "SCRIPT_NAME": "", "PATH_INFO": path, "QUERY_STRING": query,
+        "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "testserver", "REMOTE_ADDR": "127.0.0.1", "HTTP_COOKIE": visitor.cookie_header(),
+        "wsgi.version": (1, 0), "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+    }
+    if method == "POST":
+        # 本文なしのフォーム送信。CSRF は Cookie とヘッダーに同じ値を入れて通す
+        environ.update(CONTENT_TYPE="application/x-www-form-urlencoded", CONTENT_LENGTH="0",
+                       HTTP_X_CSRFTOKEN=BENCH_CSRF_TOKEN)
+        environ["HTTP_COOKIE"] = "; ".join(filter(None, [environ["HTTP_COOKIE"],
+                                                         f"{settings.CSRF_COOKIE_NAME}={BENCH_CSRF_TOKEN}"]))
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = int(status[:3]), headers
+
+    queries = [0]
+
+    def count(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():  # レプリカ（db_router.py）への読み取りも数える
+            stack.enter_context(connection.execute_wrapper(count))
+        response = handler(environ, start_response)
+        try:
+            size = sum(len(chunk) for chunk in response)
+        finally:
+            response.close()  # request_finished（本番と同じく接続の後始末まで）
+    visitor.remember(started["headers"])
+    return started["status"], started["headers"], size, queries[0]
+
+
+class Command(BaseCommand):
+    help = ("Load-test every route in-process through the WSGI handler (anonymous / logged-in / cart traffic) and "
+            "report p50/p95/p99 latency, queries per request and req/s per URL name; "
+            "--save writes a JSON baseline, --compare fails on regressions")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Measured requests (default: 2000)")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+        parser.add_argument("--mix", default="anonymous=70,user=20,cart=10",
+                            help="Traffic mix in percent (default: anonymous=70,user=20,cart=10)")
+        parser.add_argument("--only", nargs="+", metavar="URL_NAME", help="Only these routes, e.g. dicon_app:shop_list")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--debug", action="store_true",
+                            help="Keep DEBUG and query instrumentation as configured (default: run like production)")
+        parser.add_argument("--save", metavar="FILE", help="Write the results as a JSON baseline")
+        parser.add_argument("--compare", metavar="FILE", help="Compare with a saved baseline and fail on regressions")
+        parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Allowed p95 slowdown against the baseline (default: 0.25 = +25%%)")
+        parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                            help="Ignore p95 differences smaller than this (default: 2ms)")
+
+    def handle(self, *args, **options):
+        mix = self._parse_mix(options["mix"])
+        overrides = {"ALLOWED_HOSTS": ["*"]}
+        if not options["debug"]:
+            # DEBUG だと connection.queries に全 SQL をためるので、本番と同じ条件で測る
+            overrides.update(DEBUG=False, QUERY_INSTRUMENTATION=False)
+
+        with override_settings(**overrides):
+            user, temporary = self._bench_user()
+            try:
+                routes = self._routes(user, options["only"])
+                if not routes:
+                    raise CommandError("No routes to benchmark")
+                handler = WSGIHandler()
+                visitors = self._visitors(handler, user, mix, options["concurrency"])
+                self._warm_up(handler, routes, visitors)
+                results, wall = self._run(handler, routes, visitors, mix, options)
+            finally:
+                if temporary:
+                    user.delete()
+
+        report = self._report(results, wall, options)
+        if options["save"]:
+            with open(options["save"], "w", encoding="utf-8") as fp:
+                json.dump(report, fp, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Saved baseline to {options['save']}")
+        if options["compare"]:
+            self._compare(report, options)
+
+    # ---- 準備 ----
+
+    def _parse_mix(self, text):
+        mix = {}
+        for part in text.split(","):
+            profile, _, weight = part.partition("=")
+            if profile.strip() not in ("anonymous", "user", "cart"):
+                raise CommandError(f"--mix: unknown profile {profile!r} (anonymous / user / cart)")
+            mix[profile.strip()] = float(weight or 0)
+        if not any(mix.values()):
+            raise CommandError("--mix: all weights are zero")
+        return {profile: weight for profile, weight in mix.items() if weight > 0}
+
+    def _bench_user(self):
+        """注文履歴のある生成済みユーザー（generate_dataset）がいれば使い、いなければ一時ユーザーを作る"""
+        User = get_user_model()
+        user = (User.objects.filter(username__startswith=USERNAME_PREFIX, orders__isnull=False)
+                .order_by("pk").first())
+        if user is not None:
+            return user, False
+        user, created = User.objects.get_or_create(username=BENCH_USERNAME, defaults={"email": "bench@example.com"})
+        return user, created
+
+    def _routes(self, user, only):
+        """show_urls と同じ順で URL をたどり、引数を実際の行の値で埋める"""
+        values = {
+            "shop_pk": list(Shop.objects.order_by("pk").values_list("pk", flat=True)[:SAMPLES]),
+            "product_pk": list(Product.objects.order_by("pk").values_list("pk", flat=True)[:SAMPLES]),
+            "order_pk": list(Order.objects.filter(user=user).order_by("-pk").values_list("pk", flat=True)[:SAMPLES]),
+            "listing": list(LISTINGS),
+        }
+        values["product_id"] = values["product_pk"]
+        by_route = {
+            "dicon_app:product_detail": {"pk": values["product_pk"]},
+            "dicon_app:set_detail": {"pk": list(Set.objects.filter(is_active=True).order_by("pk")
+                                                .values_list("pk", flat=True)[:SAMPLES])},
+            "dicon_app:event_detail": {"slug": list(Event.objects.filter(is_active=True).order_by("pk")
+                                                    .values_list("slug", flat=True)[:SAMPLES])},
+        }
+
+        routes = {}
+        for path, _ in iter_url_patterns(get_resolver().url_patterns):
+            if path.startswith(SKIP_PREFIXES) or "(?P<" in path or "^" in path:
+                continue
+            example = "/" + _PARAM.sub("1", path)
+            try:
+                name = resolve(example).view_name
+            except Resolver404:
+                continue
+            if name in SKIP_NAMES or name in routes or (only and name not in only):
+                continue
+            route = Route(name, path)
+            params = [m.group("name") for m in _PARAM.finditer(path)]
+            choices = [by_route.get(name, {}).get(p, values.get(p)) for p in params]
+            if params and not all(choices):
+                self.stderr.write(f"  skip {name}: no sample value for {', '.join(params)}")
+                continue
+            for i in range(max([len(c) for c in choices] or [1])):
+                url = "/" + path
+                for p, c in zip(params, choices):
+                    url = re.sub(rf"<(?:\w+:)?{p}>", str(c[i % len(c)]), url, count=1)
+                for query in QUERY_STRINGS.get(name, [None]):
+                    route.urls.append(f"{url}?{urlencode(query)}" if query else url)
+            routes[name] = route
+        return list(routes.values())
+
+    def _visitors(self, handler, user, mix, concurrency):
+        """スレッドごとの利用者。anonymous は毎回 Cookie なし（クローラーと同じ）"""
+        visitors = []
+        for i in range(max(1, concurrency)):
+            per_thread = {"anonymous": Visitor("anonymous")}
+            if "user" in mix:
+                client = Client()
+                client.force_login(user)
+                per_thread["user"] = Visitor("user", SimpleCookie({k: m.value for k, m in client.cookies.items()}))
+            if "cart" in mix:
+                visitor = Visitor("cart")
+                for pk in Product.objects.order_by("pk").values_list("pk", flat=True)[i:i + 3]:
+                    wsgi_request(handler, visitor, reverse("dicon_app:add_to_cart", args=[pk]))
+                per_thread["cart"] = visitor
+            visitors.append(per_thread)
+        return visitors
+
+    def _warm_up(self, handler, routes, visitors):
+        """1 周ずつ叩いてキャッシュを温め、ログインが要るルート（ログイン画面へ飛ばされる）を見分ける"""
+        login_url = reverse(settings.LOGIN_URL)
+        for route in routes:
+            status, headers, _, _ = wsgi_request(handler, Visitor("anonymous"), route.urls[0])
+            location = dict((k.lower(), v) for k, v in headers).get("location", "")
+            route.login_required = status in (301, 302) and location.startswith(login_url)
+        for visitor in visitors[0].values():
+            for route in routes:
+                if route.name not in CART_ROUTES or visitor.profile == "cart":
+                    wsgi_request(handler, Visitor(visitor.profile, SimpleCookie(visitor.cookies)), route.urls[0])
+
+    # ---- 計測 ----
+
+    def _run(self, handler, routes, visitors, mix, options):
+        total, concurrency = options["requests"], len(visitors)
+        profiles, weights = list(mix), list(mix.values())
+        results = defaultdict(lambda: {"ms": [], "queries": [], "status": Counter()})
+        lock = threading.Lock()
+        catalog = [r for r in routes if r.name not in CART_ROUTES]
+        cart = [r for r in routes if r.name in CART_ROUTES]
+
+        def worker(index):
+            rng = random.Random(f"{options['seed']}:{index}")
+            done = 0
+            for _ in range(total // concurrency + (index < total % concurrency)):
+                profile = rng.choices(profiles, weights)[0]
+                candidates = cart if profile == "cart" and cart and rng.random() < 0.5 else catalog
+                candidates = [r for r in candidates if profile == "user" or not r.login_required] or catalog
+                route = rng.choice(candidates)
+                visitor = visitors[index][profile]
+                if profile == "anonymous":
+                    visitor = Visitor("anonymous")
+                start = time.perf_counter()
+                status, _, _, queries = wsgi_request(handler, visitor, rng.choice(route.urls))
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    entry = results[route.name]
+                    entry["ms"].append(elapsed)
+                    entry["queries"].append(queries)
+                    entry["status"][status] += 1
+                done += 1
+            return done
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            sum(pool.map(worker, range(concurrency)))
+        return results, time.perf_counter() - start
+
+    # ---- 結果 ----
+
+    def _report(self, results, wall, options):
+        count = sum(len(entry["ms"]) for entry in results.values())
+        routes = {}
+        self.stdout.write(f"{'route':<34} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'queries':>8} {'req/s':>7}  status")
+        for name in sorted(results):
+            entry = results[name]
+            mean = sum(entry["ms"]) / len(entry["ms"])
+            row = {
+                "n": len(entry["ms"]),
+                "p50_ms": round(percentile(entry["ms"], 0.50), 2),
+                "p95_ms": round(percentile(entry["ms"], 0.95), 2),
+                "p99_ms": round(percentile(entry["ms"], 0.99), 2),
+                "queries": round(sum(entry["queries"]) / len(entry["queries"]), 2),
+                # 1 ワーカーがこのルートだけを受けたときの処理能力（1 / 平均レイテンシ）
+                "rps": round(1000 / mean, 1) if mean else 0.0,
+                "status": {str(k): v for k, v in sorted(entry["status"].items())},
+            }
+            routes[name] = row
+            statuses = " ".join(f"{k}x{v}" for k, v in row["status"].items())
+            self.stdout.write(f"{name:<34} {row['n']:>5} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                              f"{row['p99_ms']:>8.2f} {row['queries']:>8.1f} {row['rps']:>7.0f}  {statuses}")
+        all_ms = [ms for entry in results.values() for ms in entry["ms"]]
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} requests in {wall:.1f}s: {count / wall:,.0f} req/s with {options['concurrency']} clients, "
+            f"p50 {percentile(all_ms, 0.5):.1f}ms p95 {percentile(all_ms, 0.95):.1f}ms "
+            f"p99 {percentile(all_ms, 0.99):.1f}ms"))
+        return {
+            "meta": {"requests": count, "concurrency": options["concurrency"], "mix": options["mix"],
+                     "seed": options["seed"], "debug": options["debug"], "rps": round(count / wall, 1)},
+            "routes": routes,
+        }
+
+    def _compare(self, report, options):
+        try:
+            with open(options["compare"], encoding="utf-8") as fp:
+                baseline = json.load(fp)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"{options['compare']}: {exc}")
+        regressions = []
+        for name, row in report["routes"].items():
+            before = baseline.get("routes", {}).get(name)
+            if before is None:
+                continue
+            delta = row["p95_ms"] - before["p95_ms"]
+            if delta > options["min_delta_ms"] and row["p95_ms"] > before["p95_ms"] * (1 + options["threshold"]):
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {row['p95_ms']:.2f}ms")
+            if row["queries"] > before["queries"] + 0.5:
+                regressions.append(f"{name}: queries {before['queries']:.1f} -> {row['queries']:.1f}")
+        if regressions:
+            for line in regressions:
+                self.stderr.write(f"  REGRESSION {line}")
+            raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dj_database_url
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+from dicon_app import db_pool
+
+POOL_ENGINE = "dicon_app.db_backends.postgresql"
+MODES = ("connect", "persistent", "pool")
+
+
+def database_settings(url, mode, pool_size):
+    """モードごとの DATABASES の 1 件（Django の既定値も埋める）"""
+    settings_dict = dj_database_url.parse(url)
+    if mode == "pool":
+        settings_dict.update(ENGINE=POOL_ENGINE, CONN_MAX_AGE=0,
+                             POOL={"MIN_SIZE": 1, "MAX_SIZE": pool_size, "CHECK_AFTER": 5})
+    elif mode == "persistent":
+        settings_dict.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+    else:
+        settings_dict.update(CONN_MAX_AGE=0)
+    return connections.configure_settings({"default": settings_dict})["default"]
+
+
+class Command(BaseCommand):
+    help = ("Benchmark per-request latency against PostgreSQL: connect per request (CONN_MAX_AGE=0) vs "
+            "persistent connections vs the connection pool")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=os.environ.get("DATABASE_URL"),
+                            help="postgres:// URL (default: $DATABASE_URL)")
+        parser.add_argument("--requests", type=int, default=1000, help="Simulated requests per mode (default: 1000)")
+        parser.add_argument("--concurrency", type=int, default=8, help="Threads, like gunicorn --threads (default: 8)")
+        parser.add_argument("--queries", type=int, default=8,
+                            help="Small queries per request (default: 8, about what home() sends with a cold cache)")
+        parser.add_argument("--pool-size", type=int, default=4, help="Pool MAX_SIZE (default: 4)")
+
+    def handle(self, *args, **options):
+        url = options["url"]
+        if not url or not url.startswith(("postgres://", "postgresql://", "pgsql://")):
+            raise CommandError("Needs a PostgreSQL URL (--url or DATABASE_URL)")
+
+        self.stdout.write(f"{options['requests']} requests x {options['queries']} queries, "
+                          f"{options['concurrency']} threads, pool size {options['pool_size']}")
+        self.stdout.write(f"{'mode':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}  connections")
+        for mode in MODES:
+            settings_dict = database_settings(url, mode, options["pool_size"])
+            p50, p95, p99, rps, opened = self._run(mode, settings_dict, options)
+            self.stdout.write(f"{mode:<12} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} {rps:>8.0f}  {opened}")
+            if mode == "pool":
+                stats = db_pool.all_stats().get(f"bench_{mode}", {})
+                self.stdout.write(f"  pool: peak {stats.get('peak_in_use')}/{stats.get('max_size')}, "
+                                  f"waits {stats.get('waits')} (mean {stats.get('mean_wait_ms')}ms, "
+                                  f"max {stats.get('max_wait_ms')}ms), timeouts {stats.get('timeouts')}")
+                db_pool.close_all(f"bench_{mode}")
+
+    def _run(self, mode, settings_dict, options):
+        backend = load_backend(settings_dict["ENGINE"])
+        per_thread = threading.local()
+        wrappers, lock = [], threading.Lock()
+        opened = [0]
+
+        def one(_):
+            # スレッドごとに 1 つの接続オブジェクト（Django の connections と同じ）
+            wrapper = getattr(per_thread, "wrapper", None)
+            if wrapper is None:
+                wrapper = per_thread.wrapper = backend.DatabaseWrapper(dict(settings_dict), alias=f"bench_{mode}")
+                with lock:
+                    wrappers.append(wrapper)
+            start = time.perf_counter()
+            # request_started / request_finished と同じ後始末（CONN_MAX_AGE=0 ならここで閉じる・プールに返す）
+            wrapper.close_if_unusable_or_obsolete()
+            if wrapper.connection is None:
+                with lock:
+                    opened[0] += 1
+            with wrapper.cursor() as cursor:
+                for i in range(options["queries"]):
+                    cursor.execute("SELECT %s", [i])
+                    cursor.fetchone()
+            wrapper.close_if_unusable_or_obsolete()
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as pool:
+            times = sorted(pool.map(one, range(options["requests"])))
+        wall = time.perf_counter() - start
+        for wrapper in wrappers:  # 持続接続を閉じる（作ったスレッドはもう終わっているので共有を許して）
+            wrapper.inc_thread_sharing()
+            wrapper.close()
+
+        def pct(fraction):
+            return times[min(len(times) - 1, int(len(times) * fraction))]
+        # pool では「Django の接続を開いた回数」ではなく実際に PostgreSQL に接続した回数を出す
+        if mode == "pool":
+            opened[0] = db_pool.all_stats().get(f"bench_{mode}", {}).get("created", opened[0])
+        return pct(0.5), pct(0.95), pct(0.99), len(times) / wall, opened[0]
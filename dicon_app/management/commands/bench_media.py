@@ -0,0 +1,105 @@
+import http.client
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from django.urls import re_path
+from django.views.static import serve as static_serve
+
+from dicon_app import media
+
+# 計測中だけ ROOT_URLCONF をこのモジュールにする：変更前（django の static serve）と変更後を同じサーバーで比べる
+urlpatterns = [
+    re_path(r"^before/(?P<path>.*)$", static_serve, {"document_root": settings.MEDIA_ROOT}),
+    re_path(r"^after/(?P<path>.*)$", media.serve),
+]
+
+RANGE_BYTES = 64 * 1024
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark media serving under concurrent requests: django.views.static.serve vs dicon_app.media.serve"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400, help="Requests per scenario (default: 400)")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        files = sorted(
+            os.path.relpath(os.path.join(d, f), root)
+            for d, _, names in os.walk(root) for f in names
+            if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+        )
+        if not files:
+            self.stderr.write(f"No images under {root}")
+            return
+        total = options["requests"]
+        concurrency = max(1, options["concurrency"])
+
+        with override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=["*"], DEBUG=False):
+            server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+            server.daemon_threads = True
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            port = server.server_address[1]
+            try:
+                self.stdout.write(f"{len(files)} images, {total} requests x {concurrency} clients "
+                                  f"(django dev server; gunicorn adds sendfile on top)")
+                self.stdout.write(f"{'scenario':<12} {'before req/s':>13} {'after req/s':>12} {'x':>6} "
+                                  f"{'before MB':>10} {'after MB':>9}")
+                for scenario in ("full", "revalidate", "range"):
+                    before = self._run(port, "before", scenario, files, total, concurrency)
+                    after = self._run(port, "after", scenario, files, total, concurrency)
+                    self.stdout.write(
+                        f"{scenario:<12} {before[0]:>13.0f} {after[0]:>12.0f} {after[0] / before[0]:>5.1f}x "
+                        f"{before[1] / 1e6:>10.1f} {after[1] / 1e6:>9.1f}")
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def _run(self, port, prefix, scenario, files, total, concurrency):
+        """(req/s, 受け取った本文のバイト数) を返す"""
+        # 再検証はブラウザと同じく、前回のレスポンスの ETag / Last-Modified を送る
+        validators = {}
+        if scenario == "revalidate":
+            for name in files:
+                status, headers, _ = self._get(port, prefix, name, {})
+                validators[name] = {k: v for k, v in (("If-None-Match", headers.get("etag")),
+                                                      ("If-Modified-Since", headers.get("last-modified"))) if v}
+
+        def one(i):
+            name = files[i % len(files)]
+            headers = {}
+            if scenario == "revalidate":
+                headers = validators[name]
+            elif scenario == "range":
+                headers = {"Range": f"bytes=0-{RANGE_BYTES - 1}"}
+            return self._get(port, prefix, name, headers)[2]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            received = sum(pool.map(one, range(total)))
+        return total / (time.perf_counter() - start), received
+
+    def _get(self, port, prefix, name, headers):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        try:
+            conn.request("GET", f"/{prefix}/{quote(name)}", headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, len(body)
+        finally:
+            conn.close()
@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dicon_app import geo
+from dicon_app.models import Shop, Street
+
+BENCH_STREET = "__bench_nearby__"
+
+# 商店街の中心（余市・東京・大阪）のまわりに店をばらまく
+CENTERS = [(43.1906, 140.7880), (35.6812, 139.7671), (34.7025, 135.4959)]
+
+
+class Command(BaseCommand):
+    help = "Benchmark nearest-shop lookups (geohash + bounding box in SQL, haversine in Python) against a full scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shops", type=int, default=5000, help="Synthetic shops to create (default: 5000)")
+        parser.add_argument("--queries", type=int, default=200, help="Lookups to time")
+        parser.add_argument("--k", type=int, default=10, help="Nearest shops per lookup")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        street = Street.objects.create(name=BENCH_STREET)
+        try:
+            shops = []
+            for i in range(options["shops"]):
+                lat, lon = CENTERS[i % len(CENTERS)]
+                shop = Shop(street=street, name=f"bench-{i}",
+                            latitude=lat + rng.uniform(-0.05, 0.05), longitude=lon + rng.uniform(-0.05, 0.05))
+                shop.geohash = geo.encode(shop.latitude, shop.longitude)  # bulk_create は save() を通らない
+                shops.append(shop)
+            with transaction.atomic():
+                Shop.objects.bulk_create(shops, batch_size=500)
+
+            points = []
+            for _ in range(options["queries"]):
+                lat, lon = rng.choice(CENTERS)
+                points.append((lat + rng.uniform(-0.04, 0.04), lon + rng.uniform(-0.04, 0.04)))
+
+            indexed = self._time(lambda lat, lon: geo.nearest(lat, lon, options["k"]), points)
+            scanned = self._time(lambda lat, lon: self._full_scan(lat, lon, options["k"]), points)
+            self.stdout.write(f"{Shop.objects.count()} shops, k={options['k']}, numpy={'yes' if geo.np else 'no'}")
+            self.stdout.write(f"{'':<12} {'p50':>8} {'p95':>8}")
+            for label, (p50, p95) in (("geohash", indexed), ("full scan", scanned)):
+                self.stdout.write(f"{label:<12} {p50:>6.2f}ms {p95:>6.2f}ms")
+        finally:
+            street.delete()
+
+    def _full_scan(self, lat, lon, k):
+        """比較用：位置情報のある店を全部読んで距離で並べる"""
+        rows = list(Shop.objects.filter(latitude__isnull=False, longitude__isnull=False)
+                    .values_list("pk", "latitude", "longitude"))
+        dists = geo.distances_m(lat, lon, [(r[1], r[2]) for r in rows])
+        return sorted(zip(dists, rows))[:k]
+
+    def _time(self, func, points):
+        times = []
+        for lat, lon in points:
+            start = time.perf_counter()
+            func(lat, lon)
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        return times[len(times) // 2], times[min(len(times) - 1, int(len(times) * 0.95))]
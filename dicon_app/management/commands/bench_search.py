@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from dicon_app.search import SearchIndex
+
+# 合成データの材料（DB には書かない）
+WORDS = [
+    "トマト", "きゅうり", "キャベツ", "玉ねぎ", "じゃがいも", "にんじん", "大根", "白菜", "ほうれん草", "なす",
+    "豚バラ", "鶏もも", "牛こま", "合いびき", "コロッケ", "メンチカツ", "唐揚げ", "焼き鳥", "餃子", "春巻き",
+    "まぐろ", "サーモン", "あじ", "さば", "いか", "ほたて", "しらす", "刺身盛り", "干物", "明太子",
+    "食パン", "クロワッサン", "あんぱん", "メロンパン", "ショートケーキ", "どら焼き", "大福", "せんべい",
+    "煎茶", "ほうじ茶", "昆布", "かつお節", "干し椎茸", "のり", "佃煮", "漬物", "味噌", "醤油",
+]
+ADJECTIVES = ["朝採れ", "国産", "特選", "訳あり", "手作り", "昔ながらの", "限定", "徳用", "ﾐﾆ", "大盛り"]
+QUERIES = ["トマト", "とまと", "ﾄﾏﾄ", "鶏", "メロンパン", "刺身", "国産 豚バラ", "ほうじ茶", "限定 大福", "さーもん"]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the in-process search index on synthetic documents (build time and query latency)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--docs", type=int, default=30000, help="Number of synthetic documents (default: 30000)")
+        parser.add_argument("--repeat", type=int, default=50, help="Runs per query; p50/p95 are reported")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        index = SearchIndex()
+
+        start = time.perf_counter()
+        for pk in range(1, options["docs"] + 1):
+            name = f"{rng.choice(ADJECTIVES)}{rng.choice(WORDS)}"
+            description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6)))
+            index.add(rng.choice(("shop", "product", "set")), pk, name, pk, [(name, 3), (description, 1)])
+        build_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(f"built {len(index)} docs / {len(index.postings)} grams in {build_ms:.0f}ms")
+
+        self.stdout.write(f"{'query':<14} {'hits':>5} {'p50':>8} {'p95':>8}")
+        for query in QUERIES:
+            times = []
+            for _ in range(max(1, options["repeat"])):
+                start = time.perf_counter()
+                hits = index.search(query)
+                times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            self.stdout.write(f"{query:<14} {len(hits):>5} {times[len(times) // 2]:>6.2f}ms {p95:>6.2f}ms")
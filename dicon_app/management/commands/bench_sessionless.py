@@ -0,0 +1,79 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import resolve
+
+from dicon_app.db_router import is_catalog_view
+from dicon_app.management.commands.bench import Command as BenchCommand
+from dicon_app.management.commands.bench import Visitor, percentile, wsgi_request
+
+MODES = (False, True)  # SESSIONLESS_CATALOG
+
+
+class Command(BaseCommand):
+    help = ("Measure the per-request cost of session/auth/messages middleware on catalog pages for visitors "
+            "without a session cookie: the same URLs with SESSIONLESS_CATALOG off and on, interleaved, "
+            "single-threaded; also counts session rows and session cookies created")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=30, help="Requests per URL and mode (default: 30)")
+        parser.add_argument("--only", nargs="+", metavar="URL_NAME", help="Only these routes, e.g. dicon_app:shop_list")
+
+    def handle(self, *args, **options):
+        with override_settings(DEBUG=False, QUERY_INSTRUMENTATION=False, ALLOWED_HOSTS=["*"]):
+            routes = [r for r in BenchCommand(stderr=self.stderr)._routes(None, options["only"])
+                      if is_catalog_view(resolve(r.urls[0].partition("?")[0]).func)]
+            if not routes:
+                raise CommandError("No catalog routes to benchmark")
+            handler = WSGIHandler()
+            for route in routes:  # キャッシュを温める
+                for url in route.urls:
+                    wsgi_request(handler, Visitor("anonymous"), url)
+
+            sessions_before = Session.objects.count()
+            results = defaultdict(lambda: {mode: {"ms": [], "queries": []} for mode in MODES})
+            cookies = {mode: 0 for mode in MODES}
+            for i in range(options["rounds"]):
+                for route in routes:
+                    url = route.urls[i % len(route.urls)]
+                    # 交互に測って、途中のキャッシュの期限切れや GC の影響を両方に同じだけ乗せる
+                    for mode in (MODES if i % 2 else MODES[::-1]):
+                        with override_settings(SESSIONLESS_CATALOG=mode):
+                            start = time.perf_counter()
+                            status, headers, _, queries = wsgi_request(handler, Visitor("anonymous"), url)
+                            elapsed = (time.perf_counter() - start) * 1000
+                        entry = results[route.name][mode]
+                        entry["ms"].append(elapsed)
+                        entry["queries"].append(queries)
+                        cookies[mode] += any(k.lower() == "set-cookie" and v.startswith(settings.SESSION_COOKIE_NAME)
+                                             for k, v in headers)
+            sessions_created = Session.objects.count() - sessions_before
+
+        self._report(results, cookies, sessions_created, options)
+
+    def _report(self, results, cookies, sessions_created, options):
+        self.stdout.write(f"{'route':<34} {'off p50':>9} {'on p50':>9} {'saved':>8} {'saved %':>8} "
+                          f"{'queries':>9}")
+        saved_all, off_all = [], []
+        for name in sorted(results):
+            off, on = results[name][False], results[name][True]
+            p50_off, p50_on = percentile(off["ms"], 0.5), percentile(on["ms"], 0.5)
+            saved = p50_off - p50_on
+            saved_all.append(saved)
+            off_all.append(p50_off)
+            queries = (f"{sum(off['queries']) / len(off['queries']):.1f}->"
+                       f"{sum(on['queries']) / len(on['queries']):.1f}")
+            self.stdout.write(f"{name:<34} {p50_off:>9.3f} {p50_on:>9.3f} {saved:>8.3f} "
+                              f"{saved / p50_off if p50_off else 0:>8.1%} {queries:>9}")
+        mean_saved = sum(saved_all) / len(saved_all)
+        mean_off = sum(off_all) / len(off_all)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(results)} catalog routes x {options['rounds']} rounds: saved {mean_saved * 1000:.0f}us "
+            f"per request on average ({mean_saved / mean_off:.1%} of p50)"))
+        self.stdout.write(f"session cookies set: off {cookies[False]}, on {cookies[True]}; "
+                          f"session rows created: {sessions_created}")
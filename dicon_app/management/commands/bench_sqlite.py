@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from dicon_app.management.commands.bench import Visitor, percentile, wsgi_request
+from dicon_app.models import Product, Shop
+
+MODES = ("default", "tuned")
+ACTIONS = ("read", "cart", "checkout")
+# 読み取りに使うカタログのページ（引数つきは商品・お店を順に）
+READ_NAMES = ("dicon_app:home", "dicon_app:shop_list", "dicon_app:product_list", "dicon_app:set_list",
+              "dicon_app:event_list", "dicon_app:sale_list")
+
+_local = threading.local()
+
+
+def _on_exception(sender, request=None, **kwargs):
+    """リクエスト中の例外のうち、SQLite のロック待ちの失敗だけ印をつける"""
+    exc = sys.exc_info()[1]
+    if isinstance(exc, OperationalError) and ("locked" in str(exc) or "busy" in str(exc)):
+        _local.locked = True
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        action, _, weight = part.partition("=")
+        if action.strip() not in ACTIONS:
+            raise CommandError(f"--mix: unknown action {action!r} (read / cart / checkout)")
+        mix[action.strip()] = float(weight or 0)
+    if not any(mix.values()):
+        raise CommandError("--mix: all weights are zero")
+    return {action: weight for action, weight in mix.items() if weight > 0}
+
+
+class Command(BaseCommand):
+    help = ("Concurrency benchmark for SQLite: catalog reads, add_to_cart and checkout from several processes "
+            "against a copy of the database, with the default settings and with SQLITE_TUNED=1 "
+            "(WAL, BEGIN IMMEDIATE, ...); reports 'database is locked' error rates and latency")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per mode (default: 2000)")
+        parser.add_argument("--processes", type=int, default=2,
+                            help="Worker processes, like gunicorn --workers (default: 2)")
+        parser.add_argument("--concurrency", type=int, default=8,
+                            help="Threads per process, like gunicorn --threads (default: 8)")
+        parser.add_argument("--mix", default="read=70,cart=20,checkout=10",
+                            help="Request mix in percent (default: read=70,cart=20,checkout=10)")
+        parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--worker", action="store_true", help="(internal) run one worker process")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        if options["worker"]:
+            self.stdout.write(json.dumps(self._work(mix, options)))
+            return
+
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != "sqlite" or source.is_in_memory_db():
+            raise CommandError("The default database must be an SQLite file")
+        if not Product.objects.exists():
+            raise CommandError("No products; load data first (loaddata data.json or generate_dataset)")
+
+        self.stdout.write(f"{options['requests']} requests per mode, {options['processes']} processes x "
+                          f"{options['concurrency']} threads, mix {options['mix']}")
+        self.stdout.write(f"{'mode':<8} {'action':<9} {'requests':>8} {'locked':>7} {'rate':>7} {'5xx':>5} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        rates = {}
+        with tempfile.TemporaryDirectory(prefix="bench_sqlite_") as tmp:
+            for mode in options["modes"]:
+                path = Path(tmp) / f"{mode}.sqlite3"
+                self._copy(str(source.settings_dict["NAME"]), path)
+                results, wall = self._run(mode, path, options)
+                rates[mode] = self._report(mode, results, wall)
+        if len(rates) > 1:
+            self.stdout.write("lock errors: " + " -> ".join(f"{mode} {rate:.2%}" for mode, rate in rates.items()))
+
+    # ---- 親：DB の複製とワーカーの起動 ----
+
+    def _copy(self, source, path):
+        """モードごとに同じ中身から始める。default はジャーナルも Django の既定（DELETE）に戻す"""
+        with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(path)) as dest:
+            src.backup(dest)
+            dest.execute("PRAGMA journal_mode = DELETE").fetchall()
+
+    def _run(self, mode, path, options):
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+        env.pop("DATABASE_REPLICA_URLS", None)
+        env.pop("SQLITE_TUNED", None)
+        if mode == "tuned":
+            env["SQLITE_TUNED"] = "1"
+
+        processes = max(1, options["processes"])
+        workers = []
+        for i in range(processes):
+            requests = options["requests"] // processes + (i < options["requests"] % processes)
+            workers.append(subprocess.Popen(
+                [sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_sqlite", "--worker",
+                 "--requests", str(requests), "--concurrency", str(options["concurrency"]),
+                 "--mix", options["mix"], "--seed", f"{options['seed']}{i}"],
+                env=env, stdout=subprocess.PIPE, text=True))
+
+        results = defaultdict(lambda: {"ms": [], "status": Counter(), "locked": 0})
+        wall = 0.0
+        for worker in workers:
+            out, _ = worker.communicate()
+            if worker.returncode:
+                raise CommandError(f"{mode}: worker exited with status {worker.returncode}")
+            data = json.loads(out.strip().splitlines()[-1])
+            wall = max(wall, data["wall"])
+            for action, entry in data["actions"].items():
+                results[action]["ms"] += entry["ms"]
+                results[action]["status"].update(entry["status"])
+                results[action]["locked"] += entry["locked"]
+        return results, wall
+
+    def _report(self, mode, results, wall):
+        total = Counter()
+        for action in ACTIONS:
+            entry = results.get(action)
+            if not entry:
+                continue
+            ms, count = entry["ms"], len(entry["ms"])
+            errors = sum(n for status, n in entry["status"].items() if int(status) >= 500)
+            total.update(requests=count, locked=entry["locked"], errors=errors)
+            self.stdout.write(
+                f"{mode:<8} {action:<9} {count:>8} {entry['locked']:>7} {entry['locked'] / count:>7.2%} "
+                f"{errors:>5} {percentile(ms, 0.5):>8.2f} {percentile(ms, 0.95):>8.2f} {percentile(ms, 0.99):>8.2f}")
+        rate = total["locked"] / total["requests"] if total["requests"] else 0.0
+        self.stdout.write(f"{mode:<8} {'total':<9} {total['requests']:>8} {total['locked']:>7} {rate:>7.2%} "
+                          f"{total['errors']:>5}  {total['requests'] / wall:.0f} req/s")
+        return rate
+
+    # ---- ワーカー（別プロセス。DATABASE_URL は複製した DB） ----
+
+    def _work(self, mix, options):
+        # ロック待ちの失敗は 500 になって django.request にトレースバックが出るので、数えるだけにする
+        logging.getLogger("django.request").disabled = True
+        got_request_exception.connect(_on_exception)
+        with override_settings(DEBUG=False, QUERY_INSTRUMENTATION=False, ALLOWED_HOSTS=["*"]):
+            products = list(Product.objects.order_by("pk").values_list("pk", flat=True)[:500])
+            shops = list(Shop.objects.order_by("pk").values_list("pk", flat=True)[:100])
+            reads = [reverse(name) for name in READ_NAMES]
+            reads += [reverse("dicon_app:product_detail", args=[pk]) for pk in products[:20]]
+            reads += [reverse("dicon_app:shop_detail", args=[pk]) for pk in shops[:10]]
+            handler = WSGIHandler()
+            for url in reads:  # キャッシュを温める（計測に入れない）
+                wsgi_request(handler, Visitor("anonymous"), url)
+            connections.close_all()
+
+            results = defaultdict(lambda: {"ms": [], "status": Counter(), "locked": 0})
+            lock = threading.Lock()
+            actions, weights = list(mix), list(mix.values())
+            concurrency = max(1, options["concurrency"])
+            total = options["requests"]
+
+            def worker(index):
+                rng = random.Random(f"{options['seed']}:{index}")
+                cart = Visitor("cart")  # カートは同じ利用者が入れ続ける（セッションの行を更新し続ける）
+                for _ in range(total // concurrency + (index < total % concurrency)):
+                    action = rng.choices(actions, weights)[0]
+                    method = "GET"
+                    if action == "read":
+                        visitor, url = Visitor("anonymous"), rng.choice(reads)
+                    elif action == "cart":
+                        visitor, url = cart, reverse("dicon_app:add_to_cart", args=[rng.choice(products)])
+                    else:
+                        # 決済画面の「注文する」（POST）：新しいセッションの保存と、決済処理中の注文の作成
+                        visitor, url = Visitor("anonymous"), reverse("payments:checkout",
+                                                                     args=[rng.choice(products)])
+                        method = "POST"
+                    _local.locked = False
+                    start = time.perf_counter()
+                    status, _, _, _ = wsgi_request(handler, visitor, url, method)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        entry = results[action]
+                        entry["ms"].append(elapsed)
+                        entry["status"][str(status)] += 1
+                        entry["locked"] += _local.locked
+                connections.close_all()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(worker, range(concurrency)))
+            wall = time.perf_counter() - start
+        return {"wall": wall, "actions": results}
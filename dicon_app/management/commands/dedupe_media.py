@@ -0,0 +1,96 @@
+import os
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from dicon_app import home_cache, images, versions
+from dicon_app.storage import ContentAddressedStorage, blob_name, digest, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = "Move existing uploads to content-addressed names (blobs/<digest>.<ext>), dedupe them and repoint the rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be merged")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+
+        # ファイル名 → それを指している (モデル, フィールド) の一覧（ストレージごと）
+        refs = defaultdict(set)
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if not isinstance(field, models.FileField) or not isinstance(field.storage, ContentAddressedStorage):
+                    continue
+                names = (model._default_manager.exclude(**{field.name: ""}).exclude(**{field.name: None})
+                         .values_list(field.name, flat=True).distinct())
+                for name in names:
+                    if not is_content_addressed(name):
+                        refs[(field.storage, name)].add((model, field.name))
+
+        moved = merged = missing = saved = 0
+        targets = set()
+        for (storage, name), users in sorted(refs.items(), key=lambda item: item[0][1]):
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f"  missing: {name}")
+                continue
+            with storage.open(name, "rb") as f:
+                target = blob_name(digest(File(f)), name)
+            duplicate = target in targets or storage.exists(target)
+            targets.add(target)
+            size = storage.size(name)
+            self.stdout.write(f"  {name} -> {target}" + (" (duplicate)" if duplicate else ""))
+            if duplicate:
+                merged += 1
+                saved += size
+            else:
+                moved += 1
+            if dry_run:
+                continue
+
+            if not duplicate:
+                self._move(storage, name, target)
+            with transaction.atomic():
+                for model, field_name in users:
+                    model._default_manager.filter(**{field_name: name}).update(**{field_name: target})
+            if duplicate:
+                storage.delete(name)
+            self._move_variants(storage, name, target)
+
+        if not dry_run:
+            home_cache.invalidate()
+            versions.bump(*{model for users in refs.values() for model, _ in users})  # 一括更新はシグナルを出さないので
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would move' if dry_run else 'Moved'} {moved} files, merged {merged} duplicates "
+            f"({saved / 1024 / 1024:.1f} MB freed)" + (f", {missing} missing" if missing else "")))
+
+    def _move(self, storage, name, target):
+        """同じストレージ内で名前を変える（ローカルなら rename、そうでなければコピーして消す）"""
+        try:
+            source, dest = storage.path(name), storage.path(target)
+        except NotImplementedError:
+            with storage.open(name, "rb") as f:
+                storage.save(target, f)
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(source, dest)
+            return
+        storage.delete(name)
+
+    def _move_variants(self, storage, name, target):
+        """縮小版も新しい名前へ（すでにあれば古いほうを消すだけ）"""
+        for width in images.widths():
+            for ext in images.FORMATS:
+                old, new = images.variant_name(name, width, ext), images.variant_name(target, width, ext)
+                if not storage.exists(old):
+                    continue
+                if storage.exists(new):
+                    storage.delete(old)
+                else:
+                    self._move(storage, old, new)
+        cache.delete_many([images.READY_KEY.format(name), images.READY_KEY.format(target)])
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dicon_app import catalog_io
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog models out as a loaddata-compatible JSON array or JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", "-o", default="-", help='Output file (default: "-" for stdout)')
+        parser.add_argument("--format", choices=["json", "jsonl"], help="Default: guessed from the file name")
+        parser.add_argument("--batch-size", type=int, default=catalog_io.DEFAULT_BATCH_SIZE,
+                            help=f"Rows per query (default: {catalog_io.DEFAULT_BATCH_SIZE})")
+        parser.add_argument("--models", nargs="+", metavar="LABEL",
+                            help="Only these models, e.g. dicon_app.shop dicon_app.product (default: all)")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        fmt = options["format"] or catalog_io.guess_format(output)
+        models = catalog_io.CATALOG_MODELS
+        if options["models"]:
+            unknown = [label for label in options["models"] if label.lower() not in catalog_io.MODELS_BY_LABEL]
+            if unknown:
+                raise CommandError(f"Unknown models: {', '.join(unknown)}")
+            wanted = {label.lower() for label in options["models"]}
+            models = [model for model in models if catalog_io.model_label(model) in wanted]
+
+        start = time.perf_counter()
+        records = catalog_io.iter_export(models, max(1, options["batch_size"]))
+        if output == "-":
+            count = catalog_io.write_records(records, sys.stdout, fmt)
+        else:
+            with open(output, "w", encoding="utf-8") as fp:
+                count = catalog_io.write_records(records, fp, fmt)
+        seconds = time.perf_counter() - start
+        rate = count / seconds if seconds else 0
+        self.stderr.write(f"{count} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
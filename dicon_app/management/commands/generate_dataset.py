@@ -0,0 +1,330 @@
+import math
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from accounts.models import Profile
+from dicon_app import catalog_io
+from dicon_app.models import Event, Product, Set, Shop, Street
+from orders.models import Order, OrderBatch
+
+USERNAME_PREFIX = "loadtest-"
+UPCOMING_DAYS = 90  # イベントは履歴の期間＋この日数先まで
+
+# 通りの中心（余市・東京・大阪）。通りごとに少しずらして、店は通りに沿って並べる
+CENTERS = [(43.1906, 140.7880), (35.6812, 139.7671), (34.7025, 135.4959)]
+STREET_NAMES = ["中央通り", "駅前通り", "東商店街", "西レトロ通り", "本町通り", "港通り", "桜通り", "銀座通り"]
+STREET_COLORS = ["#6c757d", "#ff9800", "#4caf50", "#2196f3", "#e91e63", "#795548"]
+FAMILY_NAMES = ["山田", "佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "中村", "小林", "加藤", "吉田", "松本"]
+
+# 店のカテゴリ → (店の呼び名, 商品名, 価格帯)
+SHOP_KINDS = {
+    "vegetable": (["八百屋", "青果店"], ["トマト", "きゅうり", "じゃがいも", "玉ねぎ", "にんじん", "キャベツ", "りんご", "みかん"],
+                  (80, 600)),
+    "meat": (["精肉店", "惣菜店"], ["豚バラ", "すき焼き用牛肉", "鶏もも", "コロッケ", "メンチカツ", "唐揚げ"], (150, 3000)),
+    "fish": (["鮮魚店", "魚屋"], ["あじ", "かれい", "鯛", "さば", "刺身盛り合わせ", "鮭の切り身"], (200, 2500)),
+    "bread": (["ベーカリー", "和菓子店"], ["食パン", "メロンパン", "あんぱん", "どら焼き", "大福", "ロールケーキ"], (100, 1500)),
+    "dry": (["茶舗", "乾物店"], ["煎茶", "ほうじ茶", "昆布", "かつお節", "干ししいたけ", "海苔"], (300, 2000)),
+    "other": (["雑貨店", "酒店"], ["日本酒", "手ぬぐい", "漬物", "味噌", "醤油", "はちみつ"], (200, 4000)),
+}
+SIZES = ["", "（大）", "（小）", " 1袋", " 2個入り", " 300g", " お徳用"]
+SET_THEMES = {
+    "beauty": "美肌", "health": "減塩", "speedy": "10分で", "diet": "糖質オフ", "reward": "週末ごちそう",
+}
+EVENT_NAMES = ["朝市", "夏祭り", "ワークショップ", "試食会", "スタンプラリー", "子ども縁日", "大売り出し", "収穫祭"]
+
+
+class Command(BaseCommand):
+    help = ("Generate a synthetic district (streets, shops, products, sets, events, users, orders) with bulk inserts "
+            "for load testing. The same --seed and --until always produce the same data")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--streets", type=int, default=20)
+        parser.add_argument("--shops", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=50000)
+        parser.add_argument("--sets", type=int, default=500)
+        parser.add_argument("--set-size", type=int, default=5, help="Products per set (default: 5)")
+        parser.add_argument("--events", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--orders", type=int, default=200000)
+        parser.add_argument("--sale-ratio", type=float, default=0.15, help="Share of products on sale (default: 0.15)")
+        parser.add_argument("--set-order-ratio", type=float, default=0.05,
+                            help="Share of orders placed as set purchases (default: 0.05)")
+        parser.add_argument("--days", type=int, default=365, help="History length for orders / sets (default: 365)")
+        parser.add_argument("--until", help="Last day of the history, YYYY-MM-DD (default: today)")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT / transaction")
+        parser.add_argument("--no-images", action="store_true", help="Leave image fields empty")
+        parser.add_argument("--flush", action="store_true",
+                            help="Delete ALL streets, shops, products, sets, events and orders (and earlier "
+                                 "generated users) first")
+
+    def handle(self, *args, **options):
+        until = parse_date(options["until"]) if options["until"] else timezone.localdate()
+        if until is None:
+            raise CommandError(f"--until: not a date: {options['until']}")
+        if options["products"] and not options["shops"] or options["shops"] and not options["streets"]:
+            raise CommandError("Products need shops and shops need streets")
+        self.options = options
+        self.seed = options["seed"]
+        self.batch_size = max(1, options["batch_size"])
+        self.end = timezone.make_aware(datetime.combine(until, datetime.max.time()))
+        self.span = timedelta(days=max(1, options["days"]))
+        self.total_rows, self.total_seconds = 0, 0.0
+
+        if options["flush"]:
+            self._flush()
+
+        with catalog_io.manual_timestamps(Set, Event, Order, OrderBatch):
+            streets = self._streets(options["streets"])
+            shops = self._shops(options["shops"], streets)
+            products, prices = self._products(options["products"], shops)
+            sets = self._sets(options["sets"], products, prices)
+            self._events(options["events"], until)
+            users = self._users(options["users"])
+            self._orders(options["orders"], products, prices, sets, users)
+
+        User = get_user_model()
+        catalog_io.after_bulk_write([Street, Shop, Product, Set, Event, User, Profile, OrderBatch, Order])
+        rate = self.total_rows / self.total_seconds if self.total_seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.total_rows} rows in {self.total_seconds:.1f}s ({rate:,.0f} rows/s)"))
+
+    # ---- 共通 ----
+
+    def _rng(self, name):
+        """段階ごとに別の乱数列（ユーザー数を変えても商品は同じになる）"""
+        return random.Random(f"{self.seed}:{name}")
+
+    def _first_pk(self, model):
+        return (model._default_manager.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+    def _when(self, rng):
+        return self.end - self.span * rng.random()
+
+    def _insert(self, model, objects, label=None):
+        """objects（ジェネレーター）を batch_size 件ずつ bulk_create。件数を返す"""
+        start, count, chunk = time.perf_counter(), 0, []
+        for obj in objects:
+            chunk.append(obj)
+            if len(chunk) >= self.batch_size:
+                count += self._write(model, chunk)
+                chunk = []
+        if chunk:
+            count += self._write(model, chunk)
+        seconds = time.perf_counter() - start
+        self.total_rows += count
+        self.total_seconds += seconds
+        rate = count / seconds if seconds else 0
+        self.stdout.write(f"  {label or model._meta.label_lower:<28} {count:>9} rows {seconds:>7.1f}s {rate:>9,.0f} rows/s")
+        return count
+
+    def _write(self, model, chunk):
+        with transaction.atomic():
+            model._default_manager.bulk_create(chunk, batch_size=self.batch_size)
+        return len(chunk)
+
+    def _images(self, model):
+        """既存の行の画像（とプレースホルダ）を使い回す。無ければ MEDIA_ROOT の upload_to のファイル"""
+        if self.options["no_images"]:
+            return []
+        pool = list(model._default_manager.exclude(image="").exclude(image=None)
+                    .values_list("image", "image_color", "image_lqip").distinct().order_by("image"))
+        if not pool:
+            folder = model._meta.get_field("image").upload_to
+            try:
+                _, files = default_storage.listdir(folder)
+            except OSError:
+                files = []
+            pool = [(f"{folder}{name}", "", "") for name in sorted(files)
+                    if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))]
+        return pool
+
+    def _flush(self):
+        tables = [model._meta.db_table for model in (Order, OrderBatch, Set.products.through, Set, Product, Shop,
+                                                     Street, Event)]
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+        deleted, _ = get_user_model().objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        self.stdout.write(f"Flushed {len(tables)} tables and {deleted} generated user rows")
+
+    # ---- 各モデル ----
+
+    def _streets(self, n):
+        rng, first = self._rng("streets"), self._first_pk(Street)
+
+        def rows():
+            for i in range(n):
+                name = f"{STREET_NAMES[i % len(STREET_NAMES)]}{i // len(STREET_NAMES) + 1}丁目"
+                yield Street(pk=first + i, name=name, color=rng.choice(STREET_COLORS))
+        self._insert(Street, rows())
+
+        # 通りごとの (始点, 向き)
+        lines = []
+        for i in range(n):
+            lat, lon = CENTERS[i % len(CENTERS)]
+            angle = rng.uniform(0, math.pi)
+            lines.append((lat + rng.uniform(-0.02, 0.02), lon + rng.uniform(-0.02, 0.02),
+                          math.cos(angle), math.sin(angle)))
+        return [(first + i, line) for i, line in enumerate(lines)]
+
+    def _shops(self, n, streets):
+        rng, first = self._rng("shops"), self._first_pk(Shop)
+        images = self._images(Shop)
+        categories = list(SHOP_KINDS)
+        shops = []  # (pk, カテゴリ)
+
+        def rows():
+            for i in range(n):
+                street_pk, (lat, lon, dlat, dlon) = streets[i % len(streets)]
+                category = rng.choice(categories)
+                kinds = SHOP_KINDS[category][0]
+                shop = Shop(pk=first + i, street_id=street_pk, category=category,
+                            name=f"{rng.choice(FAMILY_NAMES)}{rng.choice(kinds)} {i + 1}号店",
+                            description=f"{rng.choice(STREET_NAMES)}で{rng.randint(1, 80)}年続く{rng.choice(kinds)}です。")
+                if rng.random() < 0.9:  # 1 割は位置情報なし
+                    along = rng.uniform(0, 0.004)
+                    shop.latitude = lat + dlat * along + rng.uniform(-0.0002, 0.0002)
+                    shop.longitude = lon + dlon * along + rng.uniform(-0.0002, 0.0002)
+                if images:
+                    shop.image, shop.image_color, shop.image_lqip = rng.choice(images)
+                shop.fill_auto_fields()  # bulk_create は save() を通らない
+                shops.append((shop.pk, category))
+                yield shop
+        self._insert(Shop, rows())
+        return shops
+
+    def _products(self, n, shops):
+        rng, first = self._rng("products"), self._first_pk(Product)
+        images = self._images(Product)
+        prices = array("i")  # 商品ごとの実際の売値（特売なら特売価格）。注文の金額に使う
+
+        def rows():
+            for i in range(n):
+                # 大きい店・小さい店があるように偏らせる
+                shop_pk, category = shops[int(len(shops) * rng.random() ** 2)]
+                _, items, (low, high) = SHOP_KINDS[category]
+                price = rng.randrange(low, high, 10)
+                product = Product(pk=first + i, shop_id=shop_pk, category=category, price=price,
+                                  name=f"{rng.choice(items)}{rng.choice(SIZES)}")
+                if rng.random() < self.options["sale_ratio"]:
+                    product.is_sale = True
+                    product.sale_price = max(10, int(round(price * rng.uniform(0.6, 0.9), -1)))
+                if images:
+                    product.image, product.image_color, product.image_lqip = rng.choice(images)
+                prices.append(product.sale_price if product.is_sale else price)
+                yield product
+        self._insert(Product, rows())
+        return range(first, first + n), prices
+
+    def _sets(self, n, products, prices):
+        rng, first = self._rng("sets"), self._first_pk(Set)
+        images = self._images(Set)
+        size = min(self.options["set_size"], len(products))
+        members = []  # セットごとの商品の位置（products の中の番号）
+
+        def rows():
+            for i in range(n):
+                category = rng.choice(list(SET_THEMES))
+                picked = rng.sample(range(len(products)), size) if size else []
+                members.append(picked)
+                item = Set(pk=first + i, slug=f"set-{first + i}", category=category,
+                           name=f"{SET_THEMES[category]}献立セット {i + 1}",
+                           price=int(round(sum(prices[j] for j in picked) * 0.9, -1)),
+                           description="管理栄養士が選んだ組み合わせです。",
+                           is_active=rng.random() < 0.9, created_at=self._when(rng))
+                if images:
+                    item.image, item.image_color, item.image_lqip = rng.choice(images)
+                yield item
+        self._insert(Set, rows())
+
+        through = Set.products.through
+        self._insert(through, (through(set_id=first + i, product_id=products[j])
+                               for i, picked in enumerate(members) for j in picked), label="set products")
+        return [(first + i, [products[j] for j in picked], [prices[j] for j in picked])
+                for i, picked in enumerate(members)]
+
+    def _events(self, n, until):
+        rng, first = self._rng("events"), self._first_pk(Event)
+        images = self._images(Event)
+        days = self.span.days + UPCOMING_DAYS
+        categories = [value for value, _ in Event.CATEGORY_CHOICES]
+
+        def rows():
+            for i in range(n):
+                start = until - self.span + timedelta(days=rng.randrange(days))
+                event = Event(pk=first + i, slug=f"event-{first + i}", category=rng.choice(categories),
+                              title=f"{rng.choice(STREET_NAMES)} {rng.choice(EVENT_NAMES)}",
+                              start_date=start, is_active=rng.random() < 0.95,
+                              created_at=timezone.make_aware(datetime.combine(start - timedelta(days=30),
+                                                                              datetime.min.time())))
+                if images:
+                    event.image, event.image_color, event.image_lqip = rng.choice(images)
+                yield event
+        self._insert(Event, rows())
+
+    def _users(self, n):
+        User = get_user_model()
+        rng, first = self._rng("users"), self._first_pk(User)
+        password = make_password(f"{USERNAME_PREFIX}password")  # ハッシュは 1 回だけ（1 件ずつだと何分もかかる）
+
+        def rows():
+            for i in range(n):
+                pk = first + i
+                yield User(pk=pk, username=f"{USERNAME_PREFIX}{pk}", email=f"{USERNAME_PREFIX}{pk}@example.com",
+                           password=password, date_joined=self._when(rng))
+        self._insert(User, rows(), label="users")
+        # accounts.signals の create_profile も bulk_create では動かない
+        self._insert(Profile, (Profile(user_id=first + i, nickname=f"{rng.choice(FAMILY_NAMES)}さん")
+                               for i in range(n)))
+        return range(first, first + n)
+
+    def _orders(self, n, products, prices, sets, users):
+        if not products:
+            return
+        rng = self._rng("orders")
+        n_sets = int(n * self.options["set_order_ratio"] / max(1, self.options["set_size"])) if sets else 0
+        first_batch = self._first_pk(OrderBatch)
+
+        def buyer():
+            # 7 割はログインして購入。よく買う人に偏らせる
+            return users[int(len(users) * rng.random() ** 3)] if users and rng.random() < 0.7 else None
+
+        def status(created_at):
+            if self.end - created_at < timedelta(hours=1):
+                return "pending"
+            return "success" if rng.random() < 0.92 else "cancel"
+
+        batches = []
+
+        def batch_rows():
+            for i in range(n_sets):
+                set_pk, product_pks, set_prices = rng.choice(sets)
+                created_at = self._when(rng)
+                batches.append((first_batch + i, product_pks, set_prices, created_at, buyer(), status(created_at)))
+                yield OrderBatch(pk=first_batch + i, set_id=set_pk, total=sum(set_prices), created_at=created_at)
+        self._insert(OrderBatch, batch_rows())
+
+        def order_rows():
+            # 単品の注文は古い順に（id の順と日時の順をそろえる）
+            singles = n - sum(len(b[1]) for b in batches)
+            for i in range(max(0, singles)):
+                created_at = self.end - self.span * (1 - (i + rng.random()) / singles)
+                j = rng.randrange(len(products))
+                yield Order(product_id=products[j], amount=prices[j], status=status(created_at),
+                            created_at=created_at, user_id=buyer())
+            for batch_pk, product_pks, set_prices, created_at, user_pk, batch_status in batches:
+                for product_pk, price in zip(product_pks, set_prices):
+                    yield Order(product_id=product_pk, amount=price, status=batch_status,
+                                created_at=created_at, user_id=user_pk, batch_id=batch_pk)
+        self._insert(Order, order_rows())
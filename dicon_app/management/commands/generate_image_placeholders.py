@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dicon_app import home_cache, images, versions
+from dicon_app.signals import IMAGE_MODELS
+
+
+class Command(BaseCommand):
+    help = "Fill image_color / image_lqip (dominant colour + tiny inline thumbnail) for existing images (backfill)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Parallel workers (default: 4)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per read / bulk_update (default: 500)")
+        parser.add_argument("--force", action="store_true", help="Recompute placeholders that already exist")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        start = time.perf_counter()
+        done = failed = 0
+        # 同じファイルを複数のレコードが使っていることもあるので、結果はファイル名で使い回す
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            for model in IMAGE_MODELS:
+                storage = model._meta.get_field("image").storage
+                rows = model._default_manager.exclude(image="").exclude(image=None)
+                if not options["force"]:
+                    rows = rows.filter(image_lqip="")
+                rows = rows.only("pk", "image", "image_color", "image_lqip").order_by("pk")
+
+                # pk で区切って読み、1 バッチ分をまとめてデコード → bulk_update（1 件ずつ save しない＝シグナルも走らない）
+                last_pk, filled = 0, 0
+                while True:
+                    batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+                    if not batch:
+                        break
+                    last_pk = batch[-1].pk
+
+                    names = sorted({obj.image.name for obj in batch} - results.keys())
+                    for name, result in zip(names, pool.map(lambda n: self._placeholder(n, storage), names)):
+                        results[name] = result
+
+                    changed = []
+                    for obj in batch:
+                        result = results[obj.image.name]
+                        if result is None:
+                            failed += 1
+                            continue
+                        obj.image_color, obj.image_lqip = result["color"], result["lqip"]
+                        changed.append(obj)
+                    with transaction.atomic():
+                        model._default_manager.bulk_update(changed, ["image_color", "image_lqip"])
+                    filled += len(changed)
+                    self.stdout.write(f"  {model.__name__}: {filled} rows")
+                done += filled
+
+        home_cache.invalidate()
+        versions.bump(*IMAGE_MODELS)  # 一括更新はシグナルを出さないので
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Filled {done} rows from {len(results)} files in {elapsed:.2f}s"
+            + (f", {failed} failed" if failed else "")))
+
+    def _placeholder(self, name, storage):
+        try:
+            with storage.open(name, "rb") as f:
+                return images.placeholder(f)
+        except Exception as exc:
+            self.stderr.write(f"  {name}: {exc}")
+            return None
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from dicon_app import home_cache, images, versions
+from dicon_app.signals import IMAGE_MODELS
+
+
+class Command(BaseCommand):
+    help = "Create the resized WebP/JPEG variants for every uploaded image (backfill)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Parallel workers (default: 4)")
+        parser.add_argument("--force", action="store_true", help="Recreate variants that already exist")
+
+    def handle(self, *args, **options):
+        # 同じファイルを複数のレコードが使っていることもあるので、ファイル名でまとめる
+        files = {}
+        for model in IMAGE_MODELS:
+            for field_name in images.image_fields(model):
+                storage = model._meta.get_field(field_name).storage
+                for name in model._default_manager.exclude(**{field_name: ""}).exclude(**{field_name: None}) \
+                        .values_list(field_name, flat=True).distinct():
+                    files[name] = storage
+        self.stdout.write(f"{len(files)} images")
+
+        start = time.perf_counter()
+        original = variants = count = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            futures = {pool.submit(images.generate, name, storage, options["force"]): name
+                       for name, storage in files.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"  {name}: {exc}")
+                    continue
+                original += result["original"]
+                variants += result["variants"]
+                count += result["count"]
+                if done % 20 == 0:
+                    self.stdout.write(f"  {done}/{len(files)}")
+
+        home_cache.invalidate()
+        versions.bump(*IMAGE_MODELS)  # srcset が変わるのでページの ETag も変える
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} variants ({variants / 1024:.0f} KB) from {original / 1024:.0f} KB of originals "
+            f"in {elapsed:.1f}s" + (f", {failed} failed" if failed else "")))
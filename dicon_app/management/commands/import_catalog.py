@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dicon_app import catalog_io
+
+
+class Command(BaseCommand):
+    help = ("Stream a catalog fixture (JSON array like loaddata, or JSONL) into the database with "
+            "bulk_create / bulk_update in batches; unknown fields are ignored, existing pks are updated")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='Fixture file ("-" for stdin)')
+        parser.add_argument("--format", choices=["json", "jsonl"], help="Default: guessed from the file name")
+        parser.add_argument("--batch-size", type=int, default=catalog_io.DEFAULT_BATCH_SIZE,
+                            help=f"Rows per batch / transaction (default: {catalog_io.DEFAULT_BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or catalog_io.guess_format(path)
+        log = self.stderr.write if options["verbosity"] > 1 else None
+        try:
+            if path == "-":
+                stats = catalog_io.import_records(catalog_io.iter_records(sys.stdin, fmt), options["batch_size"], log)
+            else:
+                with open(path, encoding="utf-8") as fp:
+                    stats = catalog_io.import_records(catalog_io.iter_records(fp, fmt), options["batch_size"], log)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"{path}: {exc}")
+
+        for label in sorted(set(stats.created) | set(stats.updated) | set(stats.skipped)):
+            self.stdout.write(f"  {label:<28} {stats.created[label]:>7} created {stats.updated[label]:>7} updated"
+                              + (f" {stats.skipped[label]:>5} skipped (missing parent)" if stats.skipped[label] else ""))
+        if stats.links:
+            self.stdout.write(f"  {stats.links} many-to-many links")
+        for (label, name), count in sorted(stats.unknown_fields.items()):
+            self.stderr.write(f"  ignored unknown field {label}.{name} ({count} rows)")
+        for label, count in sorted(stats.unknown_models.items(), key=str):
+            self.stderr.write(f"  ignored unknown model {label} ({count} rows)")
+        rate = stats.rows / stats.seconds if stats.seconds else 0
+        self.stdout.write(self.style.SUCCESS(f"{stats.rows} rows in {stats.seconds:.2f}s ({rate:,.0f} rows/s)"))
+        if stats.rows:
+            self.stdout.write("Run generate_image_placeholders / generate_image_variants for the new images")
@@ -0,0 +1,319 @@
+"""
+インデックス・アドバイザー
+
+URL をすべてたどってテストクライアントで GET し、発行された SELECT を EXPLAIN して
+- テーブルの全件スキャン（SQLite: SCAN table / PostgreSQL: Seq Scan）
+- インデックスで済むはずの並び替え（USE TEMP B-TREE FOR ORDER BY / Sort）
+を見つけ、WHERE と ORDER BY から複合インデックス（IS NOT NULL なら部分インデックス）を提案します。
+
+    python manage.py index_advisor               # 全URL
+    python manage.py index_advisor --url shop    # URL名に shop を含むものだけ
+    python manage.py index_advisor --plans       # EXPLAIN の結果も表示
+
+データは今の DB のものを使い（先にデータを入れておくこと）、1つのトランザクションの中で動かして最後に
+ロールバックするので、決済などの GET で書き込みがあっても残りません。
+PostgreSQL では enable_seqscan=off で EXPLAIN するので、データが少なくても
+「使えるインデックスがない」スキャンだけが残ります（SQLite は統計がなければもともとインデックスを優先します）。
+"""
+import json
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import get_resolver
+
+from dicon_app.management.commands.show_urls import iter_url_patterns
+from dicon_app.views import LISTINGS
+
+_KWARG = re.compile(r"<(?:(\w+):)?(\w+)>")
+SUPPORTED_VENDORS = ("sqlite", "postgresql")  # explain() が読める EXPLAIN の形式
+
+# 名前からモデルを決められない URL 引数の候補
+FIXED_KWARGS = {
+    "listing": list(LISTINGS),
+}
+
+
+# ==========================================
+# 1. URL にあてはめるサンプル値
+# ==========================================
+
+def _model_for(hint):
+    """"shop" → Shop, "batch" → OrderBatch のように、名前の一部からモデルを探す"""
+    hint = hint.lower()
+    candidates = [m for m in apps.get_models() if m._meta.model_name == hint]
+    candidates = candidates or [m for m in apps.get_models() if m._meta.model_name.endswith(hint)]
+    return candidates[0] if candidates else None
+
+
+def sample_kwargs(route, url_name):
+    """
+    route の <int:shop_pk> などに DB の実在値を入れた kwargs のリストを返す（作れなければ None）
+    引数名の接頭辞（shop_pk → shop）、なければ URL 名の接頭辞（product_detail → product）でモデルを決める
+    """
+    results = [{}]
+    for _converter, name in _KWARG.findall(route):
+        if name in FIXED_KWARGS:
+            results = [dict(r, **{name: v}) for r in results for v in FIXED_KWARGS[name]]
+            continue
+        field = "slug" if "slug" in name else "pk"
+        prefix = re.sub(r"_?(pk|id|slug)$", "", name)
+        model = _model_for(prefix) if prefix else None
+        if model is None and url_name:
+            model = _model_for(url_name.split(":")[-1].split("_")[0])
+        if model is None:
+            return None
+        queryset = model._default_manager.order_by("pk")
+        if field == "slug":
+            queryset = queryset.exclude(slug="")
+        value = queryset.values_list(field, flat=True).first()
+        if value is None:
+            return None
+        results = [dict(r, **{name: value}) for r in results]
+    return results
+
+
+# ==========================================
+# 2. SQL の記録と EXPLAIN
+# ==========================================
+
+class SelectRecorder:
+    """execute_wrapper：SELECT の (sql, params) をそのまま集める"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith("SELECT"):
+            self.statements.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    """[(種類, テーブル, 説明)]。種類は "scan"（全件スキャン）か "sort"（インデックスを使わない並び替え）"""
+    findings, plan = [], []
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            last_table = None
+            for row in cursor.fetchall():
+                detail = row[-1]
+                plan.append(detail)
+                m = re.match(r"(SCAN|SEARCH) (\S+)(?: AS (\S+))?(.*)", detail)
+                if m:
+                    last_table = m.group(2)
+                    if m.group(1) == "SCAN" and "USING" not in m.group(4):
+                        findings.append(("scan", last_table, detail))
+                elif detail.startswith("USE TEMP B-TREE FOR ORDER BY") and last_table:
+                    findings.append(("sort", last_table, detail))
+        elif connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            raw = cursor.fetchone()[0]
+            root = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            cursor.execute("SET LOCAL enable_seqscan = on")
+
+            def walk(node, depth=0):
+                plan.append("  " * depth + node["Node Type"] + (f' on {node["Relation Name"]}' if "Relation Name" in node else ""))
+                if node["Node Type"] == "Seq Scan":
+                    findings.append(("scan", node["Relation Name"], node.get("Filter", "")))
+                for child in node.get("Plans", []):
+                    walk(child, depth + 1)
+                if node["Node Type"] == "Sort":
+                    tables = [c.get("Relation Name") for c in node.get("Plans", []) if c.get("Relation Name")]
+                    if tables:
+                        findings.append(("sort", tables[0], ", ".join(node.get("Sort Key", []))))
+
+            walk(root)
+        else:
+            raise NotImplementedError(f"EXPLAIN is not supported for {connection.vendor}")
+    return findings, plan
+
+
+# ==========================================
+# 3. WHERE / ORDER BY からインデックスを組み立てる
+# ==========================================
+
+def _clauses(sql):
+    """(WHERE 部分, ORDER BY 部分)。サブクエリまでは見ない大まかな切り出し"""
+    where = order = ""
+    m = re.search(r"\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)", sql, re.S)
+    if m:
+        where = m.group(1)
+    m = re.search(r"\bORDER BY\b(.*?)(?:\bLIMIT\b|$)", sql, re.S)
+    if m:
+        order = m.group(1)
+    return where, order
+
+
+def suggest_index(model, sql):
+    """
+    Equality → Sort → Range の順で並べた複合インデックスを返す（作る意味がなければ None）
+
+    条件のうち次の 2 つは列に入れず、部分インデックスの condition にする
+    - filter(is_active=True) … Django は WHERE "is_active" と書くので、(is_active, ...) の複合
+      インデックスは SQLite では使われない。WHERE is_active の部分インデックスなら使われる
+    - exclude(x=None) / IS NOT NULL
+    """
+    table = re.escape(model._meta.db_table)
+    col = rf'"{table}"\."(\w+)"'
+    where, order = _clauses(sql)
+
+    # exclude(x=None) は NOT (x IS NULL) になるので、先に IS NOT NULL として取り出す
+    not_null = re.findall(r"NOT \(" + col + r"\s*IS NULL\)", where)
+    where = re.sub(r"NOT \(" + col + r"\s*IS NULL\)", "", where)
+    not_null += re.findall(col + r"\s*IS NOT NULL", where)
+    false_flags = re.findall(r"NOT " + col + r"(?=\s*(?:\)|AND\b|OR\b|$))", where)
+    where = re.sub(r"NOT " + col + r"(?=\s*(?:\)|AND\b|OR\b|$))", "", where)
+    true_flags = re.findall(col + r"(?=\s*(?:\)|AND\b|OR\b|$))", where)  # 真偽値の列そのもの
+    equality = re.findall(col + r"\s*(?:=|IN\b|IS NULL)", where)
+    ranges = re.findall(col + r"\s*(?:<|>|<=|>=|LIKE\b)", where)
+    sort = [("-" if direction == "DESC" else "") + name
+            for name, direction in re.findall(col + r"\s*(ASC|DESC)", order)]
+
+    pk = model._meta.pk.column
+    if pk in equality:
+        return None  # 主キーで引いているなら足りている
+
+    columns = {f.column: f.name for f in model._meta.concrete_fields}
+    condition = models.Q()
+    for name in true_flags + false_flags:
+        if name in columns:
+            condition &= models.Q(**{columns[name]: name in true_flags})
+    for name in not_null:
+        if name in columns:
+            condition &= models.Q(**{f"{columns[name]}__isnull": False})
+
+    fields = []
+    rest = ranges[:1]
+    if not equality and not sort and not rest:
+        # 条件が部分インデックスの分だけ：IS NOT NULL の列か主キーを並べる
+        rest = not_null or [pk]
+    for name in list(dict.fromkeys(equality)) + sort + rest:
+        plain = name.lstrip("-")
+        if plain in columns and all(f.lstrip("-") != columns[plain] for f in fields):
+            fields.append(("-" if name.startswith("-") else "") + columns[plain])
+    if not fields or (fields == [model._meta.pk.name] and not condition):
+        return None
+
+    index = models.Index(fields=fields, name="")
+    index.set_name_with_model(model)  # 名前は Django と同じ付け方で
+    if condition:
+        index = models.Index(fields=fields, condition=condition, name=index.name)
+    return index
+
+
+def is_covered(model, index):
+    """同じ条件で、先頭の列が一致するインデックスがすでにあるか"""
+    wanted = [f.lstrip("-") for f in index.fields]
+    existing = [([f.lstrip("-") for f in i.fields], i.condition) for i in model._meta.indexes]
+    if index.condition is None:
+        existing.append(([model._meta.pk.name], None))
+        existing += [([f.name], None) for f in model._meta.concrete_fields if f.db_index or f.unique]
+        existing += [(list(together), None) for together in model._meta.unique_together]
+    return any(fields[:len(wanted)] == wanted and condition == index.condition for fields, condition in existing)
+
+
+def render_index(index):
+    fields = ", ".join(f'"{f}"' for f in index.fields)
+    condition = ""
+    if index.condition is not None:
+        args = ", ".join(f"{key}={value!r}" for key, value in index.condition.children)
+        condition = f", condition=models.Q({args})"
+    return f'models.Index(fields=[{fields}]{condition}, name="{index.name}"),'
+
+
+# ==========================================
+# 4. コマンド本体
+# ==========================================
+
+class Command(BaseCommand):
+    help = "GET every URL with the test client, EXPLAIN its SELECTs and suggest indexes for full scans / sorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Only URLs whose name or path contains this text")
+        parser.add_argument("--user", help="Log in as this username (default: a temporary superuser)")
+        parser.add_argument("--plans", action="store_true", help="Print the EXPLAIN output of every query")
+
+    def handle(self, *args, **options):
+        # URL をたどり始めてから explain() で止まらないよう、先に確かめる
+        if connection.vendor not in SUPPORTED_VENDORS:
+            raise CommandError(f"EXPLAIN is not supported for {connection.vendor} "
+                               f"(supported: {', '.join(SUPPORTED_VENDORS)})")
+        table_models = {m._meta.db_table: m for m in apps.get_models()}
+        suggestions = {}  # (model, fields, condition) → index
+        hits = defaultdict(set)  # 同上 → URL 名
+        covered = defaultdict(set)
+
+        # 書き込みのある GET（決済など）もあるので、全部まとめてロールバックする
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=["*"], QUERY_BUDGET_RAISE=False):
+            client = Client(raise_request_exception=False)
+            user = self._user(options["user"])
+
+            for route, name in sorted(set(iter_url_patterns(get_resolver().url_patterns))):
+                if route.startswith("admin/"):
+                    continue
+                label = name or "-"
+                if options["url"] and options["url"] not in route and options["url"] not in label:
+                    continue
+                kwargs_list = sample_kwargs(route, name)
+                if kwargs_list is None:
+                    self.stdout.write(self.style.WARNING(f"/{route}  ({label})  skipped: no sample data"))
+                    continue
+
+                for kwargs in kwargs_list:
+                    path = "/" + _KWARG.sub(lambda m: str(kwargs[m.group(2)]), route)
+                    client.force_login(user)  # ログアウトの URL を通ったあとも、ログインした状態で見る
+                    recorder = SelectRecorder()
+                    with connection.execute_wrapper(recorder), transaction.atomic():
+                        response = client.get(path)
+                        transaction.set_rollback(True)
+
+                    self.stdout.write(f"{path}  ({label})  {response.status_code}  {len(recorder.statements)} queries")
+                    for sql, params in dict.fromkeys(recorder.statements):
+                        findings, plan = explain(sql, params)
+                        if options["plans"]:
+                            self.stdout.write(f"    {sql[:160]}")
+                            for line in plan:
+                                self.stdout.write(f"      {line}")
+                        for kind, table, detail in findings:
+                            model = table_models.get(table)
+                            if model is None:
+                                continue
+                            index = suggest_index(model, sql)
+                            if index is None:
+                                self.stdout.write(f"    {kind:<4} {table}  (no filter/sort to index)")
+                                continue
+                            key = (model, tuple(index.fields), repr(index.condition))
+                            suggestions.setdefault(key, index)
+                            hits[key].add(label)
+                            if is_covered(model, index):
+                                covered[key].add(label)
+                            self.stdout.write(self.style.WARNING(f"    {kind:<4} {table}  → {index.fields}"))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write("")
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS("No full scans or unindexed sorts found."))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING("Suggested indexes"))
+        for key, index in sorted(suggestions.items(), key=lambda kv: (kv[0][0]._meta.label, kv[0][1])):
+            model = key[0]
+            note = "  (an existing index already starts with these fields; the planner chose not to use it)" \
+                if key in covered else ""
+            self.stdout.write(f"  {model._meta.label}  [{', '.join(sorted(hits[key]))}]{note}")
+            self.stdout.write(f"      {render_index(index)}")
+
+    def _user(self, username):
+        User = get_user_model()
+        if username:
+            return User._default_manager.get_by_natural_key(username)
+        # ロールバックで消える一時ユーザー（スタッフ専用ページも見られるように）
+        return User._default_manager.create_user(
+            **{User.USERNAME_FIELD: "__index_advisor__"}, is_staff=True, is_superuser=True)
@@ -0,0 +1,29 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from dicon_app.db_router import replicas
+
+
+class Command(BaseCommand):
+    help = ("Copy the SQLite primary into the SQLite replicas from DATABASE_REPLICA_URLS "
+            "(a local stand-in for replication; run again to catch the replicas up)")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        targets = [connections[alias].settings_dict for alias in replicas()]
+        if not targets:
+            raise CommandError("No replicas configured (set DATABASE_REPLICA_URLS)")
+        if any(connections[alias].vendor != "sqlite" for alias in [DEFAULT_DB_ALIAS, *replicas()]):
+            raise CommandError("Only SQLite files can be synced here; use the database's own replication")
+
+        for alias, target in zip(replicas(), targets):
+            start = time.perf_counter()
+            # backup API：書き込み中のプライマリからでも一貫した複製が取れる
+            with closing(sqlite3.connect(str(primary["NAME"]))) as source, \
+                    closing(sqlite3.connect(str(target["NAME"]))) as dest:
+                source.backup(dest)
+            self.stdout.write(f"{alias}: {target['NAME']} ({time.perf_counter() - start:.2f}s)")
@@ -0,0 +1,101 @@
+import re
+import urllib.error
+import urllib.request
+from pathlib import Path, PurePosixPath
+from urllib.parse import quote, urljoin, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dicon_app import assets
+
+# Google Fonts は User-Agent を見て形式を決める（woff2 を返してもらうため今どきのブラウザを名乗る）
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+_URL = re.compile(r"url\((['\"]?)([^'\")]+)\1\)")
+
+
+def fetch(url: str) -> bytes:
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def woff2_only(css: str) -> str:
+    """@font-face の src から woff2 以外（ttf など）を外す。今のブラウザは woff2 しか取りに来ない"""
+    def keep(match):
+        sources = [s for s in match.group(1).split(",") if "woff2" in s]
+        return f"src:{','.join(sources)}" if sources else match.group(0)
+    return re.sub(r"src:([^;}]+)", keep, css)
+
+
+class Command(BaseCommand):
+    help = ("Vendor Bootstrap / Font Awesome / Mochiy Pop One into static/vendor/: "
+            "purge unused CSS rules and icons, subset the fonts (run before collectstatic)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-purge", action="store_true", help="Keep every CSS rule")
+
+    def handle(self, *args, **options):
+        static_root = Path(settings.STATICFILES_DIRS[0])
+        used = assets.used_tokens()
+        self.stdout.write(f"{len(used)} class-like tokens in templates / code")
+
+        for key, asset in assets.ASSETS.items():
+            target = static_root / asset.path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            url, body = asset.cdn, None
+            if key == "mochiy.css":
+                # テンプレートに出てくる文字だけのフォントを作ってもらう。断られたら（URL が長すぎるなど）
+                # 通常版に戻す（unicode-range で分割されているので、ブラウザは使う範囲しか取りに来ない）
+                subset_url = url + "&text=" + quote(assets.template_characters())
+                try:
+                    url, body = subset_url, fetch(subset_url)
+                except urllib.error.HTTPError as exc:
+                    self.stderr.write(f"  {key}: subset request failed ({exc}), using the full font")
+                    url = asset.cdn
+            try:
+                body = body or fetch(url)
+            except OSError as exc:
+                raise CommandError(f"{key}: could not fetch {url} ({exc})")
+
+            if target.suffix != ".css":
+                target.write_bytes(body)
+                self.stdout.write(f"  {key}: {len(body) / 1024:.0f} KB")
+                continue
+
+            css = woff2_only(body.decode("utf-8"))
+            if asset.purge and not options["no_purge"]:
+                css = assets.purge_css(css, used)
+            css, fonts = self._localize(css, url, target.parent, subset=asset.purge)
+            target.write_text(css, encoding="utf-8")
+            font_bytes = sum(f.stat().st_size for f in fonts)
+            self.stdout.write(f"  {key}: {len(body) / 1024:.0f} KB -> {len(css.encode()) / 1024:.0f} KB"
+                              + (f" (+ {len(fonts)} fonts, {font_bytes / 1024:.0f} KB)" if fonts else ""))
+
+    def _localize(self, css: str, css_url: str, css_dir: Path, subset: bool = False):
+        """CSS が参照するフォントなどを取ってきて横に置き、url() を相対パスに書き換える"""
+        fonts, done = [], {}
+        codepoints = assets.used_codepoints(css)
+
+        def replace(match):
+            ref = match.group(2)
+            if ref.startswith("data:"):
+                return match.group(0)
+            if ref not in done:
+                absolute = urljoin(css_url, ref)
+                if urlsplit(ref).scheme:
+                    # 別ホスト（fonts.gstatic.com など）のものは fonts/ に
+                    local = f"fonts/{PurePosixPath(urlsplit(absolute).path).name}"
+                else:
+                    local = urlsplit(ref).path
+                path = (css_dir / local).resolve()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(fetch(absolute))
+                if subset and path.suffix == ".woff2":
+                    # purge で残ったアイコンのグリフだけに
+                    assets.subset_font(path, codepoints)
+                fonts.append(path)
+                done[ref] = local
+            return f"url({done[ref]})"
+
+        return _URL.sub(replace, css), fonts
@@ -0,0 +1,171 @@
+"""
+アップロード画像（MEDIA_URL 以下）の配信
+
+DEBUG でなくても config/urls.py からここへ来ます。やることは：
+- ファイルは FileResponse で返す（gunicorn などは wsgi.file_wrapper 経由で sendfile＝ゼロコピーで送る）
+- Range: bytes=a-b（1 区間）に 206 で答える。区間は「その位置まで seek したファイル＋Content-Length」で表すので、
+  sendfile はそのまま使える
+- ETag / Last-Modified を付け、If-None-Match / If-Modified-Since には 304（本文を読まない）
+- 名前が中身のハッシュで決まるファイル（dicon_app/storage.py）は 1 年キャッシュ＋immutable、
+  それ以外は MEDIA_MAX_AGE 秒
+- MEDIA_ACCEL_REDIRECT が設定されていれば、本文は送らず X-Accel-Redirect で nginx に任せる
+  （ヘッダーと 304 の判定だけ Django がやる）。nginx 側の例：
+      location /_media/ { internal; alias /srv/dicon/media/; }
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
+
+DEFAULT_MAX_AGE = 60 * 60 * 24
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+# ==========================================
+# 1. ヘッダーの材料
+# ==========================================
+
+def etag_for(path: str, stat: os.stat_result) -> str:
+    """中身のハッシュが名前にあればそれを、無ければ サイズ-更新時刻"""
+    if is_content_addressed(path):
+        return '"%s"' % os.path.splitext(os.path.basename(path))[0]
+    return '"%x-%x"' % (stat.st_size, stat.st_mtime_ns)
+
+
+def cache_control_for(path: str) -> str:
+    if is_content_addressed(path):
+        return IMMUTABLE_CACHE_CONTROL
+    return "public, max-age=%d" % getattr(settings, "MEDIA_MAX_AGE", DEFAULT_MAX_AGE)
+
+
+def parse_range(header: str, size: int):
+    """
+    Range ヘッダーを (start, end) に（end を含む）
+    ヘッダーが無い・読めない・複数区間なら None（＝全体を 200 で返す）、満たせない区間なら False（416）
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # bytes=-500 は「最後の 500 バイト」
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag: str, last_modified: int) -> bool:
+    """If-Range があれば、一致するときだけ Range を使う（変わっていたら全体を返す）"""
+    value = request.META.get("HTTP_IF_RANGE")
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith("W/"):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+class FileRange:
+    """
+    開いたファイルの [start, start+length) だけを読むラッパー
+    fileno / tell / seek は元のファイルのものを見せるので、sendfile する WSGI サーバーは
+    「今の位置から Content-Length バイト」をそのままカーネルに送れる
+    """
+
+    def __init__(self, file, start: int, length: int):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def close(self):
+        self.file.close()
+
+
+# ==========================================
+# 2. 配信
+# ==========================================
+
+def serve(request, path, document_root=None):
+    try:
+        fullpath = safe_join(document_root or settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("ファイルが見つかりません")
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404("ファイルが見つかりません")
+    if not os.path.isfile(fullpath):
+        raise Http404("ファイルが見つかりません")
+
+    etag = etag_for(path, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _body_response(request, path, fullpath, stat.st_size, etag, last_modified)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = cache_control_for(path)
+    return response
+
+
+def _body_response(request, path, fullpath, size, etag, last_modified):
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+
+    accel = getattr(settings, "MEDIA_ACCEL_REDIRECT", "")
+    if accel:
+        # 本文・Range・sendfile は nginx に任せる
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = accel.rstrip("/") + "/" + quote(path)
+        return response
+
+    span = None
+    if _if_range_matches(request, etag, last_modified):
+        span = parse_range(request.META.get("HTTP_RANGE", ""), size)
+    if span is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(fullpath, "rb")
+    if span is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = span
+        response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicon_app', '0027_remove_homepickup_target_pk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_active', 'id'], name='event_active_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_sale', 'id'], name='product_is_sale_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='set',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='set_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(fields=['category', 'id'], name='shop_category_id_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.27 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicon_app', '0028_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_active_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_is_sale_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='set',
+            name='set_active_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='conciergeitem',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order'], name='concierge_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationitem',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order'], name='consultitem_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationitem',
+            index=models.Index(fields=['preset_id', 'order'], name='consultitem_preset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='event_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['start_date'], name='event_active_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='heroslide',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order'], name='heroslide_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='homepickup',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order'], name='homepickup_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partner',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order'], name='partner_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_sale', True)), fields=['id'], name='product_sale_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='set',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='set_active_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(condition=models.Q(('latitude__isnull', False), ('longitude__isnull', False)), fields=['latitude', 'longitude'], name='shop_located_idx'),
+        ),
+    ]
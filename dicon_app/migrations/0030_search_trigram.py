@@ -0,0 +1,40 @@
+# PostgreSQL のときだけ pg_trgm と GIN インデックスを作る（settings.SEARCH_BACKEND = "trigram" 用）
+# SQLite など他の DB では何もしない
+
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    ("shop_name_trgm_idx", "dicon_app_shop", "name"),
+    ("shop_description_trgm_idx", "dicon_app_shop", "description"),
+    ("product_name_trgm_idx", "dicon_app_product", "name"),
+    ("set_name_trgm_idx", "dicon_app_set", "name"),
+    ("set_description_trgm_idx", "dicon_app_set", "description"),
+    ("event_title_trgm_idx", "dicon_app_event", "title"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ("{column}" gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _table, _column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicon_app', '0029_advisor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
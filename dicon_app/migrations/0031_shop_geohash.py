@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+def fill_geohash(apps, schema_editor):
+    """位置情報のある既存の店に geohash を入れる"""
+    from dicon_app.geo import encode
+
+    Shop = apps.get_model("dicon_app", "Shop")
+    shops = list(Shop.objects.filter(latitude__isnull=False, longitude__isnull=False).only("latitude", "longitude"))
+    for shop in shops:
+        shop.geohash = encode(shop.latitude, shop.longitude)
+    Shop.objects.bulk_update(shops, ["geohash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicon_app', '0030_search_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True, verbose_name='geohash'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(condition=models.Q(('geohash__isnull', False)), fields=['geohash'], name='shop_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.27 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicon_app', '0031_shop_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultationitem',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='consultationitem',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+        migrations.AddField(
+            model_name='heroslide',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='heroslide',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+        migrations.AddField(
+            model_name='homepickup',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='homepickup',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+        migrations.AddField(
+            model_name='partner',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='partner',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+        migrations.AddField(
+            model_name='set',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='set',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='画像の代表色'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='画像のプレースホルダ'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.27 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dicon_app", "0032_image_placeholders"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="street",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="shop",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="set",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="heroslide",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="homepickup",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="partner",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="conciergeitem",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="consultationitem",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="更新日時"),
+            preserve_default=False,
+        ),
+    ]
@@ -4,12 +4,28 @@ from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
+# ==========================================
+# 0. 画像のプレースホルダ（画像を持つモデル共通）
+# ==========================================
+class ImagePlaceholder(models.Model):
+    """
+    image の代表色と 16px のサムネイル（data URI）。読み込み中に {% picture %} が背景として出す
+    保存時に signals.py が作る（既存分は manage.py generate_image_placeholders）
+    """
+    image_color = models.CharField("画像の代表色", max_length=7, blank=True, default="", editable=False)
+    image_lqip = models.TextField("画像のプレースホルダ", blank=True, default="", editable=False)
+
+    class Meta:
+        abstract = True
+
+
 # ==========================================
 # 1. 通り（Street）
 # ==========================================
 class Street(models.Model):
     name = models.CharField("通り名", max_length=100)
     color = models.CharField("テーマカラー", max_length=20, default="#6c757d", help_text="カラーコード（例：#ff9800）")
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     def __str__(self):
         return self.name
@@ -17,7 +33,7 @@ class Street(models.Model):
 # ==========================================
 # 2. 店舗（Shop）
 # ==========================================
-class Shop(models.Model):
+class Shop(ImagePlaceholder):
     CATEGORY_CHOICES = [
         ('vegetable', '野菜・果物'),
         ('meat', 'お肉・惣菜'),
@@ -29,24 +45,49 @@ class Shop(models.Model):
     category = models.CharField("カテゴリ", max_length=20, choices=CATEGORY_CHOICES, default='other')
     latitude = models.FloatField("緯度", null=True, blank=True)
     longitude = models.FloatField("経度", null=True, blank=True)
+    # 緯度・経度から自動で入る（近くのお店の検索用。dicon_app/geo.py）
+    geohash = models.CharField("geohash", max_length=12, null=True, blank=True, editable=False)
     street = models.ForeignKey(Street, on_delete=models.CASCADE, related_name="shops", verbose_name="通り")
     name = models.CharField("店舗名", max_length=120)
     description = models.TextField("説明", blank=True)
     line_url = models.URLField("LINEリンク", blank=True, null=True)
     image = models.ImageField(upload_to='shops/', blank=True, null=True, verbose_name="店舗画像")
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "店舗"
         verbose_name_plural = "店舗"
         unique_together = ("street", "name")
+        indexes = [
+            # 一覧のキーセットページング（カテゴリ絞り込み＋id順）
+            models.Index(fields=["category", "id"], name="shop_category_id_idx"),
+            # 地図のピン（位置情報が入っている店だけ）
+            models.Index(fields=["latitude", "longitude"], name="shop_located_idx",
+                         condition=models.Q(latitude__isnull=False, longitude__isnull=False)),
+            # 近くのお店：位置情報のある店だけの部分インデックス
+            models.Index(fields=["geohash"], name="shop_geohash_idx", condition=models.Q(geohash__isnull=False)),
+        ]
 
     def __str__(self):
         return f"{self.street.name} / {self.name}"
 
+    def fill_auto_fields(self):
+        """save() で自動で入る値（bulk_create する側からも呼ぶ：catalog_io.py）"""
+        from .geo import encode
+        located = self.latitude is not None and self.longitude is not None
+        self.geohash = encode(self.latitude, self.longitude) if located else None
+
+    def save(self, *args, **kwargs):
+        self.fill_auto_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"geohash"}
+        super().save(*args, **kwargs)
+
 # ==========================================
 # 3. 商品（Product）
 # ==========================================
-class Product(models.Model):
+class Product(ImagePlaceholder):
     CATEGORY_CHOICES = [
         ('vegetable', '野菜・果物'),
         ('meat', 'お肉・惣菜'),
@@ -62,10 +103,17 @@ class Product(models.Model):
     image = models.ImageField(upload_to='products/', blank=True, null=True, verbose_name="商品画像")
     is_sale = models.BooleanField("特売", default=False)
     sale_price = models.IntegerField("特売価格", null=True, blank=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "商品"
         verbose_name_plural = "商品"
+        indexes = [
+            # 一覧のキーセットページング（カテゴリ・特売の絞り込み＋id順）
+            models.Index(fields=["category", "id"], name="product_category_id_idx"),
+            # filter(is_sale=True) は WHERE "is_sale" になり (is_sale, id) は使われないので部分インデックス
+            models.Index(fields=["id"], name="product_sale_id_idx", condition=models.Q(is_sale=True)),
+        ]
 
     def __str__(self):
         return self.name
@@ -73,7 +121,7 @@ class Product(models.Model):
 # ==========================================
 # 4. おすすめセット（Set）
 # ==========================================
-class Set(models.Model):
+class Set(ImagePlaceholder):
     CATEGORY_CHOICES = [
         ('beauty', '美容・デトックス'),
         ('health', '健康維持・数値改善'),
@@ -90,6 +138,7 @@ class Set(models.Model):
     products = models.ManyToManyField(Product, related_name="sets", blank=True)
     is_active = models.BooleanField("表示", default=True)
     created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     @property
     def total_price(self):
@@ -98,19 +147,26 @@ class Set(models.Model):
     class Meta:
         verbose_name = "【管理栄養士】献立セット"
         verbose_name_plural = "【管理栄養士】献立セット"
+        indexes = [
+            # 一覧のキーセットページング（新しい順）
+            models.Index(fields=["-created_at", "-id"], name="set_active_new_idx", condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
+    def fill_auto_fields(self):
         if not self.slug:
             self.slug = slugify(self.name)
+
+    def save(self, *args, **kwargs):
+        self.fill_auto_fields()
         super().save(*args, **kwargs)
 
 # ==========================================
 # 5. イベント（Event）
 # ==========================================
-class Event(models.Model):
+class Event(ImagePlaceholder):
     CATEGORY_CHOICES = [
         ("food", "食"),
         ("experience", "体験"),
@@ -126,32 +182,45 @@ class Event(models.Model):
     image = models.ImageField(upload_to='events/', blank=True, null=True, verbose_name="イベント画像")
     is_active = models.BooleanField("公開中", default=True)
     created_at = models.DateTimeField("作成日", auto_now_add=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "イベント"
         verbose_name_plural = "イベント"
+        indexes = [
+            # 一覧のキーセットページング／ホームの開催日順（公開中だけの部分インデックス）
+            models.Index(fields=["id"], name="event_active_idx", condition=models.Q(is_active=True)),
+            models.Index(fields=["start_date"], name="event_active_start_idx", condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
+    def fill_auto_fields(self):
         if not self.slug:
             self.slug = slugify(self.title)
+
+    def save(self, *args, **kwargs):
+        self.fill_auto_fields()
         super().save(*args, **kwargs)
 
 # ==========================================
 # 6. トップ画像スライド（HeroSlide）
 # ==========================================
-class HeroSlide(models.Model):
+class HeroSlide(ImagePlaceholder):
     title = models.CharField("タイトル", max_length=120)
     image = models.ImageField(upload_to='slides/', verbose_name="スライド画像", null=True, blank=True)
     order = models.IntegerField("表示順", default=1)
     is_active = models.BooleanField("表示", default=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "トップ告知スライド"
         verbose_name_plural = "トップ告知スライド"
         ordering = ["order"]
+        indexes = [
+            models.Index(fields=["order"], name="heroslide_active_order_idx", condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return f"{self.order}: {self.title}"
@@ -161,7 +230,7 @@ TopSlide = HeroSlide
 # ==========================================
 # 7. ピックアップ（HomePickup）
 # ==========================================
-class HomePickup(models.Model):
+class HomePickup(ImagePlaceholder):
     title = models.CharField("タイトル", max_length=100)
     description = models.TextField("説明文", max_length=200)
     image = models.ImageField("画像", upload_to='home_pickup/')
@@ -169,11 +238,15 @@ class HomePickup(models.Model):
     link_url_name = models.CharField("リンク先のURL名", max_length=100)
     order = models.IntegerField("表示順序", default=0)
     is_active = models.BooleanField("公開する", default=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "【おばちゃん】コンシェルジュ項目"
         verbose_name_plural = "【おばちゃん】コンシェルジュ項目"
         ordering = ['order']
+        indexes = [
+            models.Index(fields=["order"], name="homepickup_active_order_idx", condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return self.title
@@ -181,7 +254,7 @@ class HomePickup(models.Model):
 # ==========================================
 # 8. 認定パートナー（Partner）
 # ==========================================
-class Partner(models.Model):
+class Partner(ImagePlaceholder):
     CATEGORY_CHOICES = [
         ('cleaning', 'お掃除'),
         ('repair', '修理・修繕'),
@@ -194,11 +267,15 @@ class Partner(models.Model):
     url = models.URLField("WebサイトURL", blank=True)
     order = models.IntegerField("表示順", default=0)
     is_active = models.BooleanField("表示", default=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "認定パートナー"
         verbose_name_plural = "認定パートナー"
         ordering = ['order']
+        indexes = [
+            models.Index(fields=["order"], name="partner_active_order_idx", condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return self.name
@@ -211,11 +288,15 @@ class ConciergeItem(models.Model):
     answer = models.TextField("おばちゃんの回答")
     order = models.IntegerField("表示順", default=0)
     is_active = models.BooleanField("表示", default=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "【おばちゃん】コンシェルジュ回答"
         verbose_name_plural = "【おばちゃん】コンシェルジュ回答"
         ordering = ['order']
+        indexes = [
+            models.Index(fields=["order"], name="concierge_active_order_idx", condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return self.title
@@ -223,18 +304,24 @@ class ConciergeItem(models.Model):
 # ==========================================
 # 10. 相談メニュー（ConsultationItem）
 # ==========================================
-class ConsultationItem(models.Model):
+class ConsultationItem(ImagePlaceholder):
     title = models.CharField("メニュー名", max_length=100)
     description = models.TextField("説明文")
     image = models.ImageField("画像", upload_to='consult/')
     preset_id = models.CharField("プリセットID", max_length=50)
     order = models.IntegerField("表示順", default=0)
     is_active = models.BooleanField("表示", default=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
 
     class Meta:
         verbose_name = "【ホーム】相談メニュー"
         verbose_name_plural = "【ホーム】相談メニュー"
         ordering = ['order']
+        indexes = [
+            models.Index(fields=["order"], name="consultitem_active_order_idx", condition=models.Q(is_active=True)),
+            # 相談画面の ?preset= で引く
+            models.Index(fields=["preset_id", "order"], name="consultitem_preset_idx"),
+        ]
 
     def __str__(self):
         return self.title
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+キーセット（カーソル）ページング
+
+OFFSET を使うページングは「前のページの行を全部読み飛ばす」ので、後ろのページほど遅くなります。
+ここでは「最後に表示した行の並び替えキー」をカーソルにして、
+WHERE (created_at, id) < (前回の最後の値) のように続きから読みます（インデックスがそのまま効く）。
+
+    page = paginate(Set.objects.filter(is_active=True), ("-created_at", "-id"), request.GET.get("after"))
+    page.items        # このページの行
+    page.next_cursor  # 続きがあれば次のカーソル文字列、なければ None
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+DEFAULT_PAGE_SIZE = 24
+
+
+@dataclass
+class KeysetPage:
+    items: List
+    next_cursor: Optional[str]
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+# ==========================================
+# カーソルの作成・読み取り
+# ==========================================
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+    """壊れたカーソルは「先頭から」として扱う"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError, RecursionError):
+        return None
+    return values if isinstance(values, list) else None
+
+def cursor_values(model, ordering: Sequence[str], values: Optional[list]) -> Optional[list]:
+    """
+    カーソルの値を並び替えキーの型に直す（field.to_python）。
+    数が合わない・NULL・型が違う値は（手で書き換えられたカーソルなど）「先頭から」として None
+    """
+    if not values or len(values) != len(ordering):
+        return None
+    converted = []
+    for field_name, value in zip(ordering, values):
+        if value is None or isinstance(value, (list, dict)):
+            return None
+        try:
+            field = model._meta.get_field(field_name.lstrip("-"))
+            value = field.to_python(value)
+            field.run_validators(value)  # 整数の範囲（DB に渡すと OverflowError になる大きさ）も
+        except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+            return None
+        if value is None or (isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63):
+            return None
+        if isinstance(value, datetime) and timezone.is_naive(value) and settings.USE_TZ:
+            value = timezone.make_aware(value)
+        converted.append(value)
+    return converted
+
+
+# ==========================================
+# ページング本体
+# ==========================================
+
+def _after(ordering: Sequence[str], values: list) -> Q:
+    """
+    (a, b, c) > (va, vb, vc) を OR/AND に展開する。
+    a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND c > vc)
+    ※ 降順のフィールドは > を < にする
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        op = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{op}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def paginate(queryset, ordering: Sequence[str], cursor: Optional[str] = None,
+             per_page: int = DEFAULT_PAGE_SIZE) -> KeysetPage:
+    """
+    ordering は一意になるように最後を主キーにすること（例: ("-created_at", "-id")）。
+    並び替えキーは NULL を含まない列にしてください。
+    """
+    values = cursor_values(queryset.model, ordering, decode_cursor(cursor))
+    queryset = queryset.order_by(*ordering)
+    if values:
+        queryset = queryset.filter(_after(ordering, values))
+
+    # 1件多く取って「次があるか」を判定する（COUNT は使わない）
+    rows = list(queryset[:per_page + 1])
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, f.lstrip("-")) for f in ordering])
+    return KeysetPage(items=items, next_cursor=next_cursor)
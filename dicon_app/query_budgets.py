@@ -0,0 +1,49 @@
+"""
+URL名ごとのクエリ予算（query_instrumentation.py が使う）
+
+1リクエストで発行してよいクエリ数の上限です。ログイン中はセッション＋ユーザーで +2 されるので、その分も含めています。
+数はキャッシュ（ページ・バージョン・セッション）が全部空のときのもの。dicon_app/tests.py の QueryBudgetTests が
+予算のある URL を全部、未ログインとログイン中で叩いて確かめます（予算を足したらそこにも URL を足す）。
+超えたら警告ログ、テスト中（QUERY_BUDGET_RAISE=True）は QueryBudgetExceeded でテストが落ちます。
+一覧系は件数に関係なく一定のはずなので、N+1 が入るとすぐ超えます。
+"""
+
+QUERY_BUDGETS = {
+    # 🏠 ホーム（キャッシュが全部外れたときでも収まる数）
+    "dicon_app:home": 10,
+
+    # 🏪 店舗・商品・セット
+    "dicon_app:shop_list": 5,
+    "dicon_app:shop_detail": 6,
+    # 近くに店が足りないときは半径を広げて探し直す：500m → 見積もった半径（2 倍以上、0 件なら 10 倍の 5km）→ 50km。
+    # geo.NEAREST_MAX_QUERIES（3 回）で打ち切るのが前提。radius 指定なら 1 回
+    "dicon_app:shops_nearby": 3,
+    "dicon_app:product_list": 4,
+    "dicon_app:product_detail": 5,
+    "dicon_app:set_list": 4,
+    "dicon_app:set_detail": 5,
+    "dicon_app:list_more": 4,
+    "dicon_app:search": 6,  # 初回だけインデックス作成で種類ごとに 1 クエリ。以降は 0
+
+    # 🏷️ 特売・イベント
+    "dicon_app:sale_list": 4,
+    "dicon_app:event_list": 4,
+    "dicon_app:event_detail": 4,
+
+    # 🤝 相談・パートナー
+    "dicon_app:consult_home": 3,
+    "dicon_app:consult_menu": 3,
+    "dicon_app:concierge_list": 4,
+    "dicon_app:partner_list": 4,
+
+    # 🛒 カート
+    "dicon_app:cart_detail": 4,
+    "dicon_app:add_to_cart": 4,
+    "dicon_app:remove_from_cart": 4,
+
+    # 注文履歴
+    "orders:order_list": 3,
+    "orders:order_list_more": 3,
+    "orders:order_list_json": 3,
+    "orders:order_detail": 3,
+}
@@ -0,0 +1,166 @@
+"""
+クエリ計測ミドルウェア（N+1 検出・クエリ予算つき）
+
+リクエストごとに
+- 発行したクエリ数と DB 時間を数え、Server-Timing ヘッダで返す
+- 同じ形の SQL（値だけ違う）が何度も出たら N+1 として、
+  それを発行したテンプレートの行（例: dicon_app/cards/product_cards.html:58）を記録する
+- URL 名ごとのクエリ予算（query_budgets.py）を超えたら警告、テスト中は例外で落とす
+- 直近のリクエストをリングバッファに残し、スタッフ用ページ（/_debug/queries/）で見られるようにする
+
+settings:
+    QUERY_INSTRUMENTATION   … False で計測しない（ミドルウェアは素通し）
+    QUERY_BUDGET_RAISE      … True なら予算超過で QueryBudgetExceeded を投げる
+    QUERY_N_PLUS_ONE_THRESHOLD … 同じ形の SQL が何回出たら N+1 とみなすか（既定 3）
+"""
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .query_budgets import QUERY_BUDGETS
+
+logger = logging.getLogger(__name__)
+
+RING_BUFFER_SIZE = 200
+_recent = deque(maxlen=RING_BUFFER_SIZE)
+_recent_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """URL のクエリ予算を超えた（テストを落とすために AssertionError の仲間にしている）"""
+
+
+# ==========================================
+# 1. SQL の「形」と、発行元テンプレート行
+# ==========================================
+
+_IN_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# トランザクション制御は何度出ても N+1 ではない
+_TRANSACTION = re.compile(r"^(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE)
+
+def fingerprint(sql: str) -> str:
+    """値を取り除いた SQL の形。IN (%s, %s, ...) の個数違いも同じ形にまとめる"""
+    sql = _IN_LIST.sub("(...)", sql)
+    sql = _LITERAL.sub("?", sql)
+    return " ".join(sql.split())
+
+
+def template_origin() -> Optional[str]:
+    """いま描画中のテンプレートの「ファイル名:行」を探す（いちばん内側のタグ）"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            token = getattr(node, "token", None)
+            origin = getattr(node, "origin", None)
+            if token is not None and origin is not None:
+                return f"{origin.template_name}:{token.lineno}"
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """connection.execute_wrapper に渡して、1リクエスト分のクエリを集める"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Dict[str, dict] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            shape = self.shapes.setdefault(fingerprint(sql), {"count": 0, "duration": 0.0, "origins": set()})
+            shape["count"] += 1
+            shape["duration"] += elapsed
+            if shape["count"] >= 2:
+                # 2回目以降だけスタックをたどる（1回きりのクエリには手間をかけない）
+                origin = template_origin()
+                if origin:
+                    shape["origins"].add(origin)
+
+    def repeated(self, threshold: int) -> List[dict]:
+        return [
+            {"sql": sql, "count": s["count"], "duration_ms": round(s["duration"] * 1000, 2),
+             "origins": sorted(s["origins"])}
+            for sql, s in self.shapes.items() if s["count"] >= threshold and not _TRANSACTION.match(sql)
+        ]
+
+
+# ==========================================
+# 2. ミドルウェア
+# ==========================================
+
+class QueryInstrumentationMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", False):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        url_name = match.view_name if match else None
+        threshold = getattr(settings, "QUERY_N_PLUS_ONE_THRESHOLD", 3)
+        entry = {
+            "at": timezone.now(),
+            "method": request.method,
+            "path": request.path,
+            "url_name": url_name,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_ms": round(recorder.duration * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+            "budget": QUERY_BUDGETS.get(url_name),
+            "n_plus_one": recorder.repeated(threshold),
+        }
+        with _recent_lock:
+            _recent.append(entry)
+
+        response["Server-Timing"] = (
+            f'db;dur={entry["db_ms"]};desc="{recorder.count} queries", app;dur={entry["total_ms"]}'
+        )
+        for item in entry["n_plus_one"]:
+            logger.warning("N+1 の疑い %s: %d回 %s @ %s", request.path, item["count"],
+                           item["sql"][:200], ", ".join(item["origins"]) or "?")
+        self._check_budget(entry)
+        return response
+
+    def _check_budget(self, entry):
+        budget = entry["budget"]
+        if budget is None or entry["queries"] <= budget:
+            return
+        message = f'{entry["url_name"]} のクエリ数 {entry["queries"]} が予算 {budget} を超えました ({entry["path"]})'
+        if getattr(settings, "QUERY_BUDGET_RAISE", False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def recent_requests() -> List[dict]:
+    """リングバッファの中身（新しい順）"""
+    with _recent_lock:
+        return list(reversed(_recent))
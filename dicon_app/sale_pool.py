@@ -0,0 +1,153 @@
+"""
+特売品のランダム抽選（セールプール）
+
+以前は Product.objects.filter(is_sale=True).order_by('?')[:6] で選んでいたため、
+特売品が増えるほど DB が毎回「全件をランダムに並べ替え」していました。
+ここでは特売品の ID を店舗ごとにまとめた「プール」をキャッシュに持っておき、
+抽選は Python 側で O(k)（k = 欲しい件数）で行い、選んだ行だけを in_bulk で取ります。
+
+- プールはキャッシュの小さなキーに分けて置く（件数などの見出し・ID を CHUNK 件ずつ・店舗の順番・店舗ごとの ID）。
+  抽選で読むのは見出しと、選んだ位置が入っているキーだけなので、特売品が何件あっても 1 回の手間は同じ
+- プールは Product の保存・削除で捨てられ（signals.py）、次の抽選時に 1 クエリで作り直します。
+  作り直すたびに世代（キーの一部）が変わるので、古い世代のキーは混ざらず TTL で消えます。
+- rotate=True（既定）のときは店舗をローテーションし、しばらく出ていない店舗から順に出します。
+  ローテーション位置はキャッシュ上のカーソル 1 つなので、リクエストあたりの手間は一定です。
+"""
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+
+from .db_router import primary_reads
+from .models import Product
+
+POOL_KEY = "sale_pool:pool"                # 見出し {"gen", "size", "shop_count"}
+IDS_KEY = "sale_pool:{}:ids:{}"            # 世代, 何番目の塊 → 特売品の ID（CHUNK 件）
+SHOPS_KEY = "sale_pool:{}:shops:{}"        # 世代, 何番目の塊 → ローテーションの店舗の順番（CHUNK 件）
+SHOP_KEY = "sale_pool:{}:shop:{}"          # 世代, 店舗 ID → その店舗の特売品の ID
+CURSOR_KEY = "sale_pool:cursor"
+POOL_TTL = 60 * 60  # 念のための上限。通常はシグナルで捨てられる
+CHUNK = 500
+
+
+# ==========================================
+# 1. プールの作成・破棄
+# ==========================================
+
+def build_pool() -> Dict:
+    """特売品 (id, shop_id) を 1 クエリで集めてキャッシュに分けて置き、見出しを返す"""
+    by_shop: Dict[Optional[int], List[int]] = defaultdict(list)
+    ids = []
+    for product_id, shop_id in Product.objects.filter(is_sale=True).values_list("id", "shop_id"):
+        by_shop[shop_id].append(product_id)
+        ids.append(product_id)
+
+    shops = list(by_shop)
+    random.shuffle(shops)  # ローテーションの順番は作り直すたびに変える
+    gen = time.time_ns()
+    entries = {IDS_KEY.format(gen, i // CHUNK): ids[i:i + CHUNK] for i in range(0, len(ids), CHUNK)}
+    entries.update({SHOPS_KEY.format(gen, i // CHUNK): shops[i:i + CHUNK] for i in range(0, len(shops), CHUNK)})
+    entries.update({SHOP_KEY.format(gen, shop_id): shop_ids for shop_id, shop_ids in by_shop.items()})
+    cache.set_many(entries, POOL_TTL)
+    return {"gen": gen, "size": len(ids), "shop_count": len(shops)}
+
+
+def get_pool() -> Dict:
+    """プールの見出し（中身は _slots() で必要な分だけ読む）"""
+    pool = cache.get(POOL_KEY)
+    if pool is None:
+        with primary_reads():  # 捨てた直後に遅れたレプリカから作らない
+            pool = build_pool()
+        cache.set(POOL_KEY, pool, POOL_TTL)
+    return pool
+
+
+def invalidate() -> None:
+    cache.delete(POOL_KEY)
+
+
+class _Evicted(Exception):
+    """見出しはあるのに中身のキーがキャッシュから消えていた"""
+
+
+def _slots(pool: Dict, key: str, positions: Iterable[int]) -> List:
+    """IDS_KEY / SHOPS_KEY の塊から、positions 番目の値だけを（塊ごとに 1 回の get_many で）読む"""
+    positions = list(positions)
+    keys = {p: key.format(pool["gen"], p // CHUNK) for p in positions}
+    chunks = cache.get_many(set(keys.values()))
+    if len(chunks) < len(set(keys.values())):
+        raise _Evicted
+    return [chunks[keys[p]][p % CHUNK] for p in positions]
+
+
+# ==========================================
+# 2. 抽選
+# ==========================================
+
+def _advance_cursor(k: int) -> int:
+    """ローテーション位置を k 進めて、進める前の位置を返す"""
+    cache.add(CURSOR_KEY, 0, None)
+    try:
+        return cache.incr(CURSOR_KEY, k) - k
+    except ValueError:
+        # add と incr の間で消えた場合（キャッシュ溢れなど）は最初から
+        cache.set(CURSOR_KEY, k, None)
+        return 0
+
+
+def _sample(pool: Dict, k: int) -> List[int]:
+    """全体から重複なしで k 件（読むのは選んだ位置の塊だけ）"""
+    positions = random.sample(range(pool["size"]), min(k, pool["size"]))
+    return _slots(pool, IDS_KEY, positions)
+
+
+def _rotate(pool: Dict, k: int) -> List[int]:
+    """しばらく出ていない店舗から順に、各店舗の特売品をランダムに選ぶ"""
+    start = _advance_cursor(k)
+    shops = _slots(pool, SHOPS_KEY, [(start + i) % pool["shop_count"] for i in range(k)])
+    per_shop = Counter(shops)
+    candidates = cache.get_many([SHOP_KEY.format(pool["gen"], shop_id) for shop_id in per_shop])
+    if len(candidates) < len(per_shop):
+        raise _Evicted
+
+    picked = []
+    for shop_id, count in per_shop.items():
+        shop_ids = candidates[SHOP_KEY.format(pool["gen"], shop_id)]
+        picked.extend(random.sample(shop_ids, min(count, len(shop_ids))))
+
+    if len(picked) < k:
+        # 店舗数・商品数が少ないときは、残りを全体から補う
+        seen = set(picked)
+        for product_id in _sample(pool, k * 2):
+            if len(picked) >= k:
+                break
+            if product_id not in seen:
+                seen.add(product_id)
+                picked.append(product_id)
+    random.shuffle(picked)
+    return picked
+
+
+def draw_ids(k: int, rotate: bool = True) -> List[int]:
+    """特売品の ID を最大 k 件選ぶ"""
+    for _ in range(2):
+        pool = get_pool()
+        if not pool["size"] or k <= 0:
+            return []
+        try:
+            return _rotate(pool, k) if rotate else _sample(pool, k)
+        except _Evicted:
+            invalidate()  # 中身の一部が追い出されていたら作り直してもう一度
+    return []
+
+
+def draw(k: int, rotate: bool = True) -> List[Product]:
+    """特売品を最大 k 件選び、選んだ順のまま Product で返す（クエリは in_bulk の 1 回）"""
+    ids = draw_ids(k, rotate=rotate)
+    if not ids:
+        return []
+    products = Product.objects.in_bulk(ids)
+    # プールが古い瞬間に特売終了・削除された商品は落とす
+    return [products[i] for i in ids if i in products and products[i].is_sale]
@@ -0,0 +1,390 @@
+"""
+サイト内検索（お店・商品・献立セット・イベント）
+
+日本語は単語の区切りがないので、正規化した文字列を 2 文字ずつ（バイグラム）に切って
+転置インデックス（文字列 → 文書ごとの出現回数）をプロセス内に持ちます。
+- 正規化: NFKC（全角英数・半角カナをそろえる）→ 小文字 → カタカナをひらがなに
+  「ﾄﾏﾄ」「トマト」「とまと」はどれも同じものとして引けます
+- 順位: 一致したバイグラムの重み付き出現回数 × IDF。名前・タイトルは説明文より重く、
+  名前にそのままの文字列が含まれていれば加点します
+- 更新: モデルの保存・削除（signals.py）で「変更ログ」をキャッシュに積み、
+  各プロセスは検索のときに自分の知らない変更だけを読み直します（全件の作り直しは初回だけ）
+  キャッシュがワーカー間で共有されていない（LocMemCache）と変更ログはほかのワーカーに届かないので、
+  SEARCH_RECHECK_SECONDS 秒ごとに種類ごとの Max(updated_at) と件数（versions.from_db、1 クエリ）を
+  DB と比べ、変わっていたら作り直します
+
+settings.SEARCH_BACKEND = "trigram" にすると、PostgreSQL の pg_trgm（類似度）で DB 側を検索します。
+PostgreSQL 以外では自動的にプロセス内インデックスに戻ります。
+"""
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+from django.urls import reverse
+
+from . import versions
+from .db_router import primary_reads
+from .models import Event, Product, Set, Shop
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "search:version"
+CHANGE_KEY = "search:change:{}"
+CHANGE_TTL = 60 * 60 * 24  # これより古い変更を取りこぼしたプロセスは全件作り直す
+
+DEFAULT_LIMIT = 20
+
+
+# ==========================================
+# 1. 検索対象の定義
+# ==========================================
+
+@dataclass(frozen=True)
+class SearchKind:
+    """検索対象のモデル 1 種類"""
+    name: str                              # "shop" など（結果の種類）
+    label: str                             # 画面に出す名前
+    model: type
+    fields: Tuple[Tuple[str, int], ...]    # (フィールド名, 重み)
+    title_field: str
+    url_name: str
+    url_field: str = "pk"                  # URL に入れる値（イベントは slug）
+    url_kwarg: str = "pk"
+
+    def queryset(self):
+        qs = self.model._default_manager.all()
+        if hasattr(self.model, "is_active"):
+            qs = qs.filter(is_active=True)
+        return qs
+
+    def url(self, key) -> Optional[str]:
+        return reverse(self.url_name, kwargs={self.url_kwarg: key}) if key else None
+
+
+KINDS = {
+    "shop": SearchKind("shop", "お店", Shop, (("name", 3), ("description", 1)), "name",
+                       "dicon_app:shop_detail", url_kwarg="shop_pk"),
+    "product": SearchKind("product", "商品", Product, (("name", 3),), "name", "dicon_app:product_detail"),
+    "set": SearchKind("set", "献立セット", Set, (("name", 3), ("description", 1)), "name",
+                      "dicon_app:set_detail"),
+    "event": SearchKind("event", "イベント", Event, (("title", 3),), "title",
+                        "dicon_app:event_detail", url_field="slug", url_kwarg="slug"),
+}
+KIND_BY_MODEL = {kind.model: kind for kind in KINDS.values()}
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    pk: int
+    title: str
+    url: Optional[str]
+    score: float
+
+    @property
+    def label(self) -> str:
+        return KINDS[self.kind].label
+
+
+# ==========================================
+# 2. 正規化と n-gram
+# ==========================================
+
+_SEPARATORS = re.compile(r"[\s\W_]+")
+
+def normalize(text: str) -> str:
+    """全角/半角・大文字/小文字・カタカナ/ひらがなの違いをなくす"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    # ァ(U+30A1)〜ヶ(U+30F6) をひらがなへ（長音「ー」などはそのまま）
+    return "".join(chr(ord(ch) - 0x60) if "ァ" <= ch <= "ヶ" else ch for ch in text)
+
+
+def ngrams(text: str, n: int = 2) -> List[str]:
+    """正規化した文字列を語ごとに n 文字ずつ切る（n 文字未満の語はそのまま 1 つ）"""
+    grams = []
+    for word in _SEPARATORS.split(normalize(text)):
+        if not word:
+            continue
+        if len(word) <= n:
+            grams.append(word)
+        else:
+            grams.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+# ==========================================
+# 3. 転置インデックス
+# ==========================================
+
+class SearchIndex:
+    """バイグラムの転置インデックス（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings: Dict[str, Dict[tuple, int]] = defaultdict(dict)  # gram → {(kind, pk): 重み付き回数}
+        self.by_char: Dict[str, set] = defaultdict(set)                  # 1文字 → それを含む gram（1文字検索用）
+        self.docs: Dict[tuple, dict] = {}                                # (kind, pk) → title / key / grams
+        self.version = 0
+        self.db_versions = None  # 作ったときの DB の状態（_db_versions()）
+        self.checked_at = 0.0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, kind: str, pk: int, title: str, url_key, fields: Iterable[Tuple[str, int]]) -> None:
+        """fields: [(本文, 重み)]。同じ文書があれば置き換える"""
+        weights = Counter()
+        for text, weight in fields:
+            for gram in ngrams(text):
+                weights[gram] += weight
+        doc = (kind, pk)
+        with self._lock:
+            self._discard(doc)
+            for gram, weight in weights.items():
+                self.postings[gram][doc] = weight
+                for ch in gram:
+                    self.by_char[ch].add(gram)
+            self.docs[doc] = {"title": title, "key": url_key, "norm": normalize(title),
+                              "grams": list(weights), "length": sum(weights.values())}
+
+    def remove(self, kind: str, pk: int) -> None:
+        with self._lock:
+            self._discard((kind, pk))
+
+    def _discard(self, doc):
+        old = self.docs.pop(doc, None)
+        if old is None:
+            return
+        for gram in old["grams"]:
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.pop(doc, None)
+                if not posting:
+                    del self.postings[gram]
+
+    def _expand(self, gram: str) -> List[str]:
+        """1文字の検索語は、その文字を含むすべての gram に広げる"""
+        if len(gram) > 1:
+            return [gram]
+        return [g for g in self.by_char.get(gram, ()) if g in self.postings]
+
+    def search(self, query: str, kinds: Optional[Sequence[str]] = None, limit: int = DEFAULT_LIMIT) -> List[SearchHit]:
+        query_grams = list(dict.fromkeys(ngrams(query)))
+        if not query_grams:
+            return []
+        norm_query = normalize(query).strip()
+
+        with self._lock:
+            total = max(len(self.docs), 1)
+            # 検索語の gram ごとに、該当する文書と重み
+            matches: List[Dict[tuple, int]] = []
+            for gram in query_grams:
+                expanded = self._expand(gram)
+                if len(expanded) == 1:
+                    matches.append(self.postings.get(expanded[0], {}))  # ふつうはコピーせずそのまま使う
+                    continue
+                merged: Dict[tuple, int] = {}
+                for g in expanded:
+                    for doc, weight in self.postings[g].items():
+                        merged[doc] = merged.get(doc, 0) + weight
+                matches.append(merged)
+
+            # まず全部の gram を含む文書（少ない順に絞り込む）。なければ半分以上含む文書で曖昧検索
+            ordered = sorted(matches, key=len)
+            candidates = set(ordered[0])
+            for docs in ordered[1:]:
+                candidates &= docs.keys()
+                if not candidates:
+                    break
+            if not candidates and len(matches) > 1:
+                seen = Counter(doc for docs in matches for doc in docs)
+                candidates = {doc for doc, n in seen.items() if n * 2 >= len(matches)}
+
+            idf = [(docs, math.log(1 + total / max(len(docs), 1))) for docs in matches]
+            scored = []
+            for doc in candidates:
+                if kinds and doc[0] not in kinds:
+                    continue
+                info = self.docs[doc]
+                score = 0.0
+                for docs, weight_idf in idf:
+                    weight = docs.get(doc)
+                    if weight:
+                        score += weight * weight_idf
+                score /= 1 + math.log(1 + info["length"])
+                if norm_query and norm_query in info["norm"]:
+                    score *= 2 if info["norm"].startswith(norm_query) else 1.5
+                scored.append((score, doc, info))
+            top = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+
+        return [
+            SearchHit(kind=doc[0], pk=doc[1], title=info["title"], url=KINDS[doc[0]].url(info["key"]),
+                      score=round(score, 4))
+            for score, doc, info in top
+        ]
+
+
+# ==========================================
+# 4. DB からの読み込みと変更ログ
+# ==========================================
+
+def _load(kind: SearchKind, index: SearchIndex, pks: Optional[Iterable[int]] = None) -> None:
+    """kind の文書を（pks があればその分だけ）1 クエリで読んでインデックスに入れる"""
+    names = [name for name, _ in kind.fields]
+    columns = list(dict.fromkeys(["pk", kind.title_field, kind.url_field] + names))
+    qs = kind.queryset()
+    if pks is not None:
+        pks = set(pks)
+        qs = qs.filter(pk__in=pks)
+    found = set()
+    for row in qs.values(*columns).iterator():
+        found.add(row["pk"])
+        index.add(kind.name, row["pk"], row[kind.title_field], row[kind.url_field],
+                  [(row[name] or "", weight) for name, weight in kind.fields])
+    if pks is not None:
+        for pk in pks - found:  # 消えた・非公開になった
+            index.remove(kind.name, pk)
+
+
+def _recheck_seconds() -> Optional[float]:
+    return getattr(settings, "SEARCH_RECHECK_SECONDS", None)
+
+
+def _db_versions():
+    with primary_reads():
+        return versions.from_db([kind.model for kind in KINDS.values()])
+
+
+def build_index() -> SearchIndex:
+    """全件から作る（種類ごとに 1 クエリ。DB と見比べるときはもう 1 クエリ）"""
+    index = SearchIndex()
+    index.version = cache.get(VERSION_KEY, 0)
+    if _recheck_seconds() is not None:
+        index.db_versions, index.checked_at = _db_versions(), time.monotonic()  # 読む前に（間の変更は次に気づく）
+    with primary_reads():  # 変更ログの番号に追いついた中身をレプリカの遅れで古くしない
+        for kind in KINDS.values():
+            _load(kind, index)
+    return index
+
+
+def _stale_in_db(index: SearchIndex) -> bool:
+    """ほかのワーカーの変更（変更ログが届かない）が DB にあるか。SEARCH_RECHECK_SECONDS 秒に 1 回だけ見る"""
+    recheck = _recheck_seconds()
+    if recheck is None or time.monotonic() < index.checked_at + recheck:
+        return False
+    current = _db_versions()
+    index.checked_at = time.monotonic()
+    return current != index.db_versions
+
+
+def record_change(model, pk) -> None:
+    """signals.py から（コミット後に）：保存・削除された文書を変更ログに積む"""
+    kind = KIND_BY_MODEL.get(model)
+    if kind is None or pk is None:
+        return
+    cache.add(VERSION_KEY, 0, None)
+    version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY.format(version), (kind.name, pk), CHANGE_TTL)
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+def get_index() -> SearchIndex:
+    """このプロセスのインデックス。変更ログに新しい変更があれば、その文書だけ読み直す"""
+    global _index
+    with _index_lock:
+        current = cache.get(VERSION_KEY, 0)
+        if _index is None or current < _index.version or _stale_in_db(_index):
+            _index = build_index()  # 初回、キャッシュが消えて番号が戻った、またはほかのワーカーの変更
+            return _index
+        if current > _index.version:
+            changes = cache.get_many([CHANGE_KEY.format(v) for v in range(_index.version + 1, current + 1)])
+            if len(changes) < current - _index.version:
+                _index = build_index()  # 取りこぼし（期限切れ）があれば作り直す
+                return _index
+            pending = defaultdict(set)
+            for kind_name, pk in changes.values():
+                pending[kind_name].add(pk)
+            with primary_reads():
+                for kind_name, pks in pending.items():
+                    _load(KINDS[kind_name], _index, pks)
+            _index.version = current
+        return _index
+
+
+def invalidate_all() -> None:
+    """一括取り込みなどシグナルを出さない更新のあと：全プロセスに次の検索で作り直させる
+    （変更ログを書かずに番号だけ進めると「取りこぼし」扱いになる）"""
+    cache.add(VERSION_KEY, 0, None)
+    cache.incr(VERSION_KEY)
+
+
+def reset() -> None:
+    """次の検索で全件作り直す"""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+# ==========================================
+# 5. 検索（バックエンドの切り替え）
+# ==========================================
+
+def _trigram_search(query: str, kinds: Optional[Sequence[str]], limit: int) -> List[SearchHit]:
+    """
+    PostgreSQL の pg_trgm で類似度順に引く（種類ごとに 1 クエリ）
+    絞り込みは % 演算子（trigram_similar）にして GIN インデックスを使う。重みつきの類似度は並べ替えと最後の足切りだけ
+    """
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import TrigramSimilarity
+    from django.db.models.functions import Greatest
+
+    query = unicodedata.normalize("NFKC", query)
+    threshold = getattr(settings, "SEARCH_TRIGRAM_THRESHOLD", 0.1)
+    hits = []
+    with transaction.atomic():
+        for kind in KINDS.values():
+            if kinds and kind.name not in kinds:
+                continue
+            # % は重みなしの類似度を pg_trgm.similarity_threshold と比べる。重み w のフィールドは
+            # 類似度 × w > threshold なら当たりなので、いちばん重いフィールドに合わせて閾値を下げておく（SET LOCAL 相当）
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+                               [str(threshold / max(weight for _, weight in kind.fields))])
+            matches = Q(*[TrigramSimilar(F(name), Value(query)) for name, _ in kind.fields], _connector=Q.OR)
+            similarities = [TrigramSimilarity(name, query) * weight for name, weight in kind.fields]
+            similarity = similarities[0] if len(similarities) == 1 else Greatest(*similarities)
+            rows = (kind.queryset().filter(matches).annotate(similarity=similarity).filter(similarity__gt=threshold)
+                    .order_by("-similarity").values("pk", kind.title_field, kind.url_field, "similarity")[:limit])
+            hits += [SearchHit(kind.name, row["pk"], row[kind.title_field], kind.url(row[kind.url_field]),
+                               round(row["similarity"], 4)) for row in rows]
+    hits.sort(key=lambda hit: -hit.score)
+    return hits[:limit]
+
+
+def backend() -> str:
+    name = getattr(settings, "SEARCH_BACKEND", "memory")
+    if name == "trigram" and connection.vendor != "postgresql":
+        logger.warning("SEARCH_BACKEND='trigram' は PostgreSQL でのみ使えます。プロセス内インデックスで検索します")
+        return "memory"
+    return name
+
+
+def search(query: str, kinds: Optional[Sequence[str]] = None, limit: int = DEFAULT_LIMIT) -> List[SearchHit]:
+    if not (query or "").strip():
+        return []
+    if backend() == "trigram":
+        return _trigram_search(query, kinds, limit)
+    return get_index().search(query, kinds, limit)
@@ -0,0 +1,240 @@
+"""
+セッションの保存先（SESSION_ENGINE）。Django の cached_db（キャッシュ＋DB）に、書き込みのまとめと期限切れの掃除を足したもの
+
+カートに入れる・外すたびに、セッションの行をまるごと DB に書いていました。ここでは
+- 中身が読み込んだときと同じなら何も書かない（入れてすぐ外した、など）
+- 前回 DB に書いてから SESSION_WRITE_COALESCE_SECONDS 秒以内の変更はキャッシュと、プロセス内の「DB に未反映」の
+  一覧（中身ごと）に書く。窓が閉じたらバックグラウンドのスレッドが一覧の中身を 1 回だけ DB に書く
+  （続けてクリックしても、DB への書き込みは窓ごとに 1 回。キャッシュから追い出されても一覧の中身は残る）
+- 新しいセッションとログイン・ログアウト（認証の情報が変わったとき）は、その場で DB に書く
+- 期限切れの行は clear_expired() で SESSION_PURGE_CHUNK 行ずつ、間に少し休みながら消す
+  （SQLite で書き込みロックを長く持たないように）。manage.py clearsessions もこれを使い、
+  同じスレッドが SESSION_PURGE_INTERVAL 秒ごとにも実行する（複数ワーカーのうち 1 つだけ）
+読むときはキャッシュが先なので、未反映の変更もすぐ見えます。ただし LocMemCache のようにキャッシュがワーカー間で
+共有されていないと、別のワーカーからは窓の間の変更が見えません（cached_db と同じ）。
+そのため SESSION_WRITE_COALESCE_SECONDS の既定は、キャッシュが LocMemCache なら 0（まとめない）です（settings.py）。
+未反映のものはプロセスの終了時（atexit）にも書き出します。
+"""
+import atexit
+import copy
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "dicon.sessions:"
+PURGE_LOCK_KEY = "dicon.sessions.purge"
+# ログイン・ログアウトで変わるキー（変わったら窓を待たずに DB へ）
+AUTH_KEYS = ("_auth_user_id", "_auth_user_hash", "_auth_user_backend")
+TICK = 1.0           # バックグラウンドのスレッドが未反映のものを見に行く間隔（秒）
+PURGE_PAUSE = 0.05   # 期限切れの削除の 1 回ごとに休む秒数
+
+
+def coalesce_seconds() -> float:
+    return float(getattr(settings, "SESSION_WRITE_COALESCE_SECONDS", 0))
+
+
+# ==========================================
+# 1. セッションの保存先
+# ==========================================
+
+class SessionStore(cached_db.SessionStore):
+    """キャッシュには (中身, 最後に DB に書いた時刻, 未反映か) を入れる"""
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._synced_at = 0.0
+        self._loaded: Optional[dict] = None  # 読み込んだときの中身（変わっていなければ書かない）
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            entry = None  # memcached は変なキーで例外にする（cached_db と同じく作り直し）
+        pending = _writer.pending(self.session_key) if entry is None else None
+        if entry is not None:
+            data, self._synced_at, _ = entry
+        elif pending is not None:
+            # キャッシュから追い出された未反映の変更（DB の行より新しい）
+            data, self._synced_at = pending, 0.0
+        else:
+            s = self._get_session_from_db()
+            data = self.decode(s.session_data) if s else {}
+            if s:
+                # DB から読んだ直後の変更はすぐ DB に書く（_synced_at=0）。窓はそこから始まる
+                self._cache.set(self.cache_key, (data, 0.0, False), self.get_expiry_age(expiry=s.expire_date))
+            self._synced_at = 0.0
+        self._loaded = copy.deepcopy(data)
+        return data
+
+    def save(self, must_create=False):
+        _writer.start()
+        window = coalesce_seconds()
+        if must_create or self.session_key is None or window <= 0:
+            return self._save_to_db(must_create)
+
+        data = self._get_session()
+        if data == self._loaded:
+            return  # 変わっていない
+        if (time.time() - self._synced_at >= window
+                or any(data.get(key) != (self._loaded or {}).get(key) for key in AUTH_KEYS)):
+            return self._save_to_db()
+
+        # 窓の中：キャッシュと未反映の一覧に書き、窓が閉じたら DB へ
+        with _writer.lock_for(self.session_key):
+            self._cache.set(self.cache_key, (data, self._synced_at, True), self.get_expiry_age())
+            _writer.schedule(self.session_key, self._synced_at + window, copy.deepcopy(data))
+        self._loaded = copy.deepcopy(data)
+
+    def _save_to_db(self, must_create=False):
+        if self.session_key is None:
+            return self.create()  # 新しいキーを取って save(must_create=True) に戻ってくる
+        with _writer.lock_for(self.session_key):
+            DBStore.save(self, must_create)
+            data = self._get_session(no_load=must_create)
+            self._synced_at = time.time()
+            self._cache.set(self.cache_key, (data, self._synced_at, False), self.get_expiry_age())
+            _writer.discard(self.session_key)
+        self._loaded = copy.deepcopy(data)
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        if key:
+            with _writer.lock_for(key):
+                _writer.discard(key)
+                super().delete(session_key)
+        else:
+            super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        """期限切れの行を SESSION_PURGE_CHUNK 行ずつ消す。消した行数を返す"""
+        model = cls.get_model_class()
+        chunk = int(getattr(settings, "SESSION_PURGE_CHUNK", 1000))
+        total = 0
+        while True:
+            keys = list(model.objects.filter(expire_date__lt=timezone.now())
+                        .values_list("session_key", flat=True)[:chunk])
+            if not keys:
+                break
+            total += model.objects.filter(session_key__in=keys).delete()[0]
+            if len(keys) < chunk:
+                break
+            time.sleep(PURGE_PAUSE)  # ほかの書き込み（カート・注文）を先に通す
+        if total:
+            logger.info("期限切れのセッションを %d 件削除しました", total)
+        return total
+
+
+# ==========================================
+# 2. 未反映の書き出しと期限切れの掃除（プロセスに 1 本のスレッド）
+# ==========================================
+
+class _Writer:
+
+    def __init__(self):
+        self._pending: Dict[str, Tuple[float, dict]] = {}  # {セッションキー: (DB に書く時刻, 中身)}
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(64)]  # 同じセッションの書き込みを 1 本ずつに
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._next_purge = 0.0
+
+    def lock_for(self, session_key) -> threading.Lock:
+        return self._key_locks[hash(session_key) % len(self._key_locks)]
+
+    def start(self) -> None:
+        """最初の保存で起動する。fork した子プロセス（gunicorn）ではスレッドを作り直す"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.flush, True)
+            self._pid = os.getpid()
+            self._pending.clear()  # 親プロセスの分は親が書く
+            self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+            self._thread.start()
+
+    def schedule(self, session_key: str, due: float, data: dict) -> None:
+        """書く時刻は最初の変更のもの、中身は最新のもの"""
+        with self._lock:
+            first_due = self._pending.get(session_key, (due, None))[0]
+            self._pending[session_key] = (first_due, data)
+
+    def pending(self, session_key) -> Optional[dict]:
+        """まだ DB に書いていない中身（無ければ None）"""
+        with self._lock:
+            entry = self._pending.get(session_key)
+        return copy.deepcopy(entry[1]) if entry else None
+
+    def discard(self, session_key: str) -> None:
+        with self._lock:
+            self._pending.pop(session_key, None)
+
+    def flush(self, everything: bool = False) -> int:
+        """期限の来た（everything なら全部の）未反映のセッションを DB に書く"""
+        now = time.time()
+        with self._lock:
+            keys = [key for key, (due, _) in self._pending.items() if everything or due <= now]
+        return sum(self._flush_one(key) for key in keys)
+
+    def _flush_one(self, session_key: str) -> bool:
+        store = SessionStore(session_key)
+        with self.lock_for(session_key):
+            with self._lock:
+                pending = self._pending.pop(session_key, None)
+            if pending is None:
+                return False  # その間に DB に書かれた（ログイン・窓の後の保存・削除）
+            store._session_cache = pending[1]
+            try:
+                DBStore.save(store)
+            except UpdateError:
+                # 窓の間にログアウト・期限切れの削除で行が消えた
+                store._cache.delete(store.cache_key)
+                return False
+            except Exception:
+                logger.exception("セッションを DB に書けませんでした: %s…", session_key[:8])
+                with self._lock:  # 次の回にもう一度（その間の新しい変更があればそちらを）
+                    self._pending.setdefault(session_key, pending)
+                return False
+            store._cache.set(store.cache_key, (pending[1], time.time(), False), store.get_expiry_age())
+        return True
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(TICK)
+            try:
+                self.flush()
+                self._purge_if_due()
+            except Exception:
+                logger.exception("セッションの書き出しに失敗しました")
+            finally:
+                connections.close_all()  # このスレッドの接続だけを閉じる
+
+    def _purge_if_due(self) -> None:
+        interval = float(getattr(settings, "SESSION_PURGE_INTERVAL", 0))
+        now = time.time()
+        if interval <= 0 or now < self._next_purge:
+            return
+        self._next_purge = now + interval
+        store = SessionStore()
+        # ワーカーが何本あっても、掃除するのは間隔ごとに 1 つ（キャッシュが共有されていれば）
+        if store._cache.add(PURGE_LOCK_KEY, os.getpid(), int(interval)):
+            SessionStore.clear_expired()
+
+
+_writer = _Writer()
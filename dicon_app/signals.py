@@ -0,0 +1,112 @@
+import logging
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import home_cache, images, sale_pool, search, versions
+from .models import (
+    ConciergeItem, ConsultationItem, Event, HeroSlide, HomePickup, Partner, Product, Set, Shop, Street,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# トップページのセクションキャッシュを無効化
+# ==========================================
+
+def invalidate_home_sections(sender, **kwargs):
+    home_cache.invalidate_model(sender)
+
+for model in home_cache.section_models():
+    post_save.connect(invalidate_home_sections, sender=model, dispatch_uid=f"home_cache_save_{model.__name__}")
+    post_delete.connect(invalidate_home_sections, sender=model, dispatch_uid=f"home_cache_delete_{model.__name__}")
+
+
+@receiver(m2m_changed, sender=Set.products.through)
+def invalidate_home_sets(sender, action, **kwargs):
+    # セットの中身（商品）が変わったらセットのセクションを捨てる
+    if action in ("post_add", "post_remove", "post_clear"):
+        home_cache.invalidate_model(Set)
+
+
+# ==========================================
+# カタログページの条件付き GET 用のバージョンを進める（versions.py）
+# ==========================================
+
+VERSIONED_MODELS = (Street, Shop, Product, Set, Event, HeroSlide, HomePickup, Partner, ConciergeItem, ConsultationItem)
+
+def bump_version(sender, **kwargs):
+    # コミット前に進めると、その間に古い中身で描いたページが新しい ETag で返ってしまうのでコミット後に
+    transaction.on_commit(partial(versions.bump, sender))
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version, sender=model, dispatch_uid=f"versions_save_{model.__name__}")
+    post_delete.connect(bump_version, sender=model, dispatch_uid=f"versions_delete_{model.__name__}")
+
+
+@receiver(m2m_changed, sender=Set.products.through)
+def bump_set_version(sender, action, instance, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    # 中身の変更はセットの updated_at に出ないので進めておく（キャッシュを共有しないワーカーは DB から気づく）
+    if not reverse:
+        set_pks = [instance.pk]
+    elif action == "pre_clear":
+        set_pks = list(Set.objects.filter(products=instance).values_list("pk", flat=True))
+    else:
+        set_pks = list(pk_set)
+    Set.objects.filter(pk__in=set_pks).update(updated_at=timezone.now())
+    bump_version(Set)
+
+
+# ==========================================
+# 特売品プールを捨てる（次の抽選で作り直す）
+# ==========================================
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_sale_pool(sender, **kwargs):
+    sale_pool.invalidate()
+
+
+# ==========================================
+# 検索インデックスの変更ログ（各プロセスが次の検索で取り込む）
+# ==========================================
+
+def record_search_change(sender, instance, **kwargs):
+    # コミット前に積むと、ほかのワーカーがまだ見えない（ロールバックされるかもしれない）行で読み直して
+    # 番号だけ進めてしまう。pk は削除のあと None になるので今のうちに
+    transaction.on_commit(partial(search.record_change, sender, instance.pk))
+
+for kind in search.KINDS.values():
+    post_save.connect(record_search_change, sender=kind.model, dispatch_uid=f"search_save_{kind.name}")
+    post_delete.connect(record_search_change, sender=kind.model, dispatch_uid=f"search_delete_{kind.name}")
+
+
+# ==========================================
+# 画像のプレースホルダ（保存前）と縮小版（コミット後にワーカーへ）
+# ==========================================
+
+IMAGE_MODELS = (Shop, Product, Set, Event, HeroSlide, HomePickup, Partner, ConsultationItem)
+
+def schedule_image_variants(sender, instance, **kwargs):
+    # できあがったら、その画像を出しているトップページのセクションとページの ETag を作り直す（srcset が変わる）
+    def on_done():
+        home_cache.invalidate_model(sender)
+        versions.bump(sender)
+    transaction.on_commit(partial(images.schedule_instance, instance, on_done=on_done))
+
+def fill_image_placeholder(sender, instance, **kwargs):
+    # 代表色と小さなサムネイルは数ミリ秒で作れるので、保存と一緒にその場で（新しい画像のときだけ）
+    try:
+        images.fill_placeholder(instance)
+    except Exception:
+        logger.exception("プレースホルダを作れませんでした: %s", instance.image)
+
+for model in IMAGE_MODELS:
+    pre_save.connect(fill_image_placeholder, sender=model, dispatch_uid=f"image_placeholder_{model.__name__}")
+    post_save.connect(schedule_image_variants, sender=model, dispatch_uid=f"image_variants_{model.__name__}")
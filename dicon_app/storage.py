@@ -0,0 +1,57 @@
+"""
+内容アドレス方式のメディアストレージ
+
+同じ写真を店舗・商品・トップのピックアップに何度もアップロードしても、ファイルは 1 つだけ置きます。
+- アップロードを読みながら（チャンクごとに）SHA-256 を計算し、blobs/<先頭2文字>/<ハッシュ>.<拡張子> に保存する
+- 同じ名前のファイルがすでにあれば書かずにその名前を返す（＝重複しない）
+- 名前は中身で決まり、中身が変われば URL も変わるので、配信は「1 年キャッシュ・immutable」でよい
+  （dicon_app/media.py の serve と、本番の Web サーバー設定で Cache-Control を付ける）
+
+縮小版（variants/...）は元画像の名前から決まる名前なので、渡された名前のまま保存します。
+既存のファイルは manage.py dedupe_media でこの形に移せます。
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_DIR = "blobs"
+DIGEST_LENGTH = 32      # SHA-256 の先頭 32 桁（128 bit）で十分衝突しない
+PASSTHROUGH_DIRS = ("variants/",)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def digest(content) -> str:
+    """django の File を先頭からチャンクで読んでハッシュを出す（全体をメモリに載せない）"""
+    sha = hashlib.sha256()
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()[:DIGEST_LENGTH]
+
+
+def blob_name(hexdigest: str, original_name: str) -> str:
+    ext = os.path.splitext(original_name)[1].lower()
+    return f"{BLOB_DIR}/{hexdigest[:2]}/{hexdigest}{ext}"
+
+
+def is_content_addressed(name: str) -> bool:
+    """中身から決まった名前か（＝ immutable で配信してよいか）。縮小版も元画像の名前から決まるので同じ扱い"""
+    for prefix in ("",) + PASSTHROUGH_DIRS:
+        if name.startswith(prefix + BLOB_DIR + "/"):
+            return True
+    return False
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """MEDIA_ROOT に保存する FileSystemStorage。名前だけ中身のハッシュにする"""
+
+    def _save(self, name, content):
+        if name.startswith(PASSTHROUGH_DIRS):
+            return super()._save(name, content)
+        name = blob_name(digest(content), name)
+        if self.exists(name):
+            return name
+        # 同じ中身が同時にアップロードされると、後のほうは FileSystemStorage の規則で別名（_xxxx 付き）になる。
+        # 壊れはしない（重複が 1 つ残るだけ）ので、ロックは取らない
+        return super()._save(name, content)
@@ -0,0 +1,16 @@
+from django import template
+from django.templatetags.static import static
+
+from dicon_app import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset_url(name):
+    """
+    取り込み済み（manage.py vendor_assets）なら自前の static の URL、まだなら CDN の URL
+        <link rel="stylesheet" href="{% asset_url 'bootstrap.css' %}">
+    """
+    asset = assets.ASSETS[name]
+    return static(asset.path) if assets.is_vendored(asset.path) else asset.cdn
@@ -0,0 +1,51 @@
+from django import template
+
+from dicon_app import images
+
+register = template.Library()
+
+
+@register.inclusion_tag("partials/picture.html")
+def picture(image, alt="", sizes="100vw", css_class="", style="", loading="lazy"):
+    """
+    縮小版（WebP / JPEG）の srcset 付きで画像を出す。縮小版がまだ無ければ元画像の <img> だけ
+        {% picture product.image alt=product.name sizes="(max-width: 576px) 50vw, 200px" css_class="card-img-top" %}
+    sizes は「画面に表示される幅」。ブラウザはそれに合う一番小さい画像を選びます
+    モデルにプレースホルダ（image_color / image_lqip）があれば、読み込みが終わるまで img の背景に出します
+    """
+    name = getattr(image, "name", "")
+    if not name:
+        return {"src": "", "alt": alt, "css_class": css_class, "style": style, "loading": loading}
+    style = placeholder_style(image) + style
+    return {
+        "src": image.url,
+        "webp": images.srcset(name, "webp", image.storage),
+        "jpg": images.srcset(name, "jpg", image.storage),
+        "alt": alt,
+        "sizes": sizes,
+        "css_class": css_class,
+        "style": style,
+        "loading": loading,
+    }
+
+
+def placeholder_style(image) -> str:
+    """"background: #rrggbb url(data:...) center / cover no-repeat;"（プレースホルダが無ければ空文字）"""
+    field_name = getattr(getattr(image, "field", None), "name", "")
+    instance = getattr(image, "instance", None)
+    color = getattr(instance, f"{field_name}_color", "")
+    lqip = getattr(instance, f"{field_name}_lqip", "")
+    if not (color or lqip):
+        return ""
+    parts = [color] + ([f"url({lqip}) center / cover no-repeat"] if lqip else [])
+    return f"background: {' '.join(p for p in parts if p)}; "
+
+
+@register.simple_tag
+def variant_url(image, width, ext="jpg"):
+    """CSS の背景など srcset が使えない場所用：width 以下でいちばん大きい縮小版の URL（無ければ元画像）"""
+    name = getattr(image, "name", "")
+    if not name:
+        return ""
+    ready = [w for w in images.ready_widths(name, image.storage) if w <= int(width)]
+    return image.storage.url(images.variant_name(name, max(ready), ext)) if ready else image.url
@@ -0,0 +1,23 @@
+"""
+テストランナー（settings.TEST_RUNNER）
+
+テスト中はクエリ計測を入れ、予算超過（query_budgets.py）を QueryBudgetExceeded にしてテストを落とします。
+本番の既定（計測なし・超過は警告だけ）に関係なく、manage.py test でも python -m django test でも同じになります。
+セッションの期限切れの掃除（session_store.py のバックグラウンドのスレッド）はテスト中は止めます
+（テストのトランザクションと同じ SQLite のテーブルを別のスレッドから消しに行き、「table is locked」になるため）。
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budgets = override_settings(QUERY_INSTRUMENTATION=True, QUERY_BUDGET_RAISE=True,
+                                          SESSION_PURGE_INTERVAL=0)
+        self._budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._budgets.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,887 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from config import settings as project_settings
+
+from PIL import Image
+
+from orders.models import Order
+from payments import views as payments_views
+
+from . import (catalog_io, db_pool, db_router, fast_path, geo, home_cache, images, media, sale_pool, search,
+               session_store, storage, versions, views)
+from .models import Event, Product, Set, Shop, Street
+from .query_budgets import QUERY_BUDGETS
+from .pagination import cursor_values, encode_cursor, paginate
+
+
+# ==========================================
+# キーセットページングのカーソル
+# ==========================================
+
+@override_settings(QUERY_BUDGET_RAISE=False)  # クエリ予算は QueryBudgetTests で
+class CursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            Set.objects.create(name=f"セット{i}", price=100 + i)
+
+    def test_round_trip(self):
+        first = paginate(Set.objects.all(), ("-created_at", "-id"))
+        second = paginate(Set.objects.all(), ("-created_at", "-id"), first.next_cursor)
+        self.assertTrue(first.has_next)
+        self.assertEqual(len(first.items) + len(second.items), 30)
+        self.assertFalse({s.pk for s in first.items} & {s.pk for s in second.items})
+
+    def test_bad_values_mean_first_page(self):
+        ordering = ("-created_at", "-id")
+        for values in ([None, None], ["x", "y"], [1], ["2024-01-01", {"a": 1}], ["2024-01-01", 10 ** 30],
+                       [[1], 2], ["2024-01-01", "1", "extra"]):
+            with self.subTest(values=values):
+                self.assertIsNone(cursor_values(Set, ordering, values))
+
+    def test_converts_to_field_types(self):
+        values = cursor_values(Set, ("-created_at", "-id"), ["2024-01-01 00:00:00+00:00", "5"])
+        self.assertEqual(values[1], 5)
+        self.assertIsNotNone(values[0].tzinfo)
+
+    def test_tampered_cursor_is_not_a_server_error(self):
+        cursors = [encode_cursor([None, None]), encode_cursor(["x", "y"]), encode_cursor([1]),
+                   encode_cursor(["2024-01-01", 10 ** 30]), "!!!", "[" * 5000]
+        for cursor in cursors:
+            for url in (reverse("dicon_app:set_list"), reverse("dicon_app:list_more", args=["sets"]),
+                        reverse("dicon_app:list_more", args=["products"])):
+                with self.subTest(url=url, cursor=cursor[:20]):
+                    response = self.client.get(url, {"after": cursor})
+                    self.assertEqual(response.status_code, 200)
+
+
+# ==========================================
+# セッション：窓の中の変更はキャッシュから消えても DB まで届く
+# ==========================================
+
+@override_settings(SESSION_WRITE_COALESCE_SECONDS=60)
+class CoalescedSessionTests(TestCase):
+
+    def setUp(self):
+        self.store = session_store.SessionStore()
+        self.store["cart"] = {}
+        self.store.save(must_create=True)
+        self.addCleanup(session_store._writer.discard, self.store.session_key)
+
+    def _db_data(self):
+        return Session.objects.get(session_key=self.store.session_key).get_decoded()
+
+    def _change_in_window(self, cart):
+        store = session_store.SessionStore(self.store.session_key)
+        store["cart"] = cart
+        store.save()
+        return store
+
+    def test_change_in_window_is_not_written_until_flush(self):
+        self._change_in_window({"1": 2})
+        self.assertEqual(self._db_data()["cart"], {})
+        self.assertEqual(session_store._writer.flush(everything=True), 1)
+        self.assertEqual(self._db_data()["cart"], {"1": 2})
+
+    def test_evicted_cache_entry_still_reaches_db(self):
+        self._change_in_window({"1": 2})
+        caches[settings.SESSION_CACHE_ALIAS].clear()  # LocMemCache の追い出し・再起動の代わり
+        # 追い出されたあとに読んでも、DB の古い行ではなく未反映の中身
+        self.assertEqual(session_store.SessionStore(self.store.session_key)["cart"], {"1": 2})
+        self.assertEqual(session_store._writer.flush(everything=True), 1)
+        self.assertEqual(self._db_data()["cart"], {"1": 2})
+
+    def test_delete_drops_pending(self):
+        self._change_in_window({"1": 2}).delete()
+        self.assertEqual(session_store._writer.flush(everything=True), 0)
+        self.assertFalse(Session.objects.filter(session_key=self.store.session_key).exists())
+
+    def test_unchanged_session_is_not_written(self):
+        store = session_store.SessionStore(self.store.session_key)
+        store["cart"] = {}
+        with self.assertNumQueries(0):
+            store.save()
+        self.assertIsNone(session_store._writer.pending(self.store.session_key))
+
+    def test_changes_in_window_coalesce_into_one_write(self):
+        with self.assertNumQueries(0):
+            for count in range(1, 4):
+                self._change_in_window({"1": count})
+        self.assertEqual(session_store._writer.flush(), 0)  # まだ窓の中
+        later = time.time() + 61
+        with mock.patch.object(session_store.time, "time", return_value=later), \
+                CaptureQueriesContext(connection) as queries:
+            self.assertEqual(session_store._writer.flush(), 1)  # 窓が閉じたら最新の中身を 1 回
+        self.assertEqual(sum(query["sql"].startswith("UPDATE") for query in queries), 1)
+        self.assertEqual(self._db_data()["cart"], {"1": 3})
+        self.assertEqual(session_store._writer.flush(everything=True), 0)
+
+    def test_change_after_window_is_written_through(self):
+        later = time.time() + 61
+        with mock.patch.object(session_store.time, "time", return_value=later):
+            self._change_in_window({"1": 2})
+        self.assertEqual(self._db_data()["cart"], {"1": 2})
+        self.assertIsNone(session_store._writer.pending(self.store.session_key))
+
+    def test_login_is_written_immediately(self):
+        store = session_store.SessionStore(self.store.session_key)
+        store["_auth_user_id"] = "1"
+        store.save()
+        self.assertEqual(self._db_data()["_auth_user_id"], "1")
+        self.assertIsNone(session_store._writer.pending(self.store.session_key))
+
+    @override_settings(SESSION_WRITE_COALESCE_SECONDS=0)
+    def test_without_window_every_change_is_written(self):
+        self._change_in_window({"1": 2})
+        self.assertEqual(self._db_data()["cart"], {"1": 2})
+        self.assertIsNone(session_store._writer.pending(self.store.session_key))
+
+    @skipIf("SESSION_WRITE_COALESCE_SECONDS" in os.environ, "窓を環境変数で指定している")
+    def test_default_window_is_zero_without_shared_cache(self):
+        # LocMemCache はワーカーごとなので、既定では窓を使わない（毎回 DB に書く）
+        self.assertEqual(project_settings.CACHES["default"]["BACKEND"],
+                         "django.core.cache.backends.locmem.LocMemCache")
+        self.assertEqual(project_settings.SESSION_WRITE_COALESCE_SECONDS, 0)
+
+
+# ==========================================
+# カタログの取り込み：ファイルの作成日時をそのまま入れる
+# ==========================================
+
+class CatalogImportTests(TestCase):
+
+    def test_created_at_from_file_is_kept(self):
+        importer = catalog_io.CatalogImporter()
+        importer.add({"model": "dicon_app.set", "pk": 501,
+                      "fields": {"name": "古いセット", "slug": "old", "price": 500,
+                                 "created_at": "2020-04-01T09:00:00+09:00"}})
+        importer.add({"model": "dicon_app.set", "pk": 502, "fields": {"name": "日時なし", "slug": "new", "price": 500}})
+        importer.finish()
+        self.assertEqual(Set.objects.get(pk=501).created_at.isoformat(), "2020-04-01T00:00:00+00:00")
+        self.assertGreater(Set.objects.get(pk=502).created_at.year, 2020)
+        # 取り込みのあとも、ふだんの保存では作成日時が入る
+        self.assertIsNotNone(Set.objects.create(name="あとから", slug="later", price=1).created_at)
+
+
+# ==========================================
+# ページの ETag の元：キャッシュを共有しないワーカーでも、ほかのワーカーの保存に TTL のうちに気づく
+# ==========================================
+
+class VersionTests(TestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        self.set = Set.objects.create(name="鍋セット", slug="nabe", price=1000)
+
+    def test_ttl_without_shared_cache(self):
+        self.assertEqual(project_settings.CATALOG_VERSION_TTL, 5)
+
+    @override_settings(CATALOG_VERSION_TTL=0.2)
+    def test_other_worker_change_is_seen_after_ttl(self):
+        before = versions.get([Set])
+        # 別のワーカー（このプロセスの bump() は呼ばれない）の保存
+        Set.objects.filter(pk=self.set.pk).update(updated_at=timezone.now() + timedelta(seconds=10))
+        self.assertEqual(versions.get([Set]), before)
+        time.sleep(0.3)
+        self.assertNotEqual(versions.get([Set]), before)
+
+    def test_set_contents_change_moves_updated_at(self):
+        product = Product.objects.create(name="白菜", price=200)
+        before = Set.objects.get(pk=self.set.pk).updated_at
+        time.sleep(0.01)
+        self.set.products.add(product)
+        after_add = Set.objects.get(pk=self.set.pk).updated_at
+        self.assertGreater(after_add, before)
+        time.sleep(0.01)
+        product.sets.clear()
+        self.assertGreater(Set.objects.get(pk=self.set.pk).updated_at, after_add)
+
+
+# ==========================================
+# 近くのお店：おかしな値は 400、半径を広げても SQL は NEAREST_MAX_QUERIES 回まで
+# ==========================================
+
+@override_settings(QUERY_BUDGET_RAISE=False)
+class ShopsNearbyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        street = Street.objects.create(name="本町通り")
+        # 1 軒だけ 30km 先（500m → 2 倍ずつ広げると 7 回かかる距離）
+        Shop.objects.create(street=street, name="遠くの八百屋", latitude=43.19 + 0.27, longitude=140.79)
+        Shop.objects.create(street=street, name="近くの魚屋", latitude=43.1905, longitude=140.7901)
+
+    def test_bad_values_are_400(self):
+        url = reverse("dicon_app:shops_nearby")
+        for params in ({"lat": "nan", "lon": "140"}, {"lat": "43", "lon": "inf"},
+                       {"lat": "43", "lon": "140", "radius": "nan"}, {"lat": "43", "lon": "140", "radius": "inf"},
+                       {"lat": "43", "lon": "140", "radius": "0"}, {"lat": "43", "lon": "140", "radius": "-5"},
+                       {"lat": "43", "lon": "140", "radius": "abc"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_nearest_query_bound(self):
+        with self.assertNumQueries(geo.NEAREST_MAX_QUERIES):
+            shops = geo.nearest(43.19, 140.79, k=2)
+        self.assertEqual([shop.name for shop in shops], ["近くの魚屋", "遠くの八百屋"])
+
+
+# ==========================================
+# クエリ予算：予算のある URL を全部、キャッシュが空の状態で叩く（超えたら QueryBudgetExceeded で落ちる）
+# ==========================================
+
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        street = Street.objects.create(name="本町通り")
+        cls.shop = Shop.objects.create(street=street, name="八百屋", latitude=43.1906, longitude=140.788)
+        cls.product = Product.objects.create(name="トマト", price=300, shop=cls.shop, is_sale=True)
+        cls.set = Set.objects.create(name="鍋セット", slug="nabe", price=1000)
+        cls.set.products.add(cls.product)
+        cls.event = Event.objects.create(title="朝市", slug="asaichi")
+        cls.user = get_user_model().objects.create_user("budget", password="pw-12345-xx")
+        cls.order = Order.objects.create(product=cls.product, amount=300, user=cls.user)
+
+    def _urls(self):
+        """{URL 名: [(パス, クエリ)]}。予算を足したらここにも足す"""
+        return {
+            "dicon_app:home": [(reverse("dicon_app:home"), {})],
+            "dicon_app:shop_list": [(reverse("dicon_app:shop_list"), {})],
+            "dicon_app:shop_detail": [(reverse("dicon_app:shop_detail", args=[self.shop.pk]), {})],
+            "dicon_app:shops_nearby": [(reverse("dicon_app:shops_nearby"), {"lat": 43.19, "lon": 140.79}),
+                                       (reverse("dicon_app:shops_nearby"), {"lat": 35.68, "lon": 139.77}),
+                                       (reverse("dicon_app:shops_nearby"),
+                                        {"lat": 43.19, "lon": 140.79, "radius": 2000})],
+            "dicon_app:product_list": [(reverse("dicon_app:product_list"), {})],
+            "dicon_app:product_detail": [(reverse("dicon_app:product_detail", args=[self.product.pk]), {})],
+            "dicon_app:set_list": [(reverse("dicon_app:set_list"), {})],
+            "dicon_app:set_detail": [(reverse("dicon_app:set_detail", args=[self.set.pk]), {})],
+            "dicon_app:list_more": [(reverse("dicon_app:list_more", args=[name]), {})
+                                    for name in ("products", "shops", "sale", "events", "sets")],
+            "dicon_app:search": [(reverse("dicon_app:search"), {"q": "トマト"}),
+                                 (reverse("dicon_app:search"), {"q": "鍋", "kind": "set"})],
+            "dicon_app:sale_list": [(reverse("dicon_app:sale_list"), {})],
+            "dicon_app:event_list": [(reverse("dicon_app:event_list"), {})],
+            "dicon_app:event_detail": [(reverse("dicon_app:event_detail", args=[self.event.slug]), {})],
+            "dicon_app:consult_home": [(reverse("dicon_app:consult_home"), {})],
+            "dicon_app:consult_menu": [(reverse("dicon_app:consult_menu"), {})],
+            "dicon_app:concierge_list": [(reverse("dicon_app:concierge_list"), {})],
+            "dicon_app:partner_list": [(reverse("dicon_app:partner_list"), {})],
+            "dicon_app:cart_detail": [(reverse("dicon_app:cart_detail"), {})],
+            "dicon_app:add_to_cart": [(reverse("dicon_app:add_to_cart", args=[self.product.pk]), {})],
+            "dicon_app:remove_from_cart": [(reverse("dicon_app:remove_from_cart", args=[self.product.pk]), {})],
+            "orders:order_list": [(reverse("orders:order_list"), {})],
+            "orders:order_list_more": [(reverse("orders:order_list_more"), {})],
+            "orders:order_list_json": [(reverse("orders:order_list_json"), {})],
+            "orders:order_detail": [(reverse("orders:order_detail", args=[self.order.pk]), {})],
+        }
+
+    def test_every_budget_has_a_url(self):
+        self.assertEqual(set(self._urls()), set(QUERY_BUDGETS))
+
+    def test_budgets_hold_with_cold_cache(self):
+        anonymous, member = self.client_class(), self.client_class()
+        member.force_login(self.user)
+        for name, urls in self._urls().items():
+            for path, params in urls:
+                for who, client in (("anonymous", anonymous), ("member", member)):
+                    if name.startswith("orders:") and who == "anonymous":
+                        continue  # ログインへのリダイレクトだけ
+                    with self.subTest(name=name, path=path, params=params, who=who):
+                        caches["default"].clear()  # ページのキャッシュ・バージョン・セッションも空
+                        response = client.get(path, params)
+                        self.assertLess(response.status_code, 400)
+
+
+# ==========================================
+# index_advisor：EXPLAIN を読めない DB では URL をたどる前に止める
+# ==========================================
+
+class IndexAdvisorTests(TestCase):
+
+    def test_unsupported_vendor_is_command_error(self):
+        with mock.patch.object(connection, "vendor", "oracle"):
+            with self.assertRaisesMessage(CommandError, "EXPLAIN is not supported for oracle"):
+                call_command("index_advisor")
+
+
+# ==========================================
+# 検索インデックス：変更ログはコミット後に積む。ほかのプロセスの変更は DB と見比べて気づく
+# ==========================================
+
+class SearchChangeLogTests(TestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        search.reset()
+        self.addCleanup(search.reset)
+
+    def test_change_is_recorded_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            product = Product.objects.create(name="トマト", price=300)
+            self.assertEqual(caches["default"].get(search.VERSION_KEY, 0), 0)
+        for callback in callbacks:
+            callback()
+        version = caches["default"].get(search.VERSION_KEY)
+        self.assertEqual(caches["default"].get(search.CHANGE_KEY.format(version)), ("product", product.pk))
+
+    def test_delete_records_the_old_pk(self):
+        product = Product.objects.create(name="トマト", price=300)
+        pk = product.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        version = caches["default"].get(search.VERSION_KEY)
+        self.assertEqual(caches["default"].get(search.CHANGE_KEY.format(version)), ("product", pk))
+
+    @override_settings(SEARCH_RECHECK_SECONDS=0)
+    def test_change_in_another_process_is_seen(self):
+        product = Product.objects.create(name="トマト", price=300)
+        self.assertEqual([hit.pk for hit in search.search("トマト")], [product.pk])
+        # 別のプロセスの保存：その変更ログはこのプロセスのキャッシュには届かない
+        Product.objects.filter(pk=product.pk).update(name="きゅうり", updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(search.search("トマト"), [])
+        self.assertEqual([hit.pk for hit in search.search("きゅうり")], [product.pk])
+
+    @override_settings(SEARCH_RECHECK_SECONDS=None)
+    def test_shared_cache_does_not_recheck(self):
+        product = Product.objects.create(name="トマト", price=300)
+        search.search("トマト")
+        with self.assertNumQueries(0):
+            self.assertEqual([hit.pk for hit in search.search("トマト")], [product.pk])
+
+
+# ==========================================
+# 読み取りレプリカの振り分け：カタログのページの dicon_app の読み取りだけ。書いた人は Cookie でプライマリに固定
+# ==========================================
+
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(db_router, "replicas", return_value=["replica1"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = db_router.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _request(self, view_func, action=None, cookies=None):
+        """ミドルウェアを通して view_func を「呼び」、その中での読み取り先と応答を返す"""
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, view_func, (), {})
+            if action:
+                action()
+            seen["product"] = self.router.db_for_read(Product)
+            seen["order"] = self.router.db_for_read(Order)
+            with db_router.primary_reads():
+                seen["filling"] = self.router.db_for_read(Product)
+            return HttpResponse()
+
+        middleware = db_router.ReplicaPinMiddleware(get_response)
+        request = self.factory.get("/")
+        request.COOKIES.update(cookies or {})
+        return seen, middleware(request)
+
+    def test_catalog_reads_go_to_replica(self):
+        seen, response = self._request(views.product_list)
+        self.assertEqual(seen, {"product": "replica1", "order": "default", "filling": "default"})
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_non_catalog_views_read_primary(self):
+        for view_func in (views.add_to_cart, views.cart_detail, payments_views.checkout):
+            with self.subTest(view=view_func.__qualname__):
+                seen, _ = self._request(view_func)
+                self.assertEqual(seen["product"], "default")
+
+    def test_write_reads_primary_and_sets_pin_cookie(self):
+        seen, response = self._request(views.product_list, action=lambda: self.router.db_for_write(Product))
+        self.assertEqual(seen["product"], "default")
+        cookie = response.cookies[db_router.PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], db_router.pin_seconds())
+        self.assertGreater(float(cookie.value), time.time())
+
+    def test_pin_cookie(self):
+        cases = {str(time.time() + 60): "default", str(time.time() - 60): "replica1", "garbage": "replica1"}
+        for value, alias in cases.items():
+            with self.subTest(cookie=value):
+                seen, _ = self._request(views.product_list, cookies={db_router.PIN_COOKIE: value})
+                self.assertEqual(seen["product"], alias)
+
+    def test_without_replicas_or_outside_requests_read_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), "default")  # シェル・コマンド
+        db_router.replicas.return_value = []
+        seen, _ = self._request(views.product_list)
+        self.assertEqual(seen["product"], "default")
+        self.assertTrue(self.router.allow_migrate("default", "dicon_app"))
+        self.assertFalse(self.router.allow_migrate("replica1", "dicon_app"))
+
+
+# ==========================================
+# 読み取りレプリカ：キャッシュに入れる中身はプライマリから作る
+# ==========================================
+
+class ReplicaFillTests(TestCase):
+
+    def setUp(self):
+        caches["default"].clear()
+        search.reset()
+        self.addCleanup(search.reset)
+        street = Street.objects.create(name="本町通り")
+        shop = Shop.objects.create(street=street, name="八百屋")
+        Product.objects.create(name="トマト", price=300, shop=shop, is_sale=True)
+        # カタログのページの中で、レプリカ（遅れている。ここでは存在しない別名）が選ばれている状態
+        token = db_router._current.set(db_router._Request(replica="replica-lagging", catalog=True))
+        self.addCleanup(db_router._current.reset, token)
+
+    def test_plain_catalog_reads_go_to_replica(self):
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(Product), "replica-lagging")
+
+    def test_cache_fills_read_primary(self):
+        # レプリカに行けば ConnectionDoesNotExist になる
+        html, _ = home_cache.get_sections()
+        self.assertIn("トマト", html["sale"])
+        self.assertEqual(sale_pool.get_pool()["size"], 1)
+        self.assertIn("dicon_app.product", {key.split(":", 1)[1] for key in versions.get([Product])})
+        self.assertEqual(len(search.build_index()), 2)
+
+
+# ==========================================
+# セールプール：抽選で読むのは見出しと、選んだ位置の塊だけ
+# ==========================================
+
+@override_settings(QUERY_BUDGET_RAISE=False)
+class SalePoolTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        street = Street.objects.create(name="本町通り")
+        cls.shops = [Shop.objects.create(street=street, name=f"店{i}") for i in range(4)]
+        Product.objects.bulk_create(
+            Product(name=f"特売{i}", price=100, shop=cls.shops[i % 4], is_sale=True) for i in range(30)
+        )
+
+    def setUp(self):
+        caches["default"].clear()
+        chunk = mock.patch.object(sale_pool, "CHUNK", 4)
+        chunk.start()
+        self.addCleanup(chunk.stop)
+
+    def test_draw_reads_only_sampled_chunks(self):
+        sale_pool.get_pool()
+        with mock.patch.object(sale_pool.cache, "get_many", wraps=sale_pool.cache.get_many) as get_many:
+            ids = sale_pool.draw_ids(2, rotate=False)
+        self.assertEqual(len(set(ids)), 2)
+        (keys,), _ = get_many.call_args
+        self.assertLessEqual(len(keys), 2)  # 30 件 / 4 件ずつ = 8 塊あっても読むのは 2 つまで
+
+    def test_rotation_covers_every_shop(self):
+        drawn = sale_pool.draw(4)
+        self.assertEqual({product.shop_id for product in drawn}, {shop.pk for shop in self.shops})
+
+    def test_invalidate_and_evicted_chunks_rebuild(self):
+        size = sale_pool.get_pool()["size"]
+        Product.objects.create(name="特売追加", price=100, shop=self.shops[0], is_sale=True)  # シグナルで捨てる
+        self.assertEqual(sale_pool.get_pool()["size"], size + 1)
+        pool = sale_pool.get_pool()
+        caches["default"].delete(sale_pool.IDS_KEY.format(pool["gen"], 0))  # 中身だけ追い出された
+        caches["default"].delete(sale_pool.IDS_KEY.format(pool["gen"], 1))
+        with mock.patch.object(sale_pool.random, "sample", side_effect=lambda seq, n: list(seq)[:n]):
+            self.assertEqual(len(sale_pool.draw_ids(3, rotate=False)), 3)
+        self.assertNotEqual(sale_pool.get_pool()["gen"], pool["gen"])
+
+
+# ==========================================
+# 接続プール：貸し出し・時間切れ・古い接続やこわれた接続の入れ替え
+# ==========================================
+
+class _FakeConnection:
+
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch.object(db_pool.time, "monotonic", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.opened = []
+        self.pings = 0
+        self.reset_ok = True
+
+    def _connect(self):
+        raw = _FakeConnection(len(self.opened) + 1)
+        self.opened.append(raw)
+        return raw
+
+    def _ping(self, raw):
+        self.pings += 1
+        return raw.alive
+
+    def _pool(self, **options):
+        return db_pool.ConnectionPool(self._connect, lambda raw: raw.alive, lambda raw: self.reset_ok, self._ping,
+                                      **{"min_size": 1, "max_size": 2, "timeout": 0.05, **options})
+
+    def test_released_connection_is_reused(self):
+        pool = self._pool()
+        self.assertEqual(len(self.opened), 1)  # MIN_SIZE は先に作っておく
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertEqual({first.number, second.number}, {1, 2})
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["in_use"], stats["saturation"]), (2, 2, 1.0))
+
+    def test_full_pool_times_out(self):
+        pool = self._pool(max_size=1)
+        pool.acquire()
+        with self.assertRaises(db_pool.PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        self.assertEqual(pool.stats()["waiting"], 0)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self._pool(max_size=1, timeout=5)
+        held = pool.acquire()
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+        waiter.start()
+        while not pool.stats()["waiting"]:
+            time.sleep(0.001)
+        pool.release(held)
+        waiter.join(5)
+        self.assertEqual(got, [held])
+        self.assertEqual(pool.stats()["waits"], 1)
+
+    def test_expired_connection_is_closed_on_release(self):
+        pool = self._pool(max_lifetime=60)
+        old = pool.acquire()
+        self.now += 61
+        pool.release(old)
+        self.assertTrue(old.closed)
+        self.assertIsNot(pool.acquire(), old)
+        self.assertEqual(pool.stats()["expired"], 1)
+
+    def test_broken_connections_are_replaced(self):
+        pool = self._pool()
+        raw = pool.acquire()
+        pool.release(raw)
+        raw.alive = False  # 空きのあいだに切れた
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, raw)
+        self.assertTrue(raw.closed)
+        self.reset_ok = False  # トランザクションが残ったまま返ってきた
+        pool.release(fresh)
+        self.assertTrue(fresh.closed)
+        self.assertEqual(pool.stats()["unhealthy"], 2)
+        self.assertEqual(pool.stats()["size"], 0)
+
+    def test_idle_connection_is_pinged_and_trimmed(self):
+        pool = self._pool(min_size=1, max_size=3, check_after=5, max_idle=300)
+        a, b = pool.acquire(), pool.acquire()
+        pool.release(a)
+        self.assertEqual(self.pings, 0)
+        self.now += 10
+        self.assertIs(pool.acquire(), a)  # CHECK_AFTER を過ぎたので SELECT 1 で確かめてから
+        self.assertEqual(self.pings, 1)
+        pool.release(a)
+        self.now += 301
+        pool.release(b)  # a は MAX_IDLE を過ぎたので MIN_SIZE まで減らす
+        self.assertTrue(a.closed)
+        self.assertEqual((pool.stats()["size"], pool.stats()["idle"]), (1, 1))
+
+
+# ==========================================
+# セッションなしの道：Cookie の無い GET / HEAD でカタログのビューのときだけ
+# ==========================================
+
+@override_settings(SESSIONLESS_CATALOG=True, QUERY_BUDGET_RAISE=False)
+class SessionlessCatalogTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _decide(self, method, path, cookies=None):
+        request = self.factory.generic(method, path)
+        request.COOKIES.update(cookies or {})
+        return fast_path.is_sessionless(request)
+
+    def test_cookieless_catalog_get_and_head(self):
+        for method in ("GET", "HEAD"):
+            for name in ("dicon_app:home", "dicon_app:product_list", "dicon_app:search"):
+                with self.subTest(method=method, name=name):
+                    self.assertTrue(self._decide(method, reverse(name)))
+
+    def test_session_cookie_uses_session(self):
+        cookies = {settings.SESSION_COOKIE_NAME: "abc"}
+        self.assertFalse(self._decide("GET", reverse("dicon_app:home"), cookies))
+        # ほかの Cookie（レプリカの固定など）だけならセッションなし
+        self.assertTrue(self._decide("GET", reverse("dicon_app:home"), {db_router.PIN_COOKIE: "1"}))
+
+    def test_non_get_uses_session(self):
+        for method in ("POST", "PUT", "DELETE", "OPTIONS"):
+            with self.subTest(method=method):
+                self.assertFalse(self._decide(method, reverse("dicon_app:home")))
+
+    def test_non_catalog_uses_session(self):
+        paths = [reverse("dicon_app:cart_detail"), reverse("dicon_app:profile"), reverse("orders:order_list"),
+                 "/admin/", "/no-such-page/"]
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertFalse(self._decide("GET", path))
+
+    @override_settings(SESSIONLESS_CATALOG=False)
+    def test_setting_off(self):
+        self.assertFalse(self._decide("GET", reverse("dicon_app:home")))
+
+    def test_decision_is_remembered(self):
+        request = self.factory.get(reverse("dicon_app:home"))
+        self.assertTrue(fast_path.is_sessionless(request))
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = "abc"  # 途中で変わっても同じリクエストの中では同じ答え
+        self.assertTrue(fast_path.is_sessionless(request))
+
+    def test_cookieless_page_has_no_session_or_user_row(self):
+        response = self.client.get(reverse("dicon_app:product_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(hasattr(response.wsgi_request, "session"))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+        self.assertIn("Cookie", response["Vary"])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_cart_still_creates_session(self):
+        product = Product.objects.create(name="トマト", price=300)
+        self.client.post(reverse("dicon_app:add_to_cart", args=[product.pk]))
+        response = self.client.get(reverse("dicon_app:product_list"))
+        self.assertTrue(hasattr(response.wsgi_request, "session"))
+
+
+# ==========================================
+# メディアの保存：名前は中身の SHA-256。同じ中身は 1 つだけ
+# ==========================================
+
+class ContentAddressedStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.storage = storage.ContentAddressedStorage(location=media.name)
+
+    def test_name_is_content_hash(self):
+        name = self.storage.save("shops/photo.JPG", ContentFile(b"tomato"))
+        digest = hashlib.sha256(b"tomato").hexdigest()[:storage.DIGEST_LENGTH]
+        self.assertEqual(name, f"blobs/{digest[:2]}/{digest}.jpg")
+        self.assertTrue(storage.is_content_addressed(name))
+        with self.storage.open(name) as saved:
+            self.assertEqual(saved.read(), b"tomato")
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save("shops/a.jpg", ContentFile(b"tomato"))
+        with mock.patch.object(FileSystemStorage, "_save") as write:
+            second = self.storage.save("products/b.jpg", ContentFile(b"tomato"))
+        write.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(first))), [os.path.basename(first)])
+        self.assertNotEqual(self.storage.save("shops/a.jpg", ContentFile(b"potato")), first)
+
+    def test_variants_keep_their_name(self):
+        name = self.storage.save("variants/blobs/ab/abcd.160.webp", ContentFile(b"small"))
+        self.assertEqual(name, "variants/blobs/ab/abcd.160.webp")
+        self.assertTrue(storage.is_content_addressed(name))
+        self.assertFalse(storage.is_content_addressed("shops/photo.jpg"))
+        self.assertFalse(storage.is_content_addressed("variants/shops/photo.160.webp"))
+
+
+# ==========================================
+# メディアの配信：Range（1 区間）に 206、満たせない区間は 416
+# ==========================================
+
+class MediaRangeTests(SimpleTestCase):
+
+    BODY = b"0123456789"
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        with open(os.path.join(self.root, "clip.mp4"), "wb") as f:
+            f.write(self.BODY)
+        self.factory = RequestFactory()
+
+    def _get(self, path="clip.mp4", **headers):
+        response = media.serve(self.factory.get("/media/" + path, **headers), path, document_root=self.root)
+        self.addCleanup(response.close)
+        return response
+
+    def _body(self, response):
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_without_range_is_whole_file(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(self._body(response), self.BODY)
+
+    def test_ranges(self):
+        cases = {
+            "bytes=2-5": (2, 5),
+            "bytes=4-": (4, 9),
+            "bytes=-3": (7, 9),
+            "bytes=8-100": (8, 9),  # 末尾を越えたら末尾まで
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(range=header):
+                response = self._get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/{len(self.BODY)}")
+                self.assertEqual(int(response["Content-Length"]), end - start + 1)
+                self.assertEqual(self._body(response), self.BODY[start:end + 1])
+
+    def test_unsatisfiable_range_is_416(self):
+        for header in ("bytes=10-", "bytes=6-3", "bytes=-0"):
+            with self.subTest(range=header):
+                response = self._get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response["Content-Range"], f"bytes */{len(self.BODY)}")
+
+    def test_unreadable_or_multiple_ranges_are_whole_file(self):
+        for header in ("bytes=0-1,4-5", "items=0-1", "bytes=-"):
+            with self.subTest(range=header):
+                response = self._get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self._body(response), self.BODY)
+
+    def test_if_range(self):
+        etag = self._get()["ETag"]
+        self.assertEqual(self._get(HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE=etag).status_code, 206)
+        self.assertEqual(self._get(HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"changed"').status_code, 200)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_range_body_is_seeked_file(self):
+        # sendfile する WSGI サーバーは「今の位置から Content-Length バイト」を送る
+        response = self._get(HTTP_RANGE="bytes=3-6")
+        body = response.file_to_stream
+        self.assertIsInstance(body, media.FileRange)
+        self.assertEqual(body.tell(), 3)
+        self.assertEqual(body.fileno(), body.file.fileno())
+
+    def test_outside_root_is_404(self):
+        with self.assertRaises(Http404):
+            self._get("../clip.mp4")
+
+
+# ==========================================
+# 画像の縮小版：キャッシュを知らないワーカーでも、あるファイルは書き直さない
+# ==========================================
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overridden = override_settings(MEDIA_ROOT=media.name, IMAGE_VARIANT_WIDTHS=(160, 320), IMAGE_VARIANTS_SYNC=True)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        buf = io.BytesIO()
+        Image.new("RGB", (400, 300), "red").save(buf, "JPEG")
+        self.name = default_storage.save("products/tomato.jpg", ContentFile(buf.getvalue()))
+        caches["default"].clear()
+
+    def test_existing_variants_are_not_rewritten(self):
+        self.assertEqual(images.generate(self.name)["count"], 4)
+        caches["default"].clear()  # 別のワーカー（「できている」を覚えていない）
+        with mock.patch.object(default_storage, "delete") as delete, \
+                mock.patch.object(default_storage, "save") as save:
+            images.schedule(self.name)
+        delete.assert_not_called()
+        save.assert_not_called()
+        self.assertEqual(images.ready_widths(self.name), [160, 320])
+
+    def test_force_rewrites(self):
+        images.generate(self.name)
+        self.assertEqual(images.generate(self.name, force=True)["count"], 4)
+
+
+# ==========================================
+# data.json（build.sh が読み込むサンプルデータ）がいまのモデルで loaddata できること
+# ==========================================
+
+class FixtureTests(TestCase):
+
+    def test_data_json_loads(self):
+        call_command("loaddata", str(settings.BASE_DIR / "data.json"), verbosity=0)
+        self.assertTrue(Street.objects.filter(updated_at__isnull=False).exists())
+        self.assertTrue(Set.objects.get(pk=2).products.exists())
+
+
+# ==========================================
+# お店一覧の地図：ピンは MAP_PIN_LIMIT 件まで
+# ==========================================
+
+@override_settings(QUERY_BUDGET_RAISE=False)
+class ShopMapTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        street = Street.objects.create(name="本町通り")
+        for i in range(4):
+            Shop.objects.create(street=street, name=f"店{i}", latitude=43.19 + i / 1000, longitude=140.79)
+
+    def test_pins_are_capped(self):
+        with mock.patch("dicon_app.views.MAP_PIN_LIMIT", 3):
+            response = self.client.get(reverse("dicon_app:shop_list"))
+        self.assertEqual(len(response.context["map_shops"]), 3)
+        self.assertTrue(response.context["map_truncated"])
+        self.assertContains(response, "地図には 3 件まで")
+
+    def test_under_limit_is_not_truncated(self):
+        response = self.client.get(reverse("dicon_app:shop_list"))
+        self.assertEqual(len(response.context["map_shops"]), 4)
+        self.assertFalse(response.context["map_truncated"])
+
+
+# ==========================================
+# テストランナー：計測と予算超過の例外はテスト中だけ
+# ==========================================
+
+class TestRunnerSettingsTests(TestCase):
+
+    def test_budgets_raise_under_test_runner(self):
+        self.assertTrue(settings.QUERY_INSTRUMENTATION)
+        self.assertTrue(settings.QUERY_BUDGET_RAISE)
+
+    @skipIf({"QUERY_INSTRUMENTATION", "QUERY_BUDGET_RAISE"} & set(os.environ), "環境変数で指定している")
+    def test_production_defaults_are_off(self):
+        self.assertFalse(project_settings.QUERY_INSTRUMENTATION)
+        self.assertFalse(project_settings.QUERY_BUDGET_RAISE)
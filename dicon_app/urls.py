@@ -9,6 +9,7 @@ urlpatterns = [
 
     # 🏪 店舗 (shops)
     path("shops/", views.shop_list, name="shop_list"),
+    path("shops/nearby/", views.shops_nearby, name="shops_nearby"),  # 近くのお店（JSON）
     path("shops/<int:shop_pk>/", views.shop_detail, name="shop_detail"),
     path("vacant-store/", views.vacant_store, name="vacant_store"),
 
@@ -28,6 +29,8 @@ urlpatterns = [
     path("sale/", views.sale_list, name="sale_list"),
     path("events/", views.event_list, name="event_list"),
     path("events/<slug:slug>/", views.event_detail, name="event_detail"),
+    path("more/<slug:listing>/", views.list_more, name="list_more"),  # 一覧の無限スクロール
+    path("search/", views.search, name="search"),  # お店・商品・セット・イベントの横断検索
 
     # 🤝 相談・コンシェルジュ
     path("consult/", views.consult_home, name="consult_home"),
@@ -50,4 +53,7 @@ urlpatterns = [
 
     # 📍 その他
     path("locker-guide/", views.locker_guide, name="locker_guide"),
+
+    # 🔧 運用ツール（スタッフ専用）
+    path("_debug/queries/", views.query_log, name="query_log"),
 ]
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+モデルごとの「最後に変わった時刻」と、一覧・詳細ページの条件付き GET（304）
+
+カタログのページ（お店・商品・セット・イベント・助っ人の一覧と詳細）は、中身のモデルが変わらない限り同じ HTML です。
+- モデルが保存・削除されるたびに（signals.py から）そのモデルのバージョン（時刻）をキャッシュに書く
+- ビューは @conditional_page(Shop, Product) で包む。ETag / Last-Modified はバージョンから作るので、
+  クライアントの If-None-Match が一致すればビュー本体（メインのクエリ・描画）を通らずに 304 を返す
+- キャッシュにバージョンが無ければ（起動直後・追い出し）DB の Max(updated_at) と件数から作り直す（まとめて 1 クエリ）
+  （QuerySet.update() / bulk_update はシグナルを出さないので、使う側で bump() を呼ぶ）
+- キャッシュがワーカー間で共有されていない（LocMemCache）と bump() は自分のワーカーにしか届かないので、
+  CATALOG_VERSION_TTL 秒で捨てて DB から作り直す（別のワーカーの保存も、その秒数のうちに ETag に出る）
+
+ETag にはヘッダーの中身（ログインユーザー・カートの点数）と URL（?page などのクエリ込み）、リリース番号も入れます。
+Last-Modified は誰にでも同じページ（未ログイン・カートが空）のときだけ付けます。
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, Max, Value
+from django.db.models.functions import Cast
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import cart as cart_service
+from .db_router import primary_reads
+
+KEY = "versions:{}"
+_STARTED = str(time.time())  # RELEASE が無いときは起動時刻（テンプレートの変更を起動ごとに反映する）
+
+
+# ==========================================
+# 1. モデルごとのバージョン
+# ==========================================
+
+def _key(model) -> str:
+    return KEY.format(model._meta.label_lower)
+
+
+def _timeout() -> Optional[float]:
+    return getattr(settings, "CATALOG_VERSION_TTL", None)
+
+
+def bump(*models) -> None:
+    """モデルが変わった（保存・削除・一括更新）"""
+    now = time.time()
+    cache.set_many({_key(model): (now, str(now)) for model in models}, _timeout())
+
+
+def from_db(models: List) -> List[Tuple[float, str]]:
+    """モデルごとの Max(updated_at) と件数を、UNION ALL で 1 クエリにまとめて"""
+    queries = [model._default_manager.order_by()
+               .annotate(n=Cast(Value(i), IntegerField())).values("n")
+               .annotate(last=Max("updated_at"), count=Count("pk"))
+               for i, model in enumerate(models)]
+    rows = {row["n"]: row for row in queries[0].union(*queries[1:], all=True)}  # 空のテーブルは行が無い
+    versions = []
+    for i in range(len(models)):
+        row = rows.get(i) or {"last": None, "count": 0}
+        last = row["last"].timestamp() if row["last"] else 0.0
+        versions.append((last, f"{last}:{row['count']}"))
+    return versions
+
+
+def get(models: Iterable) -> Dict[str, Tuple[float, str]]:
+    """{モデル名: (最終変更の UNIX 時刻, 比較用の文字列)}。キャッシュに無いものは DB から 1 クエリで"""
+    keys = {_key(model): model for model in models}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        with primary_reads():  # bump() の直後に遅れたレプリカから作ると、古い中身に新しい ETag が付く
+            rebuilt = from_db([keys[key] for key in missing])
+        for key, version in zip(missing, rebuilt):
+            found[key] = version
+            cache.add(key, version, _timeout())
+    return found
+
+
+# ==========================================
+# 2. ビューのデコレーター
+# ==========================================
+
+def _viewer(request) -> Optional[str]:
+    """ヘッダーに出る「人ごとの部分」。未ログインでカートも空なら None"""
+    user = getattr(request, "user", None)
+    user_pk = user.pk if user is not None and user.is_authenticated else None
+    session = getattr(request, "session", None)
+    cart_count = cart_service.count(session) if session is not None else 0
+    if user_pk is None and not cart_count:
+        return None
+    return f"{user_pk}:{cart_count}"
+
+
+def conditional_page(*models):
+    """
+    models のバージョンから ETag / Last-Modified を作り、変わっていなければ 304 を返す
+        @conditional_page(Shop, Product)
+        def shop_detail(request, shop_pk): ...
+    """
+    def etag(request, *args, **kwargs):
+        versions = get(models)
+        parts = [getattr(settings, "RELEASE", "") or _STARTED, request.get_full_path(), _viewer(request) or ""]
+        parts += [f"{key}={token}" for key, (_, token) in sorted(versions.items())]
+        return hashlib.md5("|".join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if _viewer(request) is not None:
+            return None
+        return datetime.fromtimestamp(max(ts for ts, _ in get(models).values()), tz=dt_timezone.utc)
+
+    def decorator(view):
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # ブラウザが勝手に古い HTML を使わず、毎回 If-None-Match で確かめに来るように
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -1,8 +1,12 @@
-from typing import Optional, Dict
+import math
+from typing import Callable, NamedTuple, Optional, Dict, Tuple
 from urllib.parse import urlencode
 
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 
@@ -12,6 +16,14 @@ from .models import (
     HomePickup, ConciergeItem, Partner, 
     Set, ConsultationItem
 )
+from . import cart as cart_service
+from . import db_pool
+from . import geo
+from . import home_cache
+from . import search as search_service
+from .query_instrumentation import recent_requests
+from .pagination import paginate
+from .versions import conditional_page
 
 # ==========================================
 # 1. 便利な道具（ヘルパー関数）
@@ -40,6 +52,51 @@ def _get_consult_presets():
     ]
 
 
+# 地図のピンの上限（お店がいくら増えても、一覧のページの重さはここで止まる）
+MAP_PIN_LIMIT = 300
+
+
+class Listing(NamedTuple):
+    """キーセットページングする一覧ページの定義"""
+    queryset: Callable          # ベースのクエリを返す関数
+    ordering: Tuple[str, ...]   # 並び順（最後は主キー）
+    cards: str                  # カード部分のテンプレート
+    url_name: str               # 一覧ページのURL名
+
+
+LISTINGS = {
+    "products": Listing(lambda: Product.objects.select_related("shop"), ("id",),
+                        "dicon_app/cards/product_cards.html", "dicon_app:product_list"),
+    "shops": Listing(lambda: Shop.objects.select_related("street"), ("id",),
+                     "dicon_app/cards/shop_cards.html", "dicon_app:shop_list"),
+    "sale": Listing(lambda: Product.objects.filter(is_sale=True), ("id",),
+                    "dicon_app/cards/sale_cards.html", "dicon_app:sale_list"),
+    "events": Listing(lambda: Event.objects.filter(is_active=True), ("id",),
+                      "dicon_app/cards/event_cards.html", "dicon_app:event_list"),
+    "sets": Listing(lambda: Set.objects.filter(is_active=True), ("-created_at", "-id"),
+                    "dicon_app/cards/set_cards.html", "dicon_app:set_list"),
+}
+
+def _listing_page(request, name: str) -> dict:
+    """一覧の1ページ分を取り出す（?category= と ?after=カーソル に対応）"""
+    listing = LISTINGS[name]
+    queryset = listing.queryset()
+    category_slug = request.GET.get('category')
+    if category_slug:
+        queryset = queryset.filter(category=category_slug)
+    page = paginate(queryset, listing.ordering, request.GET.get('after'))
+
+    next_url = page_url = None
+    if page.has_next:
+        params = {'after': page.next_cursor}
+        if category_slug:
+            params['category'] = category_slug
+        query = urlencode(params)
+        next_url = f"{reverse('dicon_app:list_more', args=[name])}?{query}"
+        page_url = f"{reverse(listing.url_name)}?{query}"
+    return {'page': page, 'current_category': category_slug, 'next_url': next_url, 'page_url': page_url}
+
+
 # ==========================================
 # 2. ビュー関数（メイン機能）
 # ==========================================
@@ -48,59 +105,45 @@ def _get_consult_presets():
 # トップページ
 # --------------------
 def home(request):
-    """トップページ：特売、献立、イベント、告知を集めて表示"""
-    slides = HeroSlide.objects.filter(is_active=True).order_by('order')
-    home_pickups = HomePickup.objects.filter(is_active=True).order_by('order')[:6]
-    sale_products = Product.objects.filter(is_sale=True).order_by('?')[:6]
-    recommended_sets = Set.objects.filter(is_active=True).order_by('-created_at')[:3]
-    concierge_items = ConciergeItem.objects.filter(is_active=True).order_by('order')[:3]
-    consultation_items = ConsultationItem.objects.filter(is_active=True).order_by('order')[:3]
-    today = timezone.localdate()
-    upcoming_events = Event.objects.filter(is_active=True, start_date__gte=today).order_by('start_date')[:4]
-    partners = Partner.objects.filter(is_active=True).order_by('order')[:4]
-
-    return render(request, 'dicon_app/home.html', {
-        'slides': slides,
-        'sale_products': sale_products,
-        'recommended_sets': recommended_sets,
-        'upcoming_events': upcoming_events,
-        'home_pickups': home_pickups,       
-        'concierge_items': concierge_items,
-        'consultation_items': consultation_items,
-        'partners': partners,
-    })
+    """トップページ：特売、献立、イベント、告知を集めて表示
+
+    各セクションは home_cache でHTML断片としてキャッシュ済みのものを貼り合わせるだけ。
+    """
+    sections, status = home_cache.get_sections()
+    response = render(request, 'dicon_app/home.html', {'sections': sections})
+    # 負荷試験などでキャッシュの効き具合を確認できるように
+    response['X-Home-Cache'] = ",".join(f"{name}={result}" for name, result in status.items())
+    return response
 
 # --------------------
 # セット一覧
 # --------------------
+@conditional_page(Set)
 def set_list(request):
     """献立セット一覧：カテゴリ絞り込み対応"""
-    sets = Set.objects.filter(is_active=True).order_by("-created_at")
-    category_slug = request.GET.get('category')
-    if category_slug:
-        sets = sets.filter(category=category_slug)
-
-    context = {
-        'sets': sets,
-        'current_category': category_slug, # これからコメントアウトでフィルターとかの言葉残しとけ！
+    context = _listing_page(request, "sets")
+    context.update({
         'categories': [
             ('beauty', '美容・デトックス'), ('health', '健康維持・数値改善'),
             ('speedy', '時短・忙しい人向け'), ('diet', '糖質制限・ダイエット'),
             ('reward', '週末のご褒美'),
         ],
         'crumbs': [bc("管理栄養士の献立セット")],
-    }
+    })
     return render(request, "dicon_app/set_list.html", context)
 
 # --------------------
 # セット詳細
 # --------------------
+@conditional_page(Set, Product)
 def set_detail(request, pk=None, slug=None):
     """セット商品の詳細ページを表示する"""
+    # テンプレートで set.products.all を2回使うので、まとめて先読みしておく
+    sets = Set.objects.prefetch_related('products')
     if pk:
-        set_obj = get_object_or_404(Set, pk=pk, is_active=True)
+        set_obj = get_object_or_404(sets, pk=pk, is_active=True)
     elif slug:
-        set_obj = get_object_or_404(Set, slug=slug, is_active=True)
+        set_obj = get_object_or_404(sets, slug=slug, is_active=True)
     else:
         return redirect('dicon_app:set_list')
         
@@ -112,22 +155,26 @@ def set_detail(request, pk=None, slug=None):
 # --------------------
 # お店一覧
 # --------------------
+@conditional_page(Shop, Street)
 def shop_list(request):
     """店舗一覧＆カテゴリ絞り込み"""
-    shops = Shop.objects.all()
-    category_slug = request.GET.get('category')
-    if category_slug:
-        shops = shops.filter(category=category_slug)
-
-    return render(request, 'dicon_app/shop_list.html', {
-        'shops': shops,
-        'current_category': category_slug, # フィルター
-        'crumbs': [bc("お店一覧")],
-    })
+    context = _listing_page(request, "shops")
+    # 地図のピンは一覧のページとは別に、位置情報だけ軽く取る
+    # IS NOT NULL で書くと部分インデックス（shop_located_idx）が使われる
+    map_shops = Shop.objects.filter(latitude__isnull=False, longitude__isnull=False).only(
+        'pk', 'name', 'category', 'latitude', 'longitude').order_by('pk')
+    if context['current_category']:
+        map_shops = map_shops.filter(category=context['current_category'])
+    # 1 件多く取って、上限で切ったかどうかを数えずに知る
+    map_shops = list(map_shops[:MAP_PIN_LIMIT + 1])
+    context.update({'map_shops': map_shops[:MAP_PIN_LIMIT], 'map_truncated': len(map_shops) > MAP_PIN_LIMIT,
+                    'map_pin_limit': MAP_PIN_LIMIT, 'crumbs': [bc("お店一覧")]})
+    return render(request, 'dicon_app/shop_list.html', context)
 
 # --------------------
 # お店詳細
 # --------------------
+@conditional_page(Shop, Product, Street)
 def shop_detail(request, shop_pk):
     """お店詳細：取扱商品一覧"""
     shop = get_object_or_404(Shop, pk=shop_pk)
@@ -138,25 +185,62 @@ def shop_detail(request, shop_pk):
         "crumbs": [bc("お店一覧", reverse("dicon_app:shop_list")), bc(shop.name)],
     })
 
+# --------------------
+# 近くのお店（JSON）
+# --------------------
+def shops_nearby(request):
+    """?lat=&lon= の近くのお店を近い順に。radius（m）があればその範囲内、なければ近い順に limit 件"""
+    try:
+        lat = float(request.GET['lat'])
+        lon = float(request.GET['lon'])
+        radius = request.GET.get('radius')
+        radius = float(radius) if radius else None
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat と lon（数値）を指定してください'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):  # nan はどの比較も False なのでここで弾かれる
+        return JsonResponse({'error': '緯度・経度の範囲が正しくありません'}, status=400)
+    if radius is not None:
+        if not (math.isfinite(radius) and radius > 0):
+            return JsonResponse({'error': 'radius は正の数（m）で指定してください'}, status=400)
+        radius = min(radius, geo.MAX_RADIUS_M)
+
+    queryset = Shop.objects.all()
+    category = request.GET.get('category')
+    if category:
+        queryset = queryset.filter(category=category)
+    if radius:
+        shops = geo.within_radius(lat, lon, radius, limit=limit, queryset=queryset)
+    else:
+        shops = geo.nearest(lat, lon, k=limit, queryset=queryset)
+
+    return JsonResponse({'shops': [
+        {
+            'id': shop.pk,
+            'name': shop.name,
+            'category': shop.category,
+            'latitude': shop.latitude,
+            'longitude': shop.longitude,
+            'distance_m': shop.distance_m,
+            'url': reverse('dicon_app:shop_detail', kwargs={'shop_pk': shop.pk}),
+        }
+        for shop in shops
+    ]})
+
 # --------------------
 # 商品一覧
 # --------------------
+@conditional_page(Product, Shop)
 def product_list(request):
     """商品一覧＆カテゴリ絞り込み"""
-    products = Product.objects.all()
-    category_slug = request.GET.get('category')
-    if category_slug:
-        products = products.filter(category=category_slug)
-
-    return render(request, 'dicon_app/product_list.html', {
-        'products': products,
-        'current_category': category_slug, # フィルター
-        'crumbs': [bc("商品一覧")],
-    })
+    context = _listing_page(request, "products")
+    context['crumbs'] = [bc("商品一覧")]
+    return render(request, 'dicon_app/product_list.html', context)
 
 # --------------------
 # 商品詳細
 # --------------------
+@conditional_page(Product, Shop)
 def product_detail(request, pk):
     """商品詳細ページ"""
     product = get_object_or_404(Product, pk=pk)
@@ -165,6 +249,23 @@ def product_detail(request, pk):
         "crumbs": [bc("商品一覧", reverse("dicon_app:product_list")), bc(product.name)],
     })
 
+# --------------------
+# 横断検索
+# --------------------
+def search(request):
+    """お店・商品・献立セット・イベントをまとめて検索（?q=キーワード&kind=shop など）"""
+    query = request.GET.get('q', '').strip()[:100]
+    kind = request.GET.get('kind')
+    kinds = [kind] if kind in search_service.KINDS else None
+    hits = search_service.search(query, kinds=kinds, limit=50) if query else []
+    return render(request, 'dicon_app/search.html', {
+        'query': query,
+        'current_kind': kinds[0] if kinds else None,
+        'kinds': search_service.KINDS.values(),
+        'hits': hits,
+        'crumbs': [bc("検索")],
+    })
+
 
 # ==========================
 # 🛒 買い物・カート機能
@@ -172,34 +273,18 @@ def product_detail(request, pk):
 
 def add_to_cart(request, product_id):
     """商品をカートに入れる"""
-    cart = request.session.get('cart', {})
-    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
-    request.session['cart'] = cart
+    cart_service.add(request.session, product_id)
     return redirect('dicon_app:cart_detail')
 
 def remove_from_cart(request, product_id):
     """カートから商品を削除"""
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        del cart[str(product_id)]
-        request.session['cart'] = cart
+    cart_service.remove(request.session, product_id)
     return redirect('dicon_app:cart_detail')
 
 def cart_detail(request):
-    """カートの中身を表示"""
-    cart = request.session.get('cart', {})
-    items = []
-    total_price = 0
-    for product_id, quantity in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            subtotal = (product.sale_price if product.is_sale and product.sale_price else product.price) * quantity
-            total_price += subtotal
-            items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
-        except Product.DoesNotExist: continue
+    """カートの中身を表示（商品はまとめて1クエリ、お店ごとの小計つき）"""
     return render(request, 'dicon_app/cart.html', {
-        'items': items, 
-        'total_price': total_price,
+        'cart': cart_service.load(request.session),
         'crumbs': [bc("買い物かご")]
     })
 
@@ -209,7 +294,7 @@ def checkout(request):
 
 def checkout_done(request):
     """注文完了画面"""
-    request.session['cart'] = {}
+    cart_service.clear(request.session)
     return render(request, 'dicon_app/checkout_done.html', {'crumbs': [bc("注文完了")]})
 
 
@@ -228,7 +313,7 @@ def consult_menu(request):
 def consult_home(request):
     """相談ホーム"""
     preset_key = request.GET.get('preset')
-    item = ConsultationItem.objects.filter(preset_id=preset_key).first()
+    item = ConsultationItem.objects.filter(preset_id=preset_key).first() if preset_key else None
     context = {'preset_title': item.title, 'preset_desc': item.description} if item else {}
     context['crumbs'] = [bc("チャット相談")]
     return render(request, 'dicon_app/consult_chat.html', context)
@@ -255,22 +340,31 @@ def chat_demo(request):
 # 📅 イベント・特売・その他
 # ==========================
 
+@conditional_page(Product, Shop)
 def sale_list(request):
     """特売品一覧"""
-    products = Product.objects.filter(is_sale=True)
-    return render(request, "dicon_app/sale_list.html", {
-        "products": products,
-        "crumbs": [bc("本日の特売品")]
-    })
+    context = _listing_page(request, "sale")
+    context["crumbs"] = [bc("本日の特売品")]
+    return render(request, "dicon_app/sale_list.html", context)
 
+@conditional_page(Event)
 def event_list(request):
     """イベント一覧"""
-    events = Event.objects.filter(is_active=True)
-    return render(request, "dicon_app/event_list.html", {
-        "events": events,
-        "crumbs": [bc("商店街のイベント")]
-    })
-
+    context = _listing_page(request, "events")
+    context["crumbs"] = [bc("商店街のイベント")]
+    return render(request, "dicon_app/event_list.html", context)
+
+@conditional_page(Product, Shop, Street, Event, Set)
+def list_more(request, listing):
+    """無限スクロール用：一覧の次ページのカードだけを返す（次ページのURLは X-Next-Page ヘッダ）"""
+    if listing not in LISTINGS:
+        raise Http404
+    context = _listing_page(request, listing)
+    response = HttpResponse(render_to_string(LISTINGS[listing].cards, context, request))
+    response['X-Next-Page'] = context['next_url'] or ""
+    return response
+
+@conditional_page(Event)
 def event_detail(request, slug):
     """イベント詳細"""
     event = get_object_or_404(Event, slug=slug, is_active=True)
@@ -279,6 +373,7 @@ def event_detail(request, slug):
         "crumbs": [bc("イベント一覧", reverse("dicon_app:event_list")), bc(event.title)]
     })
 
+@conditional_page(Partner)
 def partner_list(request):
     """街の助っ人一覧"""
     partners = Partner.objects.filter(is_active=True)
@@ -287,6 +382,7 @@ def partner_list(request):
         'crumbs': [bc("街の助っ人")]
     })
 
+@conditional_page(HomePickup)
 def concierge_list(request):
     """コンシェルジュ厳選ピックアップ"""
     items = HomePickup.objects.filter(is_active=True).order_by('order')
@@ -309,4 +405,18 @@ def profile(request):
 
 def qa(request): 
     """よくある質問"""
-    return render(request, 'dicon_app/qa.html', {'crumbs': [bc("よくある質問")]})
\ No newline at end of file
+    return render(request, 'dicon_app/qa.html', {'crumbs': [bc("よくある質問")]})
+
+
+# ==========================
+# 🔧 運用ツール（スタッフ専用）
+# ==========================
+
+@staff_member_required
+def query_log(request):
+    """直近リクエストのクエリ数・DB時間・N+1 の疑い（query_instrumentation.py のリングバッファ）"""
+    return render(request, 'dicon_app/query_log.html', {
+        'entries': recent_requests(),
+        'pools': db_pool.all_stats(),
+        'crumbs': [bc("クエリ計測")],
+    })
@@ -0,0 +1,70 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderBatch
+
+
+class Command(BaseCommand):
+    help = "Delete (optionally archiving to JSONL first) pending orders abandoned at checkout, in small chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=24,
+                            help="Reap pending orders created more than N hours ago (default: 24)")
+        parser.add_argument("--chunk-size", type=int, default=500,
+                            help="Rows deleted per transaction (default: 500)")
+        parser.add_argument("--sleep", type=float, default=0.0,
+                            help="Seconds to pause between chunks, to leave room for live traffic")
+        parser.add_argument("--archive", metavar="PATH",
+                            help="Append the reaped orders to this JSONL file before deleting them")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be reaped")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["older_than"])
+        chunk_size = max(1, options["chunk_size"])
+
+        # (status, created_at) のインデックスで古い順に拾う
+        stale = Order.objects.filter(status="pending", created_at__lt=cutoff).order_by("created_at", "id")
+        if options["dry_run"]:
+            self.stdout.write(f"{stale.count()} pending orders older than {cutoff:%Y-%m-%d %H:%M} would be reaped")
+            return
+
+        archive = open(options["archive"], "a", encoding="utf-8") if options["archive"] else None
+        reaped = 0
+        try:
+            while True:
+                # 1チャンクずつ短いトランザクションで消す（テーブルを長くロックしない）
+                with transaction.atomic():
+                    rows = list(stale.values(
+                        "id", "product_id", "amount", "status", "created_at", "batch_id", "user_id", "idempotency_key",
+                    )[:chunk_size])
+                    if not rows:
+                        break
+                    if archive:
+                        for row in rows:
+                            archive.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+                        archive.flush()
+                    Order.objects.filter(id__in=[row["id"] for row in rows]).delete()
+                reaped += len(rows)
+                self.stdout.write(f"  reaped {reaped} orders…")
+                if options["sleep"]:
+                    time.sleep(options["sleep"])
+        finally:
+            if archive:
+                archive.close()
+
+        # 中身が空になった古い束も片づける
+        empty_batches = OrderBatch.objects.filter(created_at__lt=cutoff, orders__isnull=True)
+        batches = 0
+        while True:
+            ids = list(empty_batches.values_list("id", flat=True)[:chunk_size])
+            if not ids:
+                break
+            OrderBatch.objects.filter(id__in=ids).delete()
+            batches += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Reaped {reaped} pending orders and {batches} empty batches"))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.27 on 2026-10-18 07:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicon_app', '0028_keyset_pagination_indexes'),
+        ('orders', '0003_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_batches', to='dicon_app.set')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='orders.orderbatch'),
+        ),
+    ]
@@ -1,8 +1,21 @@
+from django.conf import settings
 from django.db import models
-from dicon_app.models import Product
+from dicon_app.models import Product, Set
 
 # Create your models here.
 
+class OrderBatch(models.Model):
+    """セット購入などで、まとめて作った注文の束（成功/失敗を一括で切り替える単位）"""
+    set = models.ForeignKey(Set, on_delete=models.SET_NULL, null=True, blank=True, related_name="order_batches")
+    total = models.IntegerField(default=0)  # 束に含まれる注文の合計金額
+    created_at = models.DateTimeField(auto_now_add=True)
+    # 同じセッション＋セットの決済画面を開き直しても、束を作り直さないためのキー（決済が終わったら空にする）
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    def __str__(self):
+        return f"OrderBatch#{self.id} {self.set.name if self.set else ''}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("pending", "決済処理中"),
@@ -15,6 +28,20 @@ class Order(models.Model):
     amount = models.IntegerField() #金額（今回は product.price を入れる想定）
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending") #決済処理中 success / cancel
     created_at = models.DateTimeField(auto_now_add=True) #作成日時
+    # セット購入のときだけ入る（FK なのでインデックスつき。束ごとの一括 UPDATE に使う）
+    batch = models.ForeignKey(OrderBatch, on_delete=models.CASCADE, null=True, blank=True, related_name="orders")
+    # 同じセッション＋商品の決済画面を開き直しても、注文を作り直さないためのキー（決済が終わったら空にする）
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    # 購入したユーザー（ログインせずに決済した注文は空）
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="orders")
+
+    class Meta:
+        indexes = [
+            # 注文履歴：ユーザーごとに新しい順（キーセットページングの並び順そのまま）
+            models.Index(fields=["user", "created_at", "id"], name="order_user_created_idx"),
+            # 放置された決済処理中の注文を古い順に掃除する（reap_pending_orders）
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+        ]
 
     def __str__(self):
-        return f"Order#{self.id} {self.product.name} {self.status}"
\ No newline at end of file
+        return f"Order#{self.id} {self.product.name} {self.status}"
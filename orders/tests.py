@@ -1,3 +1,55 @@
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from dicon_app.models import Product
+from dicon_app.pagination import encode_cursor
+
+from .models import Order
+
+
+class OrderHistoryCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("buyer", password="pw-12345-xx")
+        product = Product.objects.create(name="トマト", price=200)
+        Order.objects.bulk_create([Order(product=product, amount=200, user=cls.user) for _ in range(30)])
+
+    def test_tampered_cursor_returns_first_page(self):
+        self.client.force_login(self.user)
+        for cursor in (encode_cursor([None, None]), encode_cursor(["x", "y"]), encode_cursor([1, 2, 3])):
+            for name in ("orders:order_list", "orders:order_list_more", "orders:order_list_json"):
+                with self.subTest(name=name, cursor=cursor):
+                    response = self.client.get(reverse(name), {"after": cursor})
+                    self.assertEqual(response.status_code, 200)
+        data = self.client.get(reverse("orders:order_list_json"), {"after": encode_cursor([None, None])}).json()
+        self.assertEqual(data["orders"][0]["id"], Order.objects.order_by("-created_at", "-id")[0].pk)
+
+
+class ReapPendingOrdersTests(TestCase):
+
+    def test_archive_keeps_owner_and_idempotency_key(self):
+        user = get_user_model().objects.create_user("buyer", password="pw-12345-xx")
+        product = Product.objects.create(name="トマト", price=200)
+        order = Order.objects.create(product=product, amount=200, user=user, idempotency_key="k-1")
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(hours=48))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "reaped.jsonl")
+            call_command("reap_pending_orders", archive=path, stdout=io.StringIO())
+            with open(path, encoding="utf-8") as archive:
+                rows = [json.loads(line) for line in archive]
 
-# Create your tests here.
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["user_id"], user.pk)
+        self.assertEqual(rows[0]["idempotency_key"], "k-1")
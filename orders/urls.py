@@ -5,6 +5,8 @@ app_name = "orders"
 
 urlpatterns = [
     path("", views.order_list, name="order_list"),
+    path("more/", views.order_list_more, name="order_list_more"),  # 無限スクロール用の続き
+    path("api/", views.order_list_json, name="order_list_json"),  # 注文履歴の JSON 版
     path("<int:order_pk>/", views.order_detail, name="order_detail"),  # 1/1追加
 ]
 #"" → /orders/ に対応
@@ -1,4 +1,10 @@
 # orders/utils.py
+import hashlib
+
+from django.db import IntegrityError, transaction
+
+from .models import Order, OrderBatch
+
 def notify_line_dummy(order, product, status):
     """
     LINE通知のダミー関数
@@ -6,4 +12,65 @@ def notify_line_dummy(order, product, status):
     """
     message = f"[LINE通知ダミー] 注文ID={order.id} / 商品={product.name} / 状態={status}"
     print(message)  # 本物のLINE通知の代わりにターミナルへ出す
-    return message
\ No newline at end of file
+    return message
+
+def checkout_key(request, kind, obj_id):
+    """
+    決済の冪等キー：同じセッションで同じ商品（セット）の決済画面を何度開いても同じ値になる
+    kind: "product" or "set"
+    """
+    if not request.session.session_key:
+        request.session.save()
+    raw = f"{request.session.session_key}:{kind}:{obj_id}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def existing_checkout_key(request, kind, obj_id):
+    """checkout_key() と同じ値。ただしセッションが無ければ作らずに None（GET で注文を探すだけのとき）"""
+    if not request.session.session_key:
+        return None
+    return checkout_key(request, kind, obj_id)
+
+
+def order_user(request):
+    """注文に紐づけるユーザー（未ログインなら None）"""
+    return request.user if request.user.is_authenticated else None
+
+
+def get_or_create_pending_order(product, idempotency_key=None, user=None):
+    """同じキーの決済処理中の注文があればそれを返し、なければ作る"""
+    if idempotency_key is None:
+        return Order.objects.create(product=product, amount=product.price, status="pending", user=user)
+    order, _ = Order.objects.get_or_create(
+        idempotency_key=idempotency_key,
+        defaults={"product": product, "amount": product.price, "status": "pending", "user": user},
+    )
+    return order
+
+
+def create_order_batch(products, set_obj=None, idempotency_key=None, user=None):
+    """
+    商品ごとの注文を 1 つの束（OrderBatch）としてまとめて作る。
+    INSERT は bulk_create の 1 回（＋束の 1 回）で、全体を 1 トランザクションにする。
+    同じ idempotency_key の束がすでにあれば、作らずにそれを返す。
+    """
+    if idempotency_key is not None:
+        batch = OrderBatch.objects.filter(idempotency_key=idempotency_key).first()
+        if batch is not None:
+            return batch, list(batch.orders.all())
+
+    try:
+        with transaction.atomic():
+            batch = OrderBatch.objects.create(
+                set=set_obj, total=sum(p.price for p in products), idempotency_key=idempotency_key)
+            orders = Order.objects.bulk_create([
+                Order(product=p, amount=p.price, status="pending", batch=batch, user=user)
+                for p in products
+            ])
+    except IntegrityError:
+        # 同時に来た同じリクエストが先に作った（unique 制約）
+        if idempotency_key is None:
+            raise
+        batch = OrderBatch.objects.get(idempotency_key=idempotency_key)
+        orders = list(batch.orders.all())
+    return batch, orders
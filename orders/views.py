@@ -1,17 +1,69 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from dicon_app.pagination import paginate
 from .models import Order
 
+# 新しい順。(user, created_at, id) のインデックスをそのまま読むので、注文が増えても速さは変わらない
+HISTORY_ORDERING = ("-created_at", "-id")
+
+
+def _history_page(request):
+    """ログイン中のユーザーの注文履歴 1ページ分（?after=カーソル）"""
+    orders = Order.objects.filter(user=request.user).select_related("product__shop")
+    page = paginate(orders, HISTORY_ORDERING, request.GET.get("after"))
+
+    next_url = page_url = None
+    if page.has_next:
+        query = urlencode({"after": page.next_cursor})
+        next_url = f"{reverse('orders:order_list_more')}?{query}"
+        page_url = f"{reverse('orders:order_list')}?{query}"
+    return {"page": page, "next_url": next_url, "page_url": page_url}
+
 @login_required
 def order_list(request):
-    orders = Order.objects.select_related("product__shop").order_by("-created_at")
-    return render(request, "orders/order_list.html", {"orders": orders})
+    return render(request, "orders/order_list.html", _history_page(request))
+
+@login_required
+def order_list_more(request):
+    """無限スクロール用：次ページの行だけを返す（次ページのURLは X-Next-Page ヘッダ）"""
+    context = _history_page(request)
+    response = HttpResponse(render_to_string("orders/order_rows.html", context, request))
+    response["X-Next-Page"] = context["next_url"] or ""
+    return response
+
+@login_required
+def order_list_json(request):
+    """注文履歴の JSON 版（?after=カーソル。next が null なら最後のページ）"""
+    orders = Order.objects.filter(user=request.user).select_related("product")
+    page = paginate(orders, HISTORY_ORDERING, request.GET.get("after"))
+    return JsonResponse({
+        "orders": [
+            {
+                "id": order.id,
+                "product": order.product.name,
+                "amount": order.amount,
+                "status": order.status,
+                "status_display": order.get_status_display(),
+                "created_at": order.created_at.isoformat(),
+                "batch_id": order.batch_id,
+            }
+            for order in page.items
+        ],
+        "next": page.next_cursor,
+    })
 
 @login_required
 def order_detail(request, order_pk):
     order = get_object_or_404(
         Order.objects.select_related("product__shop"),
-        pk=order_pk
+        pk=order_pk,
+        user=request.user,  # 他人の注文は見せない
     )
     shop = order.product.shop
     return render(request, "orders/order_detail.html", {
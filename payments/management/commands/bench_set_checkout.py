@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dicon_app.models import Product, Shop, Street
+from orders.models import Order, OrderBatch
+from orders.utils import create_order_batch
+
+BENCH_STREET = "__bench_set_checkout__"
+
+
+def create_orders_one_by_one(products):
+    """変更前の checkout_set と同じ作り方（1商品ごとに INSERT＋自動コミット）"""
+    return [Order.objects.create(product=p, amount=p.price, status="pending") for p in products]
+
+
+def create_orders_in_batch(products):
+    """変更後：OrderBatch＋bulk_create を 1 トランザクションで"""
+    return create_order_batch(products)[1]
+
+
+def flip_by_ids(orders):
+    """変更前の success_set：セッションの id リストで UPDATE"""
+    Order.objects.filter(id__in=[o.id for o in orders]).update(status="success")
+
+
+def flip_by_batch(orders):
+    """変更後の success_set：batch_id で UPDATE"""
+    Order.objects.filter(batch_id=orders[0].batch_id).update(status="success")
+
+
+class Command(BaseCommand):
+    help = "Benchmark set checkout: per-row Order.create vs OrderBatch + bulk_create (and the status flip)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="5,50,500", help="Comma separated set sizes (default: 5,50,500)")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per size; the median is reported")
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        repeat = max(1, options["repeat"])
+
+        # 計測用の商品を作る（最後に必ず消す）。ここは外側のトランザクションで囲まない：
+        # 変更前の「1件ずつ自動コミット」のコストをそのまま測るため
+        street = Street.objects.create(name=BENCH_STREET)
+        shop = Shop.objects.create(street=street, name=BENCH_STREET)
+        products = Product.objects.bulk_create([
+            Product(name=f"bench-{i}", price=100 + i, shop=shop) for i in range(max(sizes))
+        ])
+        if products[0].pk is None:
+            products = list(Product.objects.filter(shop=shop).order_by("id"))
+
+        try:
+            self.stdout.write(f"{'size':>6} {'create before':>14} {'create after':>13} {'x':>6} "
+                              f"{'flip before':>12} {'flip after':>11} {'x':>6}")
+            for size in sizes:
+                subset = products[:size]
+                create_old, flip_old = self._measure(create_orders_one_by_one, flip_by_ids, subset, repeat)
+                create_new, flip_new = self._measure(create_orders_in_batch, flip_by_batch, subset, repeat)
+                self.stdout.write(
+                    f"{size:>6} {create_old:>12.2f}ms {create_new:>11.2f}ms {create_old / create_new:>5.1f}x "
+                    f"{flip_old:>10.2f}ms {flip_new:>9.2f}ms {flip_old / flip_new:>5.1f}x"
+                )
+        finally:
+            with transaction.atomic():
+                bench_orders = Order.objects.filter(product__shop=shop)
+                batch_ids = set(bench_orders.exclude(batch=None).values_list("batch_id", flat=True))
+                bench_orders.delete()
+                OrderBatch.objects.filter(id__in=batch_ids).delete()
+                street.delete()
+
+    def _measure(self, create, flip, products, repeat):
+        create_times, flip_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            orders = create(products)
+            create_times.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            flip(orders)
+            flip_times.append((time.perf_counter() - start) * 1000)
+        return sorted(create_times)[len(create_times) // 2], sorted(flip_times)[len(flip_times) // 2]
@@ -1,3 +1,146 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from dicon_app.models import Product, Set
+from orders.models import Order, OrderBatch
+
+
+# ==========================================
+# セットまとめ買い：成功/失敗にできるのは自分の束だけ
+# ==========================================
+
+@override_settings(QUERY_BUDGET_RAISE=False)
+class SetBatchOwnershipTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.set = Set.objects.create(name="鍋セット", slug="nabe", price=1000)
+        cls.set.products.add(*[Product.objects.create(name=f"具材{i}", price=100 * (i + 1)) for i in range(3)])
+
+    def _checkout(self, client):
+        client.post(reverse("payments:checkout_set", args=[self.set.slug]))
+        return OrderBatch.objects.latest("pk")
+
+    def test_owner_session_can_finish(self):
+        batch = self._checkout(self.client)
+        response = self.client.get(reverse("payments:success_set", args=[batch.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(batch.orders.values_list("status", flat=True)), {"success"})
+
+    def test_other_client_gets_404(self):
+        batch = self._checkout(self.client)
+        for name in ("payments:success_set", "payments:cancel_set"):
+            with self.subTest(name=name):
+                response = self.client_class().get(reverse(name, args=[batch.pk]))
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(set(batch.orders.values_list("status", flat=True)), {"pending"})
+
+    def test_unknown_batch_is_404(self):
+        response = self.client.get(reverse("payments:success_set", args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_logged_in_owner_from_another_session(self):
+        user = get_user_model().objects.create_user("owner", password="pw-12345-xx")
+        self.client.force_login(user)
+        batch = self._checkout(self.client)
+        other = self.client_class()
+        other.force_login(user)
+        self.assertEqual(other.get(reverse("payments:cancel_set", args=[batch.pk])).status_code, 200)
+        self.assertEqual(set(Order.objects.filter(batch=batch).values_list("status", flat=True)), {"cancel"})
+
+
+# ==========================================
+# 単品購入：成功/失敗にできるのは自分の注文だけ
+# ==========================================
+
+@override_settings(QUERY_BUDGET_RAISE=False)
+class OrderOwnershipTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="トマト", price=300)
+
+    def _checkout(self, client):
+        client.post(reverse("payments:checkout", args=[self.product.pk]))
+        return Order.objects.latest("pk")
+
+    def test_owner_session_can_finish(self):
+        order = self._checkout(self.client)
+        response = self.client.get(reverse("payments:success", args=[order.pk]))
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "success")
+        self.assertIsNone(order.idempotency_key)
+
+    def test_other_client_gets_404(self):
+        order = self._checkout(self.client)
+        for name in ("payments:success", "payments:cancel"):
+            with self.subTest(name=name):
+                response = self.client_class().get(reverse(name, args=[order.pk]))
+                self.assertEqual(response.status_code, 404)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "pending")
+
+    def test_unknown_order_is_404(self):
+        response = self.client.get(reverse("payments:cancel", args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_logged_in_owner_from_another_session(self):
+        user = get_user_model().objects.create_user("owner", password="pw-12345-xx")
+        self.client.force_login(user)
+        order = self._checkout(self.client)
+        other = self.client_class()
+        other.force_login(user)
+        self.assertEqual(other.get(reverse("payments:cancel", args=[order.pk])).status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "cancel")
+        # ほかのユーザーには見えない
+        stranger = self.client_class()
+        stranger.force_login(get_user_model().objects.create_user("stranger", password="pw-12345-xx"))
+        self.assertEqual(stranger.get(reverse("payments:success", args=[order.pk])).status_code, 404)
+
+
+# ==========================================
+# 決済画面：注文を作るのは POST だけ（先読み・クローラーの GET では作らない）
+# ==========================================
+
+@override_settings(QUERY_BUDGET_RAISE=False)
+class CheckoutCreatesOnPostTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="トマト", price=300)
+        cls.set = Set.objects.create(name="鍋セット", slug="nabe", price=1000)
+        cls.set.products.add(cls.product)
+
+    def test_cookieless_gets_create_nothing(self):
+        urls = [reverse("payments:checkout", args=[self.product.pk]),
+                reverse("payments:checkout_set", args=[self.set.slug])]
+        for url in urls:
+            for _ in range(5):
+                response = self.client_class().get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "<form method=\"post\"")
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(OrderBatch.objects.count(), 0)
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_post_creates_once_per_session(self):
+        url = reverse("payments:checkout", args=[self.product.pk])
+        for _ in range(3):
+            self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+        order = Order.objects.get()
+        # 同じセッションの GET（再読み込み）は、その注文を出すだけ
+        response = self.client.get(url)
+        self.assertContains(response, reverse("payments:success", args=[order.pk]))
+        self.assertEqual(Order.objects.count(), 1)
+        # 別のセッションの POST は別の注文
+        self.client_class().post(url)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_other_methods_not_allowed(self):
+        response = self.client.put(reverse("payments:checkout", args=[self.product.pk]))
+        self.assertEqual(response.status_code, 405)
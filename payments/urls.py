@@ -8,8 +8,8 @@ urlpatterns = [
     path("checkout/<int:product_id>/", views.checkout, name="checkout"),
 
     path("checkout-set/<slug:set_slug>/", views.checkout_set, name="checkout_set"),  # ←セットでカートへを追加
-    path("success-set/", views.success_set, name="success_set"),  # ←追加
-    path("cancel-set/", views.cancel_set, name="cancel_set"),    # ←追加
+    path("success-set/<int:batch_id>/", views.success_set, name="success_set"),  # 注文の束（OrderBatch）ごと
+    path("cancel-set/<int:batch_id>/", views.cancel_set, name="cancel_set"),
 
     path("success/<int:order_id>/", views.success, name="success"),
     path("cancel/<int:order_id>/", views.cancel, name="cancel"),
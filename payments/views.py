@@ -1,24 +1,38 @@
 # payments/views.py（このファイルを丸ごと上書き）
 
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404
+from django.views.decorators.http import require_http_methods
 from dicon_app.models import Product, Set
-from orders.models import Order
+from orders.models import Order, OrderBatch
+from orders.utils import (checkout_key, create_order_batch, existing_checkout_key, get_or_create_pending_order,
+                          order_user)
 
-# セット購入で作った注文IDたちを一時的に束ねる（DB変更なしの最短ルート）
-SESSION_KEY_SET_ORDER_IDS = "checkout_set_order_ids"
+# このセッションで決済画面を開いた単品の注文（Order）の ID。成功/失敗にできるのはここにある注文だけ
+SESSION_KEY_ORDERS = "checkout_orders"
+# このセッションで決済画面を開いた束（OrderBatch）の ID。成功/失敗にできるのはここにある束だけ
+SESSION_KEY_SET_BATCHES = "checkout_set_batches"
+MAX_SESSION_BATCHES = 20
 
 
 # --------------------
 # 1) 単品購入（既存）
 # --------------------
+@require_http_methods(["GET", "HEAD", "POST"])
 def checkout(request, product_id):
     product = get_object_or_404(Product, pk=product_id)
 
-    order = Order.objects.create(
-        product=product,
-        amount=product.price,
-        status="pending",
-    )
+    if request.method == "POST":
+        # 再送信・二重クリックでも、同じセッションなら同じ注文を使う
+        order = get_or_create_pending_order(
+            product, checkout_key(request, "product", product.pk), user=order_user(request))
+        orders = [pk for pk in request.session.get(SESSION_KEY_ORDERS, []) if pk != order.pk]
+        request.session[SESSION_KEY_ORDERS] = (orders + [order.pk])[-MAX_SESSION_BATCHES:]
+    else:
+        # GET（先読み・クローラー・Cookie を持たない curl）では注文もセッションも作らない。
+        # このセッションで作った決済処理中の注文があればそれを出す
+        key = existing_checkout_key(request, "product", product.pk)
+        order = Order.objects.filter(idempotency_key=key).first() if key else None
 
     return render(request, "payments/checkout.html", {
         "product": product,
@@ -26,73 +40,96 @@ def checkout(request, product_id):
     })
 
 
-def success(request, order_id):
-    order = get_object_or_404(Order, pk=order_id)
-    order.status = "success"
+def _own_order(request, order_id):
+    """このセッションで作った注文か、ログイン中のユーザーの注文だけ。ほかの人の注文は 404（束の _own_batch と同じ）"""
+    order = get_object_or_404(Order.objects.select_related("product"), pk=order_id)
+    if order.pk in request.session.get(SESSION_KEY_ORDERS, []):
+        return order
+    if request.user.is_authenticated and order.user_id == request.user.pk:
+        return order
+    raise Http404("注文が見つかりません")
+
+
+def _finish_order(request, order_id, status, template_name):
+    order = _own_order(request, order_id)
+    order.status = status
+    order.idempotency_key = None  # 次に同じ商品を買うときは新しい注文にする
     order.save()
-    return render(request, "payments/success.html", {"order": order})
+    # 1回処理したら消す（事故防止）
+    request.session[SESSION_KEY_ORDERS] = [
+        pk for pk in request.session.get(SESSION_KEY_ORDERS, []) if pk != order.pk]
+    return render(request, template_name, {"order": order})
+
+
+def success(request, order_id):
+    return _finish_order(request, order_id, "success", "payments/success.html")
+
 
 def cancel(request, order_id):
-    order = get_object_or_404(Order, pk=order_id)
-    order.status = "cancel"
-    order.save()
-    return render(request, "payments/cancel.html", {"order": order})
+    return _finish_order(request, order_id, "cancel", "payments/cancel.html")
 
 
 # --------------------
-# 2) セットまとめ買い（DB変更なし：商品ごとにOrderを作る）
+# 2) セットまとめ買い（商品ごとのOrderを、1つのOrderBatchに束ねて一括で作る）
 # --------------------
+@require_http_methods(["GET", "HEAD", "POST"])
 def checkout_set(request, set_slug):
     set_obj = get_object_or_404(Set, slug=set_slug, is_active=True)
     products = list(set_obj.products.all())
 
-    orders = []
-    total = 0
-
-    for p in products:
-        o = Order.objects.create(
-            product=p,
-            amount=p.price,
-            status="pending",
-        )
-        orders.append(o)
-        total += p.price
-
-    # 成功/失敗を「セットで一括」できるように、注文IDをセッションに保存
-    request.session[SESSION_KEY_SET_ORDER_IDS] = [o.id for o in orders]
+    if request.method == "POST":
+        batch, orders = create_order_batch(
+            products, set_obj=set_obj, idempotency_key=checkout_key(request, "set", set_obj.pk),
+            user=order_user(request))
+        batches = [pk for pk in request.session.get(SESSION_KEY_SET_BATCHES, []) if pk != batch.pk]
+        request.session[SESSION_KEY_SET_BATCHES] = (batches + [batch.pk])[-MAX_SESSION_BATCHES:]
+    else:
+        # GET では束を作らない（単品の checkout と同じ）
+        key = existing_checkout_key(request, "set", set_obj.pk)
+        batch = OrderBatch.objects.filter(idempotency_key=key).first() if key else None
+        orders = list(batch.orders.all()) if batch else []
 
     return render(request, "payments/checkout_set.html", {
         "set": set_obj,
+        "batch": batch,
         "products": products,
         "orders": orders,
-        "total": total,
+        "total": batch.total if batch else sum(p.price for p in products),
     })
 
 
-def success_set(request):
-    ids = request.session.get(SESSION_KEY_SET_ORDER_IDS, [])
-    Order.objects.filter(id__in=ids).update(status="success")
-    orders = Order.objects.filter(id__in=ids).select_related("product")
-    total = sum(o.amount for o in orders)
+def _own_batch(request, batch_id):
+    """このセッションで作った束か、ログイン中のユーザーの注文の束だけ。ほかの人の束は 404（ID を順に試されても）"""
+    batch = get_object_or_404(OrderBatch, pk=batch_id)
+    if batch.pk in request.session.get(SESSION_KEY_SET_BATCHES, []):
+        return batch
+    if request.user.is_authenticated and batch.orders.filter(user=request.user).exists():
+        return batch
+    raise Http404("注文が見つかりません")
 
-    # 1回処理したら消す（事故防止）
-    request.session.pop(SESSION_KEY_SET_ORDER_IDS, None)
 
-    return render(request, "payments/success_set.html", {
+def _finish_set(request, batch_id, status, template_name):
+    """束の注文をまとめて success / cancel にする（batch_id のインデックスで UPDATE 1 回）"""
+    batch = _own_batch(request, batch_id)
+    Order.objects.filter(batch=batch).update(status=status)
+    # 1回処理したら消す（事故防止）
+    request.session[SESSION_KEY_SET_BATCHES] = [
+        pk for pk in request.session.get(SESSION_KEY_SET_BATCHES, []) if pk != batch.pk]
+    if batch.idempotency_key:
+        batch.idempotency_key = None  # 次に同じセットを買うときは新しい束にする
+        batch.save(update_fields=["idempotency_key"])
+    orders = batch.orders.select_related("product")
+
+    return render(request, template_name, {
+        "batch": batch,
         "orders": orders,
-        "total": total,
+        "total": batch.total,
     })
 
 
-def cancel_set(request):
-    ids = request.session.get(SESSION_KEY_SET_ORDER_IDS, [])
-    Order.objects.filter(id__in=ids).update(status="cancel")
-    orders = Order.objects.filter(id__in=ids).select_related("product")
-    total = sum(o.amount for o in orders)
+def success_set(request, batch_id):
+    return _finish_set(request, batch_id, "success", "payments/success_set.html")
 
-    request.session.pop(SESSION_KEY_SET_ORDER_IDS, None)
 
-    return render(request, "payments/cancel_set.html", {
-        "orders": orders,
-        "total": total,
-    })
+def cancel_set(request, batch_id):
+    return _finish_set(request, batch_id, "cancel", "payments/cancel_set.html")